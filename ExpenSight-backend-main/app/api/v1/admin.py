@@ -0,0 +1,49 @@
+import os
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.dependencies.deps import get_admin_user
+from app.services import profiler
+
+router = APIRouter(prefix="/v1/admin", tags=["Admin"])
+
+
+def _require_profiling():
+    if not profiler.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled on this worker")
+
+
+@router.get("/profile", summary="Sample This Worker's Stacks")
+async def sample_profile(
+    seconds: float = Query(10, gt=0, le=profiler.PROFILING_MAX_SECONDS),
+    interval_ms: float = Query(profiler.PROFILING_DEFAULT_INTERVAL_MS, ge=1, le=1000),
+    admin_user = Depends(get_admin_user),
+):
+    """
+    Samples every thread of the worker that serves this request for `seconds`
+    and returns the collapsed stacks (flamegraph.pl / speedscope format).
+    Requests are spread across workers; X-Worker-Pid says which one answered.
+    """
+    _require_profiling()
+    collapsed = await profiler.stack_sampler.profile(seconds, interval_ms)
+    filename = f"profile-{os.getpid()}-{int(time.time())}.folded"
+    return PlainTextResponse(collapsed, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Worker-Pid": str(os.getpid()),
+    })
+
+
+@router.get("/profiles/{profile_id}", summary="Per-Request cProfile Report")
+async def request_profile(
+    profile_id: str,
+    sort: str = Query("cumulative", description=f"One of: {', '.join(profiler.PSTATS_SORT_KEYS)}"),
+    limit: int = Query(50, ge=1, le=1000),
+    admin_user = Depends(get_admin_user),
+):
+    """
+    The pstats report of a request sent with `X-Profile: 1`, by the id returned
+    in its X-Profile-Id header. Results are files in PROFILING_RESULTS_DIR, so
+    any worker sharing that directory can answer.
+    """
+    _require_profiling()
+    return PlainTextResponse(profiler.request_profiles.report(profile_id, sort, limit))
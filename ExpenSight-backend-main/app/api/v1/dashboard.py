@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
+from datetime import date
+from typing import Optional
 from app.database.db import prisma
-from app.dependencies.deps import get_current_user
-from app.schemas.dashboard_schema import DashboardStats
+from app.dependencies.deps import get_current_user, conditional_user_data
+from app.schemas.dashboard_schema import DashboardStats, CategoryBreakdown, DashboardBundle
 from app.controllers import dashboard_controller
 from app.schemas.trends_schema import TrendsData 
+from app.services.fast_json import FAST_LIST_SERIALIZATION, FastJSONResponse, expense_to_dict
+
+BUNDLE_MAX_RECENT = 100
 
 router = APIRouter(
     prefix="/v1/dashboard",
@@ -13,7 +18,8 @@ router = APIRouter(
 
 @router.get("/stats", response_model=DashboardStats)
 async def read_dashboard_stats(
-    current_user =Depends(get_current_user)
+    current_user =Depends(get_current_user),
+    cache_headers = Depends(conditional_user_data)
 ):
     """
     Retrieve aggregated statistics for the user's dashboard.
@@ -23,10 +29,43 @@ async def read_dashboard_stats(
 
 @router.get("/trends", response_model=TrendsData)
 async def read_expense_trends(
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    cache_headers = Depends(conditional_user_data)
 ):
     """
     Retrieve expense trends for the last 6 months.
     """
     trends_data = await dashboard_controller.get_expense_trends(user=current_user)
-    return trends_data
\ No newline at end of file
+    return trends_data
+
+@router.get("/categories", response_model=CategoryBreakdown)
+async def read_category_breakdown(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user = Depends(get_current_user),
+    cache_headers = Depends(conditional_user_data)
+):
+    """
+    Retrieve expense totals per canonical category, largest first.
+    Optional start_date / end_date (YYYY-MM-DD, inclusive) limit the period.
+    """
+    return await dashboard_controller.get_category_breakdown(current_user, start_date, end_date)
+
+@router.get("/bundle", response_model=DashboardBundle)
+async def read_dashboard_bundle(
+    recent_limit: int = Query(10, ge=1, le=BUNDLE_MAX_RECENT, description="Number of most recent expenses to include"),
+    current_user = Depends(get_current_user),
+    cache_headers = Depends(conditional_user_data)
+):
+    """
+    Retrieve the profile, stats, 6-month trends and most recent expenses in
+    one response, replacing the four requests the dashboard makes on load.
+    The user is authenticated once and the underlying queries run concurrently.
+    Answers 304 when the client's If-None-Match still matches the user's data.
+    """
+    bundle = await dashboard_controller.get_dashboard_bundle(current_user, recent_limit)
+    if FAST_LIST_SERIALIZATION:
+        # Already in the DashboardBundle shape; only the expense rows need converting.
+        bundle["recentExpenses"] = [expense_to_dict(e) for e in bundle["recentExpenses"]]
+        return FastJSONResponse(bundle, headers=cache_headers)
+    return bundle
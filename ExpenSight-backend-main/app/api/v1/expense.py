@@ -1,22 +1,83 @@
-from fastapi import APIRouter, Depends
-from typing import List # Import List for the response model
-from app.dependencies.deps import get_current_user
-from app.controllers.expense_controller import get_all_expenses,add_expense_manually
-from app.schemas.expense_schema import ExpenseOut,ExpenseIn
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.encoders import jsonable_encoder
+from datetime import date
+from typing import List, Literal, Optional, Union # Import List for the response model
+from app.dependencies.deps import get_current_user, conditional_user_data
+from app.controllers.expense_controller import get_all_expenses,get_expense_fields,add_expense_manually,search_expenses,SEARCH_MAX_PAGE_SIZE
+from app.schemas.expense_schema import ExpenseOut,ExpenseFieldsOut,ExpenseIn,ExpenseSearchResponse
+from app.services.fast_json import FAST_LIST_SERIALIZATION, FastJSONResponse, expense_list_response
+from app.services.sparse_fields import EXPENSE_FIELDS, EXPENSE_INCLUDES
+from app.services.idempotency import run_idempotent, request_fingerprint
 
 router = APIRouter(prefix="/v1/expense", tags=["Expense"])
 
 @router.get(
     "/",
-    response_model=List[ExpenseOut],
+    # Sparse requests (`fields` / `include`) return the partial shape.
+    response_model=Union[List[ExpenseOut], List[ExpenseFieldsOut]],
     summary="Get All User Expenses"
 )
-async def get_expenses_list(current_user=Depends(get_current_user)):
+async def get_expenses_list(
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(EXPENSE_FIELDS)}"),
+    include: Optional[str] = Query(None, description=f"Comma-separated relations to join: {', '.join(EXPENSE_INCLUDES)}"),
+    current_user=Depends(get_current_user),
+    cache_headers=Depends(conditional_user_data),
+):
     """
     Retrieves a list of all expenses associated with the authenticated user.
+    Answers 304 when the client's If-None-Match still matches the user's data.
+
+    With `fields` and/or `include`, each item carries only the selected
+    columns (plus `id`) and relations; without them the full ExpenseOut
+    shape, receipt included, is returned as before.
+    """
+    if fields is not None or include is not None:
+        rows = await get_expense_fields(current_user, fields, include)
+        return FastJSONResponse(rows, headers=cache_headers)
+
+    expenses = await get_all_expenses(user=current_user)
+    if FAST_LIST_SERIALIZATION:
+        # Rows are serialized straight to JSON in the ExpenseOut shape, skipping re-validation.
+        return expense_list_response(expenses, headers=cache_headers)
+    return expenses
+
+@router.get(
+    "/search",
+    response_model=ExpenseSearchResponse,
+    summary="Search User Expenses"
+)
+async def search_expenses_list(
+    q: Optional[str] = Query(None, description="Case-insensitive text matched anywhere in the category"),
+    min_amount: Optional[float] = Query(None, ge=0),
+    max_amount: Optional[float] = Query(None, ge=0),
+    start_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
+    end_date: Optional[date] = Query(None, description="YYYY-MM-DD, inclusive"),
+    currency: Optional[str] = Query(None, min_length=3, max_length=3),
+    status: Optional[Literal["PENDING", "RECONCILED"]] = None,
+    sort: Literal["date", "amount", "createdAt", "category"] = "date",
+    order: Literal["asc", "desc"] = "desc",
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    current_user=Depends(get_current_user),
+    cache_headers=Depends(conditional_user_data),
+):
+    """
+    Filters, sorts and paginates the user's expenses in the database instead
+    of shipping the whole list to the client.
     """
-    return await get_all_expenses(user=current_user)
+    return await search_expenses(
+        current_user, q, min_amount, max_amount, start_date, end_date,
+        currency, status, sort, order, page, page_size
+    )
 
 @router.post("/",response_model=ExpenseOut,summary="Add Expense Manually")
-async def add_expense(expense:ExpenseIn,current_user=Depends(get_current_user)):
-    return await add_expense_manually(expense,current_user)
+async def add_expense(
+    expense:ExpenseIn,
+    current_user=Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key get the first response instead of a duplicate expense."),
+):
+    return await run_idempotent(
+        current_user.id, "POST /v1/expense/", idempotency_key, request_fingerprint(expense.model_dump()),
+        lambda: add_expense_manually(expense,current_user),
+        serialize=lambda ex: jsonable_encoder(ExpenseOut.model_validate(ex, from_attributes=True)),
+    )
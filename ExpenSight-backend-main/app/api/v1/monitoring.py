@@ -0,0 +1,91 @@
+import asyncio
+import time
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.database.db import prisma, read_prisma, pool_settings
+from app.services.currency_service import get_fx_service_status
+from app.services.fx_prefetch import fx_prefetcher
+from app.services.server_state import tracker
+from app.controllers.receipt_controller import ocr_batcher
+from app.services.ocr_dispatcher import ocr_dispatcher
+from app.services.rate_limiter import rate_limiter
+from app.services.reconcile_compaction import reconcile_compactor
+
+router = APIRouter(prefix="/v1/monitoring", tags=["Monitoring"])
+
+READINESS_QUERY_TIMEOUT_SECONDS = 2.0
+
+@router.get("/fx", summary="FX Service Circuit Breaker State")
+async def fx_service_status():
+    """
+    Reports the state of the Frankfurter circuit breaker, the number of
+    coalesced FX lookups currently in flight, the local rate store's hit rate
+    and how many PENDING expenses' rates the prefetcher has already stored.
+    """
+    return {**get_fx_service_status(), "prefetch": fx_prefetcher.stats()}
+
+@router.get("/ocr", summary="OCR Dispatch Metrics")
+async def ocr_status():
+    """
+    Reports how receipts are being sent to the OCR model: micro-batches,
+    single calls and per-receipt fallbacks, plus the dispatcher's queue depth,
+    queue wait times and current concurrency limit.
+    """
+    return {"batcher": ocr_batcher.stats(), "dispatcher": ocr_dispatcher.stats()}
+
+@router.get("/rate-limits", summary="Per-User Rate Limit Metrics")
+async def rate_limit_status():
+    """
+    Reports the rate limiter's backend, each limited route's configured limit,
+    and how many requests this worker let through or throttled with 429.
+    """
+    return rate_limiter.stats()
+
+@router.get("/reconcile-compaction", summary="Reconcile History Compaction")
+async def reconcile_compaction_status():
+    """
+    Reports the compaction job that moves superseded reconciliations into the
+    archive table: passes, batches, rows archived and the last error.
+    """
+    return reconcile_compactor.stats()
+
+@router.get("/live", summary="Liveness Probe")
+async def liveness():
+    """
+    Answers as long as the worker's event loop is running.
+    """
+    return {
+        "status": "alive",
+        "uptimeSeconds": round(time.time() - tracker.started_at, 1),
+        "inFlightRequests": tracker.in_flight,
+    }
+
+@router.get("/ready", summary="Readiness Probe")
+async def readiness():
+    """
+    Reports whether this worker should receive traffic: it must not be
+    draining, and a round trip through its Prisma connection pool must succeed.
+    A missing read replica does not fail the probe, since reads fall back to
+    the primary.
+    """
+    pool = {**pool_settings(), "connected": prisma.is_connected(), "latencyMs": None, "error": None}
+    if read_prisma is not None:
+        pool["readReplicaConnected"] = read_prisma.is_connected()
+    ready = not tracker.draining and pool["connected"]
+
+    if pool["connected"]:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(prisma.query_raw("SELECT 1"), timeout=READINESS_QUERY_TIMEOUT_SECONDS)
+            pool["latencyMs"] = round((time.perf_counter() - start) * 1000, 2)
+        except Exception as e:
+            ready = False
+            pool["error"] = str(e) or e.__class__.__name__
+
+    body = {
+        "status": "ready" if ready else "unavailable",
+        "draining": tracker.draining,
+        "inFlightRequests": tracker.in_flight,
+        "pool": pool,
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
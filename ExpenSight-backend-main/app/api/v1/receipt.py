@@ -1,15 +1,77 @@
-from fastapi import APIRouter,Depends,UploadFile, File
-from app.dependencies.deps import get_current_user
-from app.controllers.receipt_controller import upload_receipt_file
+import io
+from typing import Optional
+from fastapi import APIRouter,Depends,UploadFile, File, Header
+from app.dependencies.deps import get_current_user, rate_limited
+from app.services.idempotency import run_idempotent, request_fingerprint
+from app.controllers.receipt_controller import upload_receipt_file, serve_receipt_file, read_upload
+from app.services.ocr_dispatcher import parse_priority
+from app.services.progress_stream import progress_stream_response
 
 
 router = APIRouter(prefix="/v1/receipt",tags=["Receipt Upload"])
 
-UPLOAD_DIR = "temp_uploads"
+UPLOAD_IDEMPOTENCY_ROUTE = "POST /v1/receipt/upload"
 
 @router.post("/upload")
-async def upload_receipt(file:UploadFile = File(...), current_user: str = Depends(get_current_user)):
+async def upload_receipt(
+    file:UploadFile = File(...),
+    current_user: str = Depends(rate_limited("receipt_upload", idempotency_route=UPLOAD_IDEMPOTENCY_ROUTE)),
+    x_upload_priority: Optional[str] = Header(None, description="'interactive' (default) or 'bulk'. Bulk uploads wait behind interactive ones for OCR."),
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key get the first response instead of a second OCR run and expense."),
+):
     """
     Endpoint to upload a receipt file.
     """
-    return await upload_receipt_file(file, current_user)
\ No newline at end of file
+    priority = parse_priority(x_upload_priority)
+    fingerprint = None
+    if idempotency_key is not None:
+        # Bounded like the upload itself, so a key cannot bypass the size cap.
+        fingerprint = request_fingerprint(file.filename or "", await read_upload(file))
+        await file.seek(0)
+    return await run_idempotent(
+        current_user.id, UPLOAD_IDEMPOTENCY_ROUTE, idempotency_key, fingerprint,
+        lambda: upload_receipt_file(file, current_user, priority),
+    )
+
+@router.post("/upload/stream")
+async def upload_receipt_stream(
+    file:UploadFile = File(...),
+    current_user: str = Depends(rate_limited("receipt_upload")),
+    x_upload_priority: Optional[str] = Header(None, description="'interactive' (default) or 'bulk'."),
+):
+    """
+    Same as /upload, but answers with Server-Sent Events: one per stage
+    (received, preprocessing, ocr_started, ocr_done, saved) and finally
+    `complete` with the /upload response body, or `error` with its status.
+    """
+    # Buffer the upload so the stream does not depend on the form's temp
+    # file, which may be closed before the response has finished. Files over
+    # the size cap get a plain 413 before anything is buffered or streamed.
+    upload = UploadFile(io.BytesIO(await read_upload(file)), filename=file.filename)
+    priority = parse_priority(x_upload_priority)
+    return progress_stream_response(
+        lambda progress: upload_receipt_file(upload, current_user, priority, progress=progress)
+    )
+
+@router.get("/{receipt_id}/file")
+async def download_receipt(
+    receipt_id: int,
+    current_user: str = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Streams the originally uploaded receipt. Supports Range requests and
+    If-None-Match (the ETag is the file's SHA-256).
+    """
+    return await serve_receipt_file(receipt_id, current_user, if_none_match)
+
+@router.get("/{receipt_id}/thumbnail")
+async def receipt_thumbnail(
+    receipt_id: int,
+    current_user: str = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Returns the small JPEG preview generated when the receipt was stored.
+    """
+    return await serve_receipt_file(receipt_id, current_user, if_none_match, thumbnail=True)
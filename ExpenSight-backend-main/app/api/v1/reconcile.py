@@ -1,33 +1,73 @@
-from fastapi import APIRouter, Depends
-from app.schemas.reconcile_schema import ReconcileCreate, ReconcileResponse,ReconciliationHistoryResponse
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.encoders import jsonable_encoder
+from app.schemas.reconcile_schema import (
+    ReconcileCreate, ReconcileCreateResponse, ReconciliationHistoryResponse, ReconciliationHistoryFieldsResponse,
+)
 from app.controllers import reconcile_controller
-from app.dependencies.deps import get_current_user
-from typing import Optional
+from app.dependencies.deps import get_current_user, conditional_user_data, rate_limited
+from app.services.fast_json import FAST_LIST_SERIALIZATION, FastJSONResponse, reconcile_history_response
+from app.services.sparse_fields import RECONCILE_FIELDS, RECONCILE_INCLUDES
+from app.services.idempotency import run_idempotent, request_fingerprint
+from typing import Optional, Union
 
 router = APIRouter(
     prefix="/v1/reconcile",
     tags=["Reconciliation"]
 )
 
-@router.post("/",response_model=ReconcileResponse)
-async def reconcile_expense(reconcile_data: ReconcileCreate, current_user = Depends(get_current_user)):
-    new_reconciliation = await reconcile_controller.create_reconciliation(reconcile_data=reconcile_data,current_user=current_user)
-    return new_reconciliation
+RECONCILE_IDEMPOTENCY_ROUTE = "POST /v1/reconcile/"
+
+@router.post("/",response_model=ReconcileCreateResponse)
+async def reconcile_expense(
+    reconcile_data: ReconcileCreate,
+    current_user = Depends(rate_limited("reconcile", idempotency_route=RECONCILE_IDEMPOTENCY_ROUTE)),
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key get the first response instead of a second conversion."),
+):
+    return await run_idempotent(
+        current_user.id, RECONCILE_IDEMPOTENCY_ROUTE, idempotency_key, request_fingerprint(reconcile_data.model_dump()),
+        lambda: reconcile_controller.create_reconciliation(reconcile_data=reconcile_data,current_user=current_user),
+        serialize=lambda result: jsonable_encoder(ReconcileCreateResponse.model_validate(result, from_attributes=True)),
+    )
 
 @router.get(
     "/history",
-    response_model=ReconciliationHistoryResponse,
+    # Sparse requests (`fields` / `include`) return the partial shape.
+    response_model=Union[ReconciliationHistoryResponse, ReconciliationHistoryFieldsResponse],
     summary="Get Reconciliation History",
     description="Retrieves a list of all currency conversions performed by the user."
 )
-async def get_history(current_user = Depends(get_current_user)):
+async def get_history(
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(RECONCILE_FIELDS)}"),
+    include: Optional[str] = Query(None, description=f"Comma-separated relations to join: {', '.join(RECONCILE_INCLUDES)}"),
+    include_archived: bool = Query(False, description="Also return conversions superseded by a later one for the same expense."),
+    current_user = Depends(get_current_user),
+    cache_headers = Depends(conditional_user_data)
+):
     """
     This endpoint fetches the complete reconciliation history for the
     authenticated user.
+
+    With `fields` and/or `include`, each entry carries only the selected
+    columns (plus `id`) and relations; `expense` is only joined when included.
+
+    Only each expense's latest conversion is kept once compaction has run;
+    `include_archived=true` adds the earlier ones back.
     """
+    if fields is not None or include is not None:
+        history_rows = await reconcile_controller.get_reconciliation_history_fields(
+            current_user, fields, include, include_archived
+        )
+        return FastJSONResponse(
+            {"message": "History fetched successfully", "reconciliation_history": history_rows},
+            headers=cache_headers,
+        )
+
     history_list = await reconcile_controller.get_reconciliation_history(
-        current_user=current_user
+        current_user=current_user, include_archived=include_archived
     )
+
+    if FAST_LIST_SERIALIZATION:
+        return reconcile_history_response("History fetched successfully", history_list, headers=cache_headers)
     
     # We wrap the list in a dictionary to match the ReconciliationHistoryResponse schema
     return {
@@ -43,7 +83,9 @@ async def get_history(current_user = Depends(get_current_user)):
 )
 async def get_specific_expense_history(
     expense_id: Optional[int] = None,
-    current_user = Depends(get_current_user)
+    include_archived: bool = Query(False, description="Also return conversions superseded by a later one."),
+    current_user = Depends(get_current_user),
+    cache_headers = Depends(conditional_user_data)
 ):
     """
     This endpoint fetches the complete reconciliation history for a single
@@ -51,7 +93,8 @@ async def get_specific_expense_history(
     """
     history_list = await reconcile_controller.get_reconciliation_history_for_expense(
         expense_id=expense_id,
-        current_user=current_user
+        current_user=current_user,
+        include_archived=include_archived
     )
     
     return {
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends
 from app.dependencies.deps import get_current_user
-from app.controllers.user_controller import get_me,update_base_currency
+from app.controllers.user_controller import get_me,update_base_currency,get_reconversion_status,resume_reconversion
 from app.schemas.user_schema import UserSettingsUpdate
 
 
@@ -16,4 +16,22 @@ async def me(current_user=Depends(get_current_user)):
 
 @router.patch("/settings/update/")
 async def update_base(settings:UserSettingsUpdate,current_user = Depends(get_current_user)):
-    return await update_base_currency(settings,current_user)
\ No newline at end of file
+    return await update_base_currency(settings,current_user)
+
+@router.get("/reconversion")
+async def latest_reconversion(current_user = Depends(get_current_user)):
+    """
+    Progress of the re-conversion started by the latest base-currency change.
+    """
+    return await get_reconversion_status(current_user)
+
+@router.get("/reconversion/{job_id}")
+async def reconversion_status(job_id: int, current_user = Depends(get_current_user)):
+    return await get_reconversion_status(current_user, job_id)
+
+@router.post("/reconversion/{job_id}/resume")
+async def reconversion_resume(job_id: int, current_user = Depends(get_current_user)):
+    """
+    Resumes a failed re-conversion from the last chunk it completed.
+    """
+    return await resume_reconversion(current_user, job_id)
@@ -1,32 +1,23 @@
 from app.schemas.user_schema import RegisterUserOut, LoginUserOut
 from app.security.jwt import create_access_token
 from app.security.hash import hash_password, verify_password
-from app.database.db import prisma
+from app.repositories.registry import repositories
 from fastapi import HTTPException
+from prisma.errors import UniqueViolationError
 
 async def register_user(email:str,password:str,baseCurrency:str) -> RegisterUserOut:
-    existing_user = await prisma.users.find_first(
-        where= {
-            "email": email
-        }
-    )
-    if existing_user:
-        raise HTTPException(status_code= 400, detail="Email already registered")
+    # The unique index on email rejects duplicates, so no lookup is needed first
+    # (and two concurrent registrations cannot both get through).
     hashed_password = hash_password(password)
-    await prisma.users.create(
-        data={
-            "email": email,
-            "hashedPassword": hashed_password,
-            "baseCurrency":baseCurrency.upper()
-        }
-    )
+    try:
+        await repositories().users.create(email, hashed_password, baseCurrency.upper())
+    except UniqueViolationError:
+        raise HTTPException(status_code= 400, detail="Email already registered")
     return RegisterUserOut(message="User registered successfully", email=email,baseCurrency=baseCurrency)
 
 
 async def login_user(email:str,password:str) -> LoginUserOut:
-    user = await prisma.users.find_first(
-        where={"email": email}
-    )
+    user = await repositories().users.find_by_email(email)
     if not user or not verify_password(password, user.hashedPassword):
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
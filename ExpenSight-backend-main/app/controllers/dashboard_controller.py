@@ -1,6 +1,11 @@
+import asyncio
 from datetime import datetime, timedelta,date
 from calendar import month_abbr
-from app.database.db import prisma
+from app.repositories.registry import repositories
+from app.controllers.expense_controller import get_all_expenses
+from app.controllers.user_controller import get_me
+from app.services.category_normalizer import category_label
+from typing import Optional
 
 async def get_dashboard_stats(current_user):
     """
@@ -11,29 +16,22 @@ async def get_dashboard_stats(current_user):
     start_of_month = datetime(today.year, today.month, 1)
     
     # --- Perform database queries concurrently ---
-    
-    # 1. Get total number of expenses for the user
-    total_receipts_count = await prisma.expense.count(
-        where={'userId': current_user.id}
-    )
-
-    # 2. Get number of unique expenses that have been reconciled
-    distinct_expenses = await prisma.reconcile.group_by(
-    by=['expenseId'],
-    where={'userId': current_user.id}
-)
-    reconciled_count = len(distinct_expenses)
+    expenses = repositories().expenses
 
-
-
-    # 3. Get number of expenses created this month
-    this_month_count = await prisma.expense.count(
-        where={
-            'userId': current_user.id,
-            'createdAt': {
-                'gte': start_of_month
+    total_receipts_count, reconciled_count, this_month_count = await asyncio.gather(
+        # 1. Get total number of expenses for the user
+        expenses.count(where={'userId': current_user.id}),
+        # 2. Get number of unique expenses that have been reconciled
+        repositories().reconciles.count_reconciled_expenses(current_user.id),
+        # 3. Get number of expenses created this month
+        expenses.count(
+            where={
+                'userId': current_user.id,
+                'createdAt': {
+                    'gte': start_of_month
+                }
             }
-        }
+        ),
     )
 
     # 4. Calculate pending count
@@ -52,43 +50,95 @@ async def get_dashboard_stats(current_user):
 
 async def get_expense_trends(user):
     """
-    Final corrected version for expense trends.
-    This adds explicit ::timestamp casts to the SQL query to fix the operator error.
+    Totals of the last six months, including the current one.
+    All months come from one grouped query (the Prisma one keeps the explicit
+    ::timestamp casts that fix the operator error); months without expenses
+    are reported as 0.
     """
-    trends = []
     today = datetime.now()
 
+    months = []
     for i in range(5, -1, -1):
         current_month_num = today.month - i
         current_year = today.year
         if current_month_num <= 0:
             current_month_num += 12
             current_year -= 1
-        
-        month_start = datetime(current_year, current_month_num, 1)
-        
-        if month_start.month == 12:
-            month_end = month_start.replace(year=month_start.year + 1, month=1) - timedelta(seconds=1)
-        else:
-            month_end = month_start.replace(month=month_start.month + 1) - timedelta(seconds=1)
-
-        # The key fix is adding `::timestamp` to cast the parameters
-        result = await prisma.query_raw(
-            """
-            SELECT SUM("amount") as total FROM "expenses" 
-            WHERE "userId" = $1 AND "date" >= $2::timestamp AND "date" <= $3::timestamp
-            """,
-            user.id,
-            month_start,
-            month_end
-        )
-        
-        month_name = month_abbr[month_start.month]
-        total_amount = result[0]['total'] if result and result[0]['total'] is not None else 0
-
-        trends.append({
-            "name": month_name,
-            "total": float(total_amount)
+        months.append(datetime(current_year, current_month_num, 1))
+
+    last_month = months[-1]
+    if last_month.month == 12:
+        period_end = last_month.replace(year=last_month.year + 1, month=1) - timedelta(seconds=1)
+    else:
+        period_end = last_month.replace(month=last_month.month + 1) - timedelta(seconds=1)
+
+    totals = await repositories().expenses.monthly_totals(user.id, months[0], period_end)
+
+    trends = [
+        {
+            "name": month_abbr[month_start.month],
+            "total": float(totals.get(month_start.strftime('%Y-%m'), 0.0))
+        }
+        for month_start in months
+    ]
+    return {"data": trends}
+
+
+async def get_category_breakdown(user, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """
+    Per-category totals over the canonical category key, from one grouped
+    query on the (userId, categoryKey) index.
+
+    Like the trends, `total` adds up raw amounts; the per-currency sums are
+    returned alongside so mixed-currency categories can be shown accurately.
+    """
+    where = {'userId': user.id}
+    date_range = {}
+    if start_date:
+        date_range['gte'] = datetime.combine(start_date, datetime.min.time())
+    if end_date:
+        date_range['lt'] = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    if date_range:
+        where['date'] = date_range
+
+    groups = await repositories().expenses.totals_by_category(where)
+
+    categories = {}
+    for group in groups:
+        key = group['categoryKey']
+        amount = group['total']
+        entry = categories.setdefault(key, {
+            "key": key,
+            "label": category_label(key),
+            "count": 0,
+            "total": 0.0,
+            "totalsByCurrency": {},
         })
-        
-    return {"data": trends}
\ No newline at end of file
+        entry["count"] += group['count']
+        entry["total"] += amount
+        entry["totalsByCurrency"][group['currency']] = round(amount, 2)
+
+    data = sorted(categories.values(), key=lambda c: c["total"], reverse=True)
+    for entry in data:
+        entry["total"] = round(entry["total"], 2)
+    return {"data": data}
+
+
+async def get_dashboard_bundle(user, recent_limit: int = 10):
+    """
+    Everything the dashboard shows on load: the profile, the stats, the
+    six-month trends and the most recent expenses. The queries of all four
+    run concurrently, so the request takes about as long as the slowest one.
+    """
+    profile, stats, trends, recent_expenses = await asyncio.gather(
+        get_me(user),
+        get_dashboard_stats(user),
+        get_expense_trends(user),
+        get_all_expenses(user, limit=recent_limit),
+    )
+    return {
+        "profile": profile,
+        "stats": stats,
+        "trends": trends["data"],
+        "recentExpenses": recent_expenses,
+    }
@@ -1,7 +1,12 @@
 from fastapi import HTTPException
-from app.database.db import prisma
+from app.database.db import mark_user_write
+from app.repositories.registry import repositories
 from app.schemas.expense_schema import ExpenseIn
-from datetime import datetime
+from app.services.category_normalizer import normalize_category
+from app.services.sparse_fields import (
+    EXPENSE_FIELDS, EXPENSE_INCLUDES, RECEIPT_FIELDS, parse_fields, parse_include, shape_row,
+)
+from datetime import date, datetime, time, timedelta
 from typing import Optional
 
 # async def get_all_expenses(user,start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
@@ -27,15 +32,17 @@ async def add_expense_manually(expense:ExpenseIn,current_user):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not Authenticated")
     
-    ex = await prisma.expense.create(
+    ex = await repositories().expenses.create(
         data={
             'amount': expense.amount,
                 'currency': expense.currency.upper(),
                 'category': expense.category,
+                'categoryKey': normalize_category(expense.category),
                 'date': datetime.now(),
                 'userId':current_user.id
         }
     )
+    await mark_user_write(current_user.id)
     return ex
 
 
@@ -53,12 +60,111 @@ async def get_all_expenses(user,start_date: Optional[datetime] = None, end_date:
     
     # The query is very simple now. It fetches the full Expense object,
     # which now includes the status and convertedAmount fields.
-    expenses = await prisma.expense.find_many(
-        where=where_clause,
-        order={'createdAt': 'desc'},
-        take=limit,
-        include={'receipt': True}
-    )
+    expenses = await repositories().expenses.list_for_user(where_clause, limit=limit)
 
     # We return the raw Prisma models and let FastAPI serialize them using the schema
     return expenses
+
+
+async def get_expense_fields(user, fields: Optional[str] = None, include: Optional[str] = None):
+    """
+    The expense list with only the requested columns (`fields=amount,date`)
+    and relations (`include=receipt`). The projection runs in the database, so
+    unselected columns and the receipt join are never fetched. Without
+    `fields` every column is returned; without `include` no relation is.
+    """
+    columns = parse_fields(fields, EXPENSE_FIELDS) or list(EXPENSE_FIELDS)
+    includes = parse_include(include, EXPENSE_INCLUDES) or set()
+    include_receipt = "receipt" in includes
+
+    rows = await repositories().expenses.project(user.id, columns, include_receipt)
+    if include_receipt:
+        return [shape_row(row, columns, "receipt", RECEIPT_FIELDS) for row in rows]
+    return [shape_row(row, columns) for row in rows]
+
+
+# Columns the search endpoint may sort by; each is covered by a (userId, column) index.
+SEARCH_SORT_FIELDS = ("date", "amount", "createdAt", "category")
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+def build_search_where(
+    user_id: int,
+    q: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    currency: Optional[str] = None,
+    status: Optional[str] = None,
+) -> dict:
+    """
+    Translates search filters into a Prisma where clause. The category match is
+    a case-insensitive substring (ILIKE '%q%'), which Postgres answers from the
+    pg_trgm GIN index on expenses.category.
+    """
+    if min_amount is not None and max_amount is not None and min_amount > max_amount:
+        raise HTTPException(status_code=400, detail="min_amount cannot be greater than max_amount")
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date cannot be after end_date")
+
+    where = {'userId': user_id}
+    if q and q.strip():
+        where['category'] = {'contains': q.strip(), 'mode': 'insensitive'}
+
+    amount = {}
+    if min_amount is not None:
+        amount['gte'] = min_amount
+    if max_amount is not None:
+        amount['lte'] = max_amount
+    if amount:
+        where['amount'] = amount
+
+    # Dates are whole days: end_date is inclusive.
+    date_range = {}
+    if start_date:
+        date_range['gte'] = datetime.combine(start_date, time.min)
+    if end_date:
+        date_range['lt'] = datetime.combine(end_date + timedelta(days=1), time.min)
+    if date_range:
+        where['date'] = date_range
+
+    if currency:
+        where['currency'] = currency.strip().upper()
+    if status:
+        where['status'] = status
+    return where
+
+
+async def search_expenses(
+    user,
+    q: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    currency: Optional[str] = None,
+    status: Optional[str] = None,
+    sort: str = "date",
+    order: str = "desc",
+    page: int = 1,
+    page_size: int = 20,
+):
+    """
+    Filters, sorts and paginates the user's expenses in the database.
+
+    Returns:
+        A dict with the page of expenses (receipts included), the total number
+        of matches, and the page / page size that were applied.
+    """
+    if sort not in SEARCH_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SEARCH_SORT_FIELDS)}")
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), SEARCH_MAX_PAGE_SIZE)
+
+    where = build_search_where(user.id, q, min_amount, max_amount, start_date, end_date, currency, status)
+    # id breaks ties so pages never overlap or skip rows with equal sort keys.
+    order_by = [{sort: order}, {'id': order}]
+
+    items, total = await repositories().expenses.search(where, order_by, skip=(page - 1) * page_size, take=page_size)
+    return {"items": items, "total": total, "page": page, "pageSize": page_size}
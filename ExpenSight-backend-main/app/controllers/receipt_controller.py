@@ -1,36 +1,48 @@
 from fastapi import HTTPException
-import os, uuid, dotenv, re, json
-import google.generativeai as genai
-from app.database.db import prisma
+import re, json, asyncio, logging
+from app.database.db import mark_user_write
+from app.repositories.registry import repositories
+from app.services.ocr_service import get_ocr_provider
+from app.services.receipt_preprocessing import preprocess_receipt
+from app.services.pdf_text_extractor import try_local_extraction
+from app.services.ocr_batcher import OCRBatcher
+from app.services.ocr_dispatcher import ocr_dispatcher, PRIORITY_INTERACTIVE
+from app.services.blob_store import blob_store, THUMBNAIL_MIME_TYPE, RECEIPT_MAX_UPLOAD_BYTES
+from app.services.etag import etag_matches
+from app.services.category_normalizer import normalize_category
+from app.services.progress_stream import ProgressCallback, report
+from fastapi.responses import FileResponse, Response
 from datetime import datetime
 from pathlib import Path
+from typing import Optional
 import mimetypes
 
-dotenv.load_dotenv()
+logger = logging.getLogger(__name__)
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
-model = genai.GenerativeModel("gemini-2.0-flash")
-
-
-async def upload_receipt_file(file, current_user):
+async def upload_receipt_file(file, current_user, priority: int = PRIORITY_INTERACTIVE, progress: Optional[ProgressCallback] = None):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    file_location = None  # Define file_location here to access it in finally block
+    stored = None
+    data, mime_type = b"", None
     try:
         if not file.filename.endswith(('.png', '.jpg', '.jpeg', '.pdf')):
             raise HTTPException(status_code=400, detail="Invalid file type. Only PNG, JPG, JPEG, and PDF files are allowed.")
 
-        # Ensure the temp_uploads directory exists
-        os.makedirs("temp_uploads", exist_ok=True)
-        file_location = f"temp_uploads/{uuid.uuid4().hex}_{file.filename}"
-        
-        with open(file_location, "wb") as buffer:
-            buffer.write(await file.read())
+        mime_type, _ = mimetypes.guess_type(file.filename)
+        data = await read_upload(file)
+        await report(progress, "received", filename=file.filename, bytes=len(data))
 
-        parsed_data = await process_receipt(file_location)
-        ocr_result = await create_expense_and_receipt(parsed_data, current_user, file.filename)
+        # The original is kept in the content-addressed store so it can be
+        # downloaded again; OCR reads it from there.
+        stored = await asyncio.to_thread(blob_store.put, data, mime_type)
+        parsed_data = await process_receipt(
+            blob_store.path_for(stored["contentHash"]), priority, mime_type=mime_type, progress=progress
+        )
+        ocr_result = await create_expense_and_receipt(parsed_data, current_user, file.filename, stored, progress=progress)
+        # A failed upload of the same bytes may have removed the blob meanwhile.
+        await asyncio.to_thread(_restore_blob, data, mime_type)
 
         return {
             "message": "Receipt uploaded and processed successfully.",
@@ -39,27 +51,111 @@ async def upload_receipt_file(file, current_user):
         }
     # This ensures that 4xx errors from deeper functions are not turned into 500 errors.
     except HTTPException as e:
+        await _discard_new_blob(stored, data, mime_type)
         raise e
     except Exception as e:
+        await _discard_new_blob(stored, data, mime_type)
         raise HTTPException(status_code=500, detail=f"An error occurred while uploading the file and performing the ocr: {str(e)}")
-    finally:
-        if file_location and os.path.exists(file_location):
-            os.remove(file_location)
 
 
-async def process_receipt(file_path: str) -> dict:
+def _restore_blob(data: bytes, mime_type: Optional[str]) -> None:
+    """Writes the blob again if it is missing (put keeps an existing one as is)."""
+    blob_store.put(data, mime_type)
+
+
+async def read_upload(file) -> bytes:
+    """
+    Reads an uploaded file, never more than RECEIPT_MAX_UPLOAD_BYTES + 1
+    bytes into memory.
+
+    Raises:
+        HTTPException(413): If the file is larger than RECEIPT_MAX_UPLOAD_BYTES.
+    """
+    data = await file.read(RECEIPT_MAX_UPLOAD_BYTES + 1)
+    if len(data) > RECEIPT_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Receipt files may be at most {RECEIPT_MAX_UPLOAD_BYTES // (1024 * 1024)} MB.",
+        )
+    return data
+
+
+async def _discard_new_blob(stored: Optional[dict], data: bytes, mime_type: Optional[str]) -> None:
+    """
+    Removes the blob of a failed upload so it does not linger without a
+    receipt row.
+
+    The store is content-addressed and shared by all users, so a concurrent
+    upload of the same bytes may rely on the blob even when this upload wrote
+    it. It is kept while any receipt points at it, and written back if such a
+    receipt was committed while it was being removed (a successful upload
+    also restores a missing blob after committing). When the check itself
+    fails, the blob is left behind: an orphan is harmless, a dangling
+    receipt is not.
+    """
+    if stored is None or stored["deduplicated"]:
+        return
+    content_hash = stored["contentHash"]
+    receipts = repositories().receipts
+    try:
+        if await receipts.references_blob(content_hash):
+            return
+        await asyncio.to_thread(blob_store.remove, content_hash)
+        if await receipts.references_blob(content_hash):
+            await asyncio.to_thread(_restore_blob, data, mime_type)
+    except Exception as e:
+        logger.warning("Could not remove the blob of a failed upload: %s", e)
+
+
+async def process_receipt(
+    file_path: str,
+    priority: int = PRIORITY_INTERACTIVE,
+    mime_type: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> dict:
     file_path = Path(file_path)
-    mime_type, _ = mimetypes.guess_type(str(file_path))
+    if not mime_type:
+        # Content-addressed blobs carry no extension, so callers pass the type.
+        mime_type, _ = mimetypes.guess_type(str(file_path))
     if not mime_type:
         raise ValueError("Could not determine MIME type of the uploaded file")
 
     with open(file_path, "rb") as f:
-        file_blob = {
-            "mime_type": mime_type,
-            "data": f.read()
-        }
+        raw_data = f.read()
 
-    prompt = """
+    # Digital PDFs usually carry a text layer we can parse in milliseconds;
+    # only scans and ambiguous documents go to the OCR model.
+    if mime_type == "application/pdf":
+        await report(progress, "ocr_started", engine="pdf_text")
+        local_result = await asyncio.to_thread(try_local_extraction, raw_data)
+        if local_result:
+            logger.info(
+                "Extracted %s from its PDF text layer (confidence %.2f); skipping OCR",
+                file_path.name, local_result["confidence"]
+            )
+            await report(progress, "ocr_done", engine="pdf_text")
+            return {key: local_result[key] for key in REQUIRED_OCR_KEYS}
+
+    await report(progress, "preprocessing", bytes=len(raw_data))
+    # Rotate, downscale and recompress images / trim PDFs before they go to the model.
+    data, mime_type, stats = await asyncio.to_thread(preprocess_receipt, raw_data, mime_type)
+    logger.info(
+        "OCR payload for %s: %d -> %d bytes (%s)",
+        file_path.name, stats["bytesBefore"], stats["bytesAfter"], ", ".join(stats["steps"]) or "none"
+    )
+    file_blob = {
+        "mime_type": mime_type,
+        "data": data
+    }
+
+    # Receipts uploaded at about the same time are extracted in one model call.
+    await report(progress, "ocr_started", engine="gemini", bytes=stats["bytesAfter"])
+    parsed_data = await ocr_batcher.submit(file_blob, priority)
+    await report(progress, "ocr_done", engine="gemini")
+    return parsed_data
+
+
+RECEIPT_PROMPT = """
     You are an OCR assistant. Extract the following structured data from this receipt:
     - Total amount spent
     - Expense category (like food, groceries, fuel, etc.)
@@ -73,28 +169,89 @@ async def process_receipt(file_path: str) -> dict:
         "date": "<YYYY-MM-DD>"
     }
     """
-    response = model.generate_content(contents=[prompt, file_blob])
 
-    if not response or not response.candidates:
-        raise ValueError("No response from Gemini AI")
+BATCH_RECEIPT_PROMPT = """
+    You are an OCR assistant. You are given {count} separate receipts, in order.
+    For EACH receipt extract the following structured data:
+    - Total amount spent
+    - Expense category (like food, groceries, fuel, etc.)
+    - Date of transaction
+
+    Respond only with a JSON array of exactly {count} elements, one per receipt and in the
+    same order as the receipts were given. Use null for a receipt you cannot read:
+    [
+        {{
+            "amount": <float>,
+            "currency": "<string> e.g. USD, INR, EU , etc.",
+            "category": "<string>",
+            "date": "<YYYY-MM-DD>"
+        }}
+    ]
+    """
+
+REQUIRED_OCR_KEYS = ["amount", "currency", "category", "date"]
 
+
+def parse_ocr_response(response_text: str) -> dict:
     try:
-        match = re.search(r"\{.*\}", response.text, re.DOTALL)
+        match = re.search(r"\{.*\}", response_text, re.DOTALL)
         if not match:
-            raise ValueError(f"No valid JSON object found in AI response. Raw text: {response.text}")
+            raise ValueError(f"No valid JSON object found in AI response. Raw text: {response_text}")
         
         json_string = match.group(0)
         parsed_data = json.loads(json_string)
 
     except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to decode JSON from AI response: {e}. Raw text: {response.text}")
+        raise ValueError(f"Failed to decode JSON from AI response: {e}. Raw text: {response_text}")
 
-    if not all(key in parsed_data for key in ["amount", "currency", "category", "date"]):
+    if not all(key in parsed_data for key in REQUIRED_OCR_KEYS):
         raise ValueError("Incomplete data extracted from receipt")
     return parsed_data
 
 
-async def create_expense_and_receipt(parsed_data, current_user, filename: str):
+def parse_batch_ocr_response(response_text: str, count: int) -> list:
+    """
+    Parses the JSON array of a batched OCR call. Entries that are not complete
+    objects come back as None so only those receipts are retried on their own.
+    """
+    match = re.search(r"\[.*\]", response_text, re.DOTALL)
+    if not match:
+        raise ValueError(f"No JSON array found in batched AI response. Raw text: {response_text}")
+    items = json.loads(match.group(0))
+    if not isinstance(items, list) or len(items) != count:
+        raise ValueError(f"Expected {count} receipts in batched AI response, got {len(items) if isinstance(items, list) else 0}")
+    return [
+        item if isinstance(item, dict) and all(key in item for key in REQUIRED_OCR_KEYS) else None
+        for item in items
+    ]
+
+
+async def _generate(contents: list, priority: int) -> str:
+    # The OCR SDK is loaded on the first call, not when this module is imported.
+    provider = get_ocr_provider()
+    # Every model call of this worker goes through the shared dispatcher, which
+    # paces, queues and prioritises them and backs off when Gemini pushes back.
+    return await ocr_dispatcher.submit(lambda: asyncio.to_thread(provider.generate, contents), priority)
+
+
+async def _ocr_single(file_blob: dict, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    response_text = await _generate([RECEIPT_PROMPT, file_blob], priority)
+    return parse_ocr_response(response_text)
+
+
+async def _ocr_batch(file_blobs: list, priority: int = PRIORITY_INTERACTIVE) -> list:
+    prompt = BATCH_RECEIPT_PROMPT.format(count=len(file_blobs))
+    response_text = await _generate([prompt, *file_blobs], priority)
+    return parse_batch_ocr_response(response_text, len(file_blobs))
+
+
+# Receipts arriving within a short window share one model call.
+ocr_batcher = OCRBatcher(_ocr_single, _ocr_batch)
+
+
+async def create_expense_and_receipt(
+    parsed_data, current_user, filename: str, stored: Optional[dict] = None, progress: Optional[ProgressCallback] = None
+):
     try:
         amount_val = parsed_data.get('amount')
 
@@ -116,23 +273,34 @@ async def create_expense_and_receipt(parsed_data, current_user, filename: str):
         date_str = parsed_data.get('date', datetime.now().strftime('%Y-%m-%d'))
         expense_date = datetime.strptime(date_str, '%Y-%m-%d')
 
-        expense = await prisma.expense.create(
+        receipt_data = {
+            'filename': filename,
+            'userId': current_user.id,
+        }
+        if stored:
+            receipt_data.update({
+                'contentHash': stored['contentHash'],
+                'contentType': stored['contentType'],
+                'size': stored['size'],
+                'hasThumbnail': stored['hasThumbnail'],
+            })
+
+        # One nested create: either both rows exist or neither does, so a
+        # failure can no longer leave an expense without its receipt.
+        expense = await repositories().expenses.create_with_receipt(
             data={
                 'amount': amount,
                 'currency': currency,
                 'category': category,
+                'categoryKey': normalize_category(category),
                 'date': expense_date,
                 'userId':current_user.id
-            }
-        )
-
-        receipt = await prisma.receipts.create(
-            data={
-                'filename': filename,
-                'userId': current_user.id,
-                'expenseId': expense.id
-            }
+            },
+            receipt=receipt_data,
         )
+        receipt = expense.receipt
+        await mark_user_write(current_user.id)
+        await report(progress, "saved", expenseId=expense.id, receiptId=receipt.id)
         return {
             "message": "Expense and receipt created successfully",
             "expense": {
@@ -142,6 +310,7 @@ async def create_expense_and_receipt(parsed_data, current_user, filename: str):
                 'date': expense_date,
             },
             "receipt": {
+                'id': receipt.id,
                 'filename': filename,
                 'userId': current_user.id,
                 'expenseId': expense.id
@@ -151,3 +320,47 @@ async def create_expense_and_receipt(parsed_data, current_user, filename: str):
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create expense and receipt: {str(e)}")
+
+
+# Blobs never change under a given hash, so clients may cache them for good.
+STORED_FILE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+async def serve_receipt_file(receipt_id: int, current_user, if_none_match: Optional[str] = None, thumbnail: bool = False):
+    """
+    Returns the stored original (or its thumbnail) of one of the user's receipts.
+
+    The content hash doubles as a strong ETag, so If-None-Match answers 304
+    without touching the disk, and FileResponse serves Range requests for
+    large PDFs.
+    """
+    receipt = await repositories().receipts.find_for_user(receipt_id, current_user.id)
+    if not receipt:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    if not receipt.contentHash:
+        raise HTTPException(status_code=404, detail="The original file of this receipt was not kept")
+    if thumbnail and not receipt.hasThumbnail:
+        raise HTTPException(status_code=404, detail="No thumbnail available for this receipt")
+
+    etag = f'"{receipt.contentHash}{"-thumb" if thumbnail else ""}"'
+    headers = {"ETag": etag, "Cache-Control": STORED_FILE_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if thumbnail:
+        path = blob_store.thumbnail_path_for(receipt.contentHash)
+        media_type = THUMBNAIL_MIME_TYPE
+    else:
+        path = blob_store.path_for(receipt.contentHash)
+        media_type = receipt.contentType or "application/octet-stream"
+    if not path.exists():
+        logger.error("Receipt %s points at missing blob %s", receipt.id, path)
+        raise HTTPException(status_code=404, detail="Stored receipt file is missing")
+
+    return FileResponse(
+        path,
+        media_type=media_type,
+        headers=headers,
+        filename=None if thumbnail else receipt.filename,
+        content_disposition_type="inline",
+    )
@@ -1,93 +1,103 @@
 from fastapi import HTTPException
-from app.database.db import prisma
-from app.services.currency_service import get_historical_fx_rate
+from app.database.db import mark_user_write
+from app.repositories.registry import repositories
+from app.services.currency_service import get_historical_fx_rate, get_historical_fx_rates
 from app.schemas.reconcile_schema import ReconcileCreate
-from datetime import datetime
+from app.services.sparse_fields import (
+    RECONCILE_FIELDS, RECONCILE_INCLUDES, RECONCILE_EXPENSE_FIELDS, parse_fields, parse_include, shape_row,
+)
+from typing import Optional
 
 async def create_reconciliation(reconcile_data: ReconcileCreate, current_user):
     """
-    Creates a new reconciliation record for a given expense.
+    Creates reconciliation records for a given expense, one per target currency.
 
     This function performs the following steps:
     1. Fetches the specified expense from the database.
     2. Verifies that the expense belongs to the current user.
-    3. Determines the target conversion currency (either from the request or user's default).
-    4. Calls the currency service to get the historical exchange rate.
-    5. Calculates the converted amount.
-    6. Saves the new reconciliation record to the database.
-    7. Returns the complete reconciliation details.
+    3. Determines the target conversion currencies (from the request or the user's default).
+    4. Gets the historical exchange rates, all targets in one currency service call.
+    5. Calculates the converted amounts.
+    6. Saves all new reconciliation records in one batched insert.
+    7. Marks the expense as reconciled into the first target currency.
+    8. Returns the complete reconciliation details.
 
     Args:
-        reconcile_data: The request data containing expenseId and optional conversionCurrency.
+        reconcile_data: The request data containing expenseId and optional target currencies.
         current_user: The authenticated user object from the dependency.
 
     Returns:
-        The newly created Reconcile object, including nested expense details.
+        The first target's reconciliation, including nested expense details,
+        with every target's result under `conversions`.
 
     Raises:
         HTTPException(404): If the expense is not found.
         HTTPException(403): If the user does not own the expense.
+        HTTPException(503): If the FX service returns no rate for a target.
     """
-    expense = await prisma.expense.find_unique(
-        where= {'id':reconcile_data.expenseId},
-        include={'receipt':True}
-    )
+    expense = await repositories().expenses.find_by_id(reconcile_data.expenseId, include_receipt=True)
     
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
     # if not expense.receipt or expense.receipt.userId != current_user.id:
     #     raise HTTPException(status_code=403,detail="You do not have permission to access this expense.")
-    to_currency = reconcile_data.conversionCurrency or current_user.baseCurrency
+    targets = reconcile_data.target_currencies(current_user.baseCurrency)
     from_currency = expense.currency
-
-    fx_rate = await get_historical_fx_rate(
-        from_currency=from_currency,
-        to_currency=to_currency,
-        transaction_date=expense.date.date()
-    )
-
-    converted_amount = round(expense.amount * fx_rate,2)
-
-    new_reconciliation = await prisma.reconcile.create(
-        data={
+    transaction_date = expense.date.date()
+
+    if len(targets) == 1:
+        # A single target shares in-flight lookups with concurrent requests.
+        rates = {targets[0]: await get_historical_fx_rate(
+            from_currency=from_currency,
+            to_currency=targets[0],
+            transaction_date=transaction_date
+        )}
+    else:
+        # One Frankfurter call (to=A,B,C) for every target not already stored.
+        rates = await get_historical_fx_rates(from_currency, targets, transaction_date)
+    missing = [currency for currency in targets if currency not in rates]
+    if missing:
+        raise HTTPException(status_code=503, detail=f"FX API did not return a rate for {', '.join(missing)}")
+
+    created = await repositories().reconciles.create_many([
+        {
             'expenseId': expense.id,
             'userId': current_user.id,
-            'convertedAmount': converted_amount,
+            'convertedAmount': round(expense.amount * rates[currency], 2),
             'baseCurrency': from_currency,
-            'conversionCurrency': to_currency,
-            'fxRate': fx_rate,
-        },
-        include={'expense': True}
-    )
-    # Step 1: Update the expense
-    await prisma.expense.update(
-        where={'id': expense.id},
-        data={
-            'status': 'RECONCILED',
-            'convertedAmount': converted_amount,
-            'conversionCurrency': to_currency.upper(),
+            'conversionCurrency': currency,
+            'fxRate': rates[currency],
         }
-    )
-
-    # Step 2: Fetch the updated expense with the required fields
-    updated_expense_data = await prisma.expense.find_unique(
-        where={'id': expense.id},
-    )
+        for currency in targets
+    ])
+    # The returned rows are not guaranteed to come back in request order.
+    by_currency = {record.conversionCurrency: record for record in created}
+    conversions = [by_currency[currency] for currency in targets]
+    first = conversions[0]
+
+    # The expense records the first target's conversion; the update returns the new values.
+    updated_expense_data = await repositories().expenses.update(expense.id, {
+        'status': 'RECONCILED',
+        'convertedAmount': first.convertedAmount,
+        'conversionCurrency': first.conversionCurrency,
+    })
+    await mark_user_write(current_user.id)
 
     return {
-        "id": new_reconciliation.id,
+        "id": first.id,
         "status":updated_expense_data.status,
-        "convertedAmount": new_reconciliation.convertedAmount,
-        "baseCurrency": new_reconciliation.baseCurrency,
-        "conversionCurrency": new_reconciliation.conversionCurrency,
-        "fxRate": new_reconciliation.fxRate,
-        "createdAt": datetime.now(),
-        "expense": updated_expense_data
+        "convertedAmount": first.convertedAmount,
+        "baseCurrency": first.baseCurrency,
+        "conversionCurrency": first.conversionCurrency,
+        "fxRate": first.fxRate,
+        "createdAt": first.createdAt,
+        "expense": updated_expense_data,
+        "conversions": conversions,
     }
 
 
-async def get_reconciliation_history(current_user):
+async def get_reconciliation_history(current_user, include_archived: bool = False):
     """
     Fetches all reconciliation records for the currently authenticated user.
 
@@ -97,21 +107,34 @@ async def get_reconciliation_history(current_user):
 
     Args:
         current_user: The authenticated user object from the dependency.
+        include_archived: Also return records superseded by a later
+            reconciliation of the same expense (moved to the archive by compaction).
 
     Returns:
         A list of Reconcile objects.
     """
-    history = await prisma.reconcile.find_many(
-    where={'userId': current_user.id},
-    include={
-        'expense': True,
-    },
-    order={'createdAt': 'desc'}
-    )
+    history = await repositories().reconciles.history(current_user.id, include_archived=include_archived)
 
     return history
 
-async def get_reconciliation_history_for_expense(expense_id: int, current_user):
+async def get_reconciliation_history_fields(
+    current_user, fields: Optional[str] = None, include: Optional[str] = None, include_archived: bool = False
+):
+    """
+    The reconciliation history with only the requested columns and relations
+    (`include=expense`), projected in the database so the expense join is
+    skipped unless asked for.
+    """
+    columns = parse_fields(fields, RECONCILE_FIELDS) or list(RECONCILE_FIELDS)
+    includes = parse_include(include, RECONCILE_INCLUDES) or set()
+    include_expense = "expense" in includes
+
+    rows = await repositories().reconciles.project(current_user.id, columns, include_expense, include_archived)
+    if include_expense:
+        return [shape_row(row, columns, "expense", RECONCILE_EXPENSE_FIELDS) for row in rows]
+    return [shape_row(row, columns) for row in rows]
+
+async def get_reconciliation_history_for_expense(expense_id: int, current_user, include_archived: bool = False):
     """
     Fetches the reconciliation history for a single expense.
 
@@ -122,16 +145,13 @@ async def get_reconciliation_history_for_expense(expense_id: int, current_user):
     Args:
         expense_id: The ID of the specific expense.
         current_user: The authenticated user object from the dependency.
+        include_archived: Also return superseded records from the archive.
 
     Returns:
         A list of Reconcile objects for the specified expense.
     """
-    history = await prisma.reconcile.find_many(
-        where={
-            'expenseId': expense_id,
-            'userId': current_user.id  # Security check: User must own the records
-        },
-        include={'expense': True},
-        order={'createdAt': 'desc'}
+    # Security check: only the user's own records are looked at
+    history = await repositories().reconciles.history(
+        current_user.id, expense_id=expense_id, include_archived=include_archived
     )
     return history
\ No newline at end of file
@@ -1,5 +1,7 @@
-from app.database.db import prisma
+from app.database.db import prisma, mark_user_write
+from app.repositories.registry import repositories
 from fastapi import HTTPException
+from app.services.reconversion import reconversion_runner, job_progress
 
 
 async def get_me(current_user):
@@ -22,16 +24,49 @@ async def get_me(current_user):
 async def update_base_currency(settings,current_user):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    updated_user = await prisma.users.update(
-        where={
-            'id':current_user.id
-        },
-        data={
-            'baseCurrency':settings.baseCurrency.upper()
-        }
-    )
+    old_currency = (current_user.baseCurrency or "").upper()
+    updated_user = await repositories().users.update_base_currency(current_user.id, settings.baseCurrency.upper())
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found.")
+    await mark_user_write(current_user.id)
+
+    response = {"message": f"Base currency updated to {updated_user.baseCurrency} successfully."}
+
+    # Conversions made into the old base currency are redone in the background.
+    if old_currency and old_currency != updated_user.baseCurrency:
+        job = await reconversion_runner.start_job(current_user.id, old_currency, updated_user.baseCurrency)
+        response["reconversion"] = job_progress(job)
 
     # Return a confirmation message
-    return {"message": f"Base currency updated to {updated_user.baseCurrency} successfully."}
\ No newline at end of file
+    return response
+
+
+async def get_reconversion_status(current_user, job_id: int = None):
+    """
+    Progress of one of the user's re-conversion jobs, or of the latest one
+    when no id is given.
+    """
+    where = {'userId': current_user.id}
+    if job_id is not None:
+        where['id'] = job_id
+    job = await prisma.reconversionjob.find_first(where=where, order={'id': 'desc'})
+    if not job:
+        raise HTTPException(status_code=404, detail="Reconversion job not found")
+    return job_progress(job)
+
+
+async def resume_reconversion(current_user, job_id: int):
+    """Restarts a FAILED job from the last chunk it completed."""
+    job = await prisma.reconversionjob.find_first(where={'id': job_id, 'userId': current_user.id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Reconversion job not found")
+    status = getattr(job.status, "value", job.status)
+    if status == "FAILED":
+        job = await prisma.reconversionjob.update(
+            where={'id': job.id},
+            data={'status': 'PENDING', 'error': None, 'leaseExpiresAt': None},
+        )
+    elif status not in ("PENDING", "RUNNING"):
+        raise HTTPException(status_code=409, detail=f"Reconversion job is {status.lower()} and cannot be resumed")
+    reconversion_runner.submit(job.id)
+    return job_progress(job)
\ No newline at end of file
@@ -1,3 +1,145 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from dotenv import load_dotenv
 from prisma import Prisma
 
-prisma = Prisma()
\ No newline at end of file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Number of uvicorn worker processes sharing the database (see serve.py).
+WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+
+
+def worker_connection_limit() -> Optional[int]:
+    """
+    Size of each worker's Prisma connection pool.
+
+    DB_CONNECTION_LIMIT sets it directly. Otherwise, when DB_MAX_CONNECTIONS
+    (the connection budget for the whole deployment) is set, it is split evenly
+    across the WEB_CONCURRENCY workers. With neither set Prisma's default is used.
+    """
+    explicit = os.getenv("DB_CONNECTION_LIMIT")
+    if explicit:
+        return max(int(explicit), 1)
+    budget = os.getenv("DB_MAX_CONNECTIONS")
+    if budget:
+        return max(int(budget) // WEB_CONCURRENCY, 1)
+    return None
+
+
+def pool_timeout() -> Optional[int]:
+    """Seconds a query waits for a free pooled connection before failing."""
+    value = os.getenv("DB_POOL_TIMEOUT")
+    return int(value) if value else None
+
+
+def build_datasource_url(url: str, connection_limit: Optional[int] = None, timeout: Optional[int] = None) -> str:
+    """Adds Prisma's pool parameters to a Postgres URL, overriding any already present."""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    if connection_limit is not None:
+        query["connection_limit"] = str(connection_limit)
+    if timeout is not None:
+        query["pool_timeout"] = str(timeout)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def pool_settings() -> dict:
+    return {
+        "workers": WEB_CONCURRENCY,
+        "connectionLimit": worker_connection_limit(),
+        "poolTimeout": pool_timeout(),
+        "readReplica": read_prisma is not None,
+    }
+
+
+def _client_kwargs(env_var: str = "DATABASE_URL") -> dict:
+    url = os.getenv(env_var)
+    if not url:
+        return {}
+    return {"datasource": {"url": build_datasource_url(url, worker_connection_limit(), pool_timeout())}}
+
+
+prisma = Prisma(**_client_kwargs())
+
+# Optional read-only client (e.g. a streaming replica) for endpoints that only read.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+read_prisma: Optional[Prisma] = Prisma(**_client_kwargs("READ_DATABASE_URL")) if READ_DATABASE_URL else None
+
+# After a user writes, their reads stay on the primary this long so they see
+# their own changes despite replication lag. 0 disables the pinning.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# The pin is kept in two places:
+# - Users.readPinnedUntil on the primary, which every worker sees, because
+#   get_current_user loads the user from the primary on each request
+#   (note_read_pin turns it into a per-request flag);
+# - this worker's memory, which also covers work that has no request, such
+#   as background re-conversions, and writes whose pin could not be stored.
+# user id -> monotonic time until which the user's reads go to the primary.
+_pinned_until: dict[int, float] = {}
+# Id of the user whose persisted pin was active when this request loaded them.
+_request_pinned_user: ContextVar[Optional[int]] = ContextVar("request_pinned_user", default=None)
+
+
+async def mark_user_write(user_id: int) -> None:
+    """Pins the user's reads to the primary for READ_YOUR_WRITES_SECONDS, on every worker."""
+    if READ_YOUR_WRITES_SECONDS <= 0 or read_prisma is None:
+        return
+    now = time.monotonic()
+    _pinned_until[user_id] = now + READ_YOUR_WRITES_SECONDS
+    if len(_pinned_until) > 10000:
+        for key in [key for key, until in _pinned_until.items() if until <= now]:
+            del _pinned_until[key]
+    try:
+        await prisma.users.update_many(
+            where={'id': user_id},
+            data={'readPinnedUntil': datetime.now(timezone.utc) + timedelta(seconds=READ_YOUR_WRITES_SECONDS)},
+        )
+    except Exception as e:
+        logger.warning("Could not store the read-your-writes pin of user %s: %s", user_id, e)
+
+
+def note_read_pin(user) -> None:
+    """Called with the user loaded for a request: honours a pin set by any worker."""
+    pinned_until = getattr(user, "readPinnedUntil", None)
+    if pinned_until is not None and pinned_until > datetime.now(timezone.utc):
+        _request_pinned_user.set(user.id)
+
+
+def get_read_client(user_id: Optional[int] = None) -> Prisma:
+    """
+    Client for a read-only query. The replica is used when one is configured
+    and connected, unless the user wrote recently; everything else reads from
+    the primary.
+    """
+    if read_prisma is None or not read_prisma.is_connected():
+        return prisma
+    if user_id is not None and (
+        _request_pinned_user.get() == user_id or _pinned_until.get(user_id, 0) > time.monotonic()
+    ):
+        return prisma
+    return read_prisma
+
+
+async def connect_read_replica() -> bool:
+    """Connects the read client, if configured. On failure, reads fall back to the primary."""
+    if read_prisma is None:
+        return False
+    try:
+        await read_prisma.connect()
+        return True
+    except Exception as e:
+        logger.warning("Read replica unavailable, reading from the primary: %s", e)
+        return False
+
+
+async def disconnect_read_replica() -> None:
+    if read_prisma is not None and read_prisma.is_connected():
+        await read_prisma.disconnect()
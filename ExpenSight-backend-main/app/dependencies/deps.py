@@ -1,8 +1,15 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from app.security.jwt import SECRET_KEY, ALGORITHM
-from app.database.db import prisma
+from app.security.admin import is_admin
+from app.database.db import get_read_client, note_read_pin
+from app.repositories.registry import repositories
+from app.services.etag import get_user_data_version, make_etag, etag_matches
+from app.services.rate_limiter import rate_limiter
+from app.services.idempotency import is_completed_replay
+from datetime import date
+from typing import Optional
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -19,7 +26,60 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
 
-    user = await prisma.users.find_first(where={"email": email})
+    # Loaded from the primary, so a read-your-writes pin set by any worker is seen.
+    user = await repositories().users.find_by_email(email)
     if user is None:
         raise credentials_exception
+    note_read_pin(user)
     return user
+
+
+async def get_admin_user(current_user=Depends(get_current_user)):
+    """The current user, if their email is listed in ADMIN_EMAILS; 403 otherwise."""
+    if not is_admin(current_user.email):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+
+def rate_limited(route: str, idempotency_route: Optional[str] = None):
+    """
+    Like get_current_user, but each call also takes a token from the user's
+    bucket for `route` (limits in app/services/rate_limiter.py) and answers
+    429 with Retry-After once it is empty.
+
+    For endpoints wrapped in run_idempotent, pass the route name they use
+    there: a retry whose Idempotency-Key already has a stored response is
+    replayed without work, so it is not charged.
+    """
+    async def limited_user(
+        current_user=Depends(get_current_user),
+        idempotency_key: Optional[str] = Header(None, include_in_schema=False),
+    ):
+        if idempotency_route is not None and await is_completed_replay(current_user.id, idempotency_route, idempotency_key):
+            return current_user
+        await rate_limiter.check(route, current_user.id)
+        return current_user
+    return limited_user
+
+
+async def conditional_user_data(request: Request, response: Response, current_user=Depends(get_current_user)) -> dict:
+    """
+    ETag / If-None-Match support for endpoints that only read the user's data.
+
+    The tag is derived from a cheap per-user data version plus everything else
+    the body depends on (path, query, base currency, today's date for the
+    month-based dashboard figures). A matching If-None-Match short-circuits
+    with 304 before the endpoint runs its queries. Otherwise the caching
+    headers are set on the response and also returned, for endpoints that
+    build their own Response object.
+    """
+    version = await get_user_data_version(current_user.id, get_read_client(current_user.id))
+    etag = make_etag(
+        request.url.path, request.url.query, current_user.id,
+        current_user.baseCurrency, date.today().isoformat(), version
+    )
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return headers
@@ -0,0 +1,125 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Optional
+
+# Filters (`where`) use the subset of Prisma's filter syntax the controllers
+# need, so the Prisma implementation passes them through unchanged and the
+# in-memory engine evaluates them itself:
+#   {'field': value}                                  equality
+#   {'field': {'in': [...]}}                          membership
+#   {'field': {'gt'|'gte'|'lt'|'lte': value}}         ranges
+#   {'field': {'contains': text, 'mode': 'insensitive'}}
+# Orderings are lists of {'field': 'asc' | 'desc'}.
+
+
+class UserRepository(ABC):
+    @abstractmethod
+    async def find_by_email(self, email: str) -> Optional[Any]: ...
+
+    @abstractmethod
+    async def create(self, email: str, hashed_password: str, base_currency: str) -> Any: ...
+
+    @abstractmethod
+    async def update_base_currency(self, user_id: int, base_currency: str) -> Optional[Any]: ...
+
+
+class ExpenseRepository(ABC):
+    @abstractmethod
+    async def create(self, data: dict) -> Any: ...
+
+    @abstractmethod
+    async def create_with_receipt(self, data: dict, receipt: dict) -> Any:
+        """
+        Creates the expense and its receipt (`receipt` without `expenseId`)
+        atomically, in one statement, and returns the expense with the receipt.
+        """
+
+    @abstractmethod
+    async def find_by_id(self, expense_id: int, include_receipt: bool = False) -> Optional[Any]: ...
+
+    @abstractmethod
+    async def update(self, expense_id: int, data: dict) -> Optional[Any]: ...
+
+    @abstractmethod
+    async def list_for_user(self, where: dict, limit: Optional[int] = None) -> list:
+        """The user's expenses, newest first, receipts included."""
+
+    @abstractmethod
+    async def search(self, where: dict, order: list, skip: int, take: int) -> tuple:
+        """One page of matches (receipts included) and the total number of matches."""
+
+    @abstractmethod
+    async def count(self, where: dict) -> int: ...
+
+    @abstractmethod
+    async def monthly_totals(self, user_id: int, start: datetime, end: datetime) -> dict:
+        """Sums of raw amounts dated within [start, end], by month: {'YYYY-MM': total}."""
+
+    @abstractmethod
+    async def totals_by_category(self, where: dict) -> list:
+        """[{'categoryKey', 'currency', 'total', 'count'}] over the matching expenses."""
+
+    @abstractmethod
+    async def project(self, user_id: int, fields: list, include_receipt: bool) -> list:
+        """Raw rows holding only `fields` (and `receipt.*` when included), newest first."""
+
+
+class ReceiptRepository(ABC):
+    @abstractmethod
+    async def create(self, data: dict) -> Any: ...
+
+    @abstractmethod
+    async def find_for_user(self, receipt_id: int, user_id: int) -> Optional[Any]: ...
+
+    @abstractmethod
+    async def references_blob(self, content_hash: str) -> bool:
+        """True when any user's receipt points at the stored blob (read from the primary)."""
+
+
+class ReconcileRepository(ABC):
+    @abstractmethod
+    async def create(self, data: dict) -> Any:
+        """Creates the record and returns it with its expense."""
+
+    @abstractmethod
+    async def create_many(self, rows: list) -> list:
+        """Inserts all records in one statement and returns them (without expenses)."""
+
+    @abstractmethod
+    async def history(self, user_id: int, expense_id: Optional[int] = None, include_archived: bool = False) -> list:
+        """
+        The user's records (optionally of one expense), newest first, expenses
+        included. Archived (superseded) records are only returned on request.
+        """
+
+    @abstractmethod
+    async def count_reconciled_expenses(self, user_id: int) -> int:
+        """Number of distinct expenses the user has reconciled."""
+
+    @abstractmethod
+    async def project(self, user_id: int, fields: list, include_expense: bool, include_archived: bool = False) -> list:
+        """Raw rows holding only `fields` (and `expense.*` when included), newest first."""
+
+    @abstractmethod
+    async def archive_superseded(self, batch_size: int) -> Optional[int]:
+        """
+        Moves up to `batch_size` records that are not the latest for their
+        expense and target currency into the archive, in one atomic step, and
+        returns how many moved, or None when another worker is compacting.
+        """
+
+
+class Repositories:
+    """The data-access objects the controllers use, one per aggregate."""
+
+    def __init__(
+        self,
+        users: UserRepository,
+        expenses: ExpenseRepository,
+        receipts: ReceiptRepository,
+        reconciles: ReconcileRepository,
+    ):
+        self.users = users
+        self.expenses = expenses
+        self.receipts = receipts
+        self.reconciles = reconciles
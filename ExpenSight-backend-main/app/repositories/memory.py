@@ -0,0 +1,383 @@
+import bisect
+import copy
+import itertools
+from collections import defaultdict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Optional
+from prisma.errors import UniqueViolationError
+from app.repositories.base import (
+    Repositories, UserRepository, ExpenseRepository, ReceiptRepository, ReconcileRepository,
+)
+from app.services.sparse_fields import RECEIPT_FIELDS, RECONCILE_EXPENSE_FIELDS
+
+
+def _utc(value):
+    """Like Prisma, timestamps are stored and compared in UTC; naive values are taken as UTC."""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    return value
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _enum_value(value):
+    return getattr(value, "value", value)
+
+
+def _matches_condition(value, condition) -> bool:
+    value = _utc(_enum_value(value))
+    if not isinstance(condition, dict):
+        return value == _utc(_enum_value(condition))
+    for op, operand in condition.items():
+        operand = _utc(operand)
+        if op == 'mode':
+            continue
+        if op == 'in':
+            if value not in [_enum_value(item) for item in operand]:
+                return False
+        elif op == 'contains':
+            if value is None:
+                return False
+            if condition.get('mode') == 'insensitive':
+                if operand.lower() not in value.lower():
+                    return False
+            elif operand not in value:
+                return False
+        elif value is None:
+            return False
+        elif op == 'gt' and not value > operand:
+            return False
+        elif op == 'gte' and not value >= operand:
+            return False
+        elif op == 'lt' and not value < operand:
+            return False
+        elif op == 'lte' and not value <= operand:
+            return False
+        elif op not in ('gt', 'gte', 'lt', 'lte'):
+            raise ValueError(f"Unsupported filter operator: {op}")
+    return True
+
+
+def matches(record, where: dict) -> bool:
+    """Evaluates a Prisma-style filter (see app/repositories/base.py) against a record."""
+    return all(_matches_condition(getattr(record, field), condition) for field, condition in where.items())
+
+
+def _sort_key(order: list):
+    def key(record):
+        parts = []
+        for clause in order:
+            (field, direction), = clause.items()
+            value = _utc(getattr(record, field))
+            if isinstance(value, str):
+                value = value.lower()  # Postgres' default collation orders case-insensitively
+            parts.append(_Desc(value) if direction == 'desc' else value)
+        return parts
+    return key
+
+
+class _Desc:
+    """Inverts the ordering of a value inside a sort key."""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class MemoryStore:
+    """
+    Tables as dicts keyed by id, plus the indexes the queries need: users by
+    email, each user's expenses and reconciliations sorted by (createdAt, id),
+    receipts by expense, and reconciliations by expense. Archived
+    reconciliations live in a table of their own, like in Postgres.
+    """
+
+    def __init__(self):
+        self.ids = defaultdict(lambda: itertools.count(1))
+        self.users = {}
+        self.users_by_email = {}
+        self.expenses = {}
+        self.expenses_by_user = defaultdict(list)      # sorted [(createdAt, id)]
+        self.receipts = {}
+        self.receipt_by_expense = {}
+        self.reconciles = {}
+        self.reconciles_by_user = defaultdict(list)    # sorted [(createdAt, id)]
+        self.reconciles_by_expense = defaultdict(set)
+        self.reconcile_archive = {}
+
+    def next_id(self, table: str) -> int:
+        return next(self.ids[table])
+
+
+def _copy(record):
+    return copy.copy(record) if record is not None else None
+
+
+class MemoryUserRepository(UserRepository):
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    async def find_by_email(self, email):
+        user_id = self.store.users_by_email.get(email)
+        return _copy(self.store.users.get(user_id))
+
+    async def create(self, email, hashed_password, base_currency):
+        if email in self.store.users_by_email:
+            raise UniqueViolationError({'user_facing_error': {'message': 'Unique constraint failed on the fields: (`email`)'}})
+        user = SimpleNamespace(
+            id=self.store.next_id('users'), email=email, hashedPassword=hashed_password,
+            baseCurrency=base_currency, created_at=_now(), readPinnedUntil=None,
+        )
+        self.store.users[user.id] = user
+        self.store.users_by_email[email] = user.id
+        return _copy(user)
+
+    async def update_base_currency(self, user_id, base_currency):
+        user = self.store.users.get(user_id)
+        if user is None:
+            return None
+        user.baseCurrency = base_currency
+        return _copy(user)
+
+
+class MemoryExpenseRepository(ExpenseRepository):
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def _with_receipt(self, expense):
+        result = _copy(expense)
+        receipt_id = self.store.receipt_by_expense.get(expense.id)
+        result.receipt = _copy(self.store.receipts.get(receipt_id))
+        return result
+
+    def _user_expenses(self, user_id: int, newest_first: bool = True):
+        index = self.store.expenses_by_user.get(user_id, [])
+        ordered = reversed(index) if newest_first else iter(index)
+        return (self.store.expenses[expense_id] for _, expense_id in ordered)
+
+    def _filtered(self, where: dict):
+        rest = {field: condition for field, condition in where.items() if field != 'userId'}
+        return [e for e in self._user_expenses(where['userId']) if matches(e, rest)]
+
+    def _new_expense(self, data: dict):
+        now = _now()
+        expense = SimpleNamespace(
+            id=self.store.next_id('expenses'),
+            categoryKey="other", createdAt=now, updatedAt=now,
+            status="PENDING", convertedAmount=None, conversionCurrency=None,
+        )
+        for field, value in data.items():
+            setattr(expense, field, _utc(value))
+        return expense
+
+    def _insert(self, expense):
+        self.store.expenses[expense.id] = expense
+        bisect.insort(self.store.expenses_by_user[expense.userId], (expense.createdAt, expense.id))
+
+    async def create(self, data):
+        expense = self._new_expense(data)
+        self._insert(expense)
+        return _copy(expense)
+
+    async def create_with_receipt(self, data, receipt):
+        # Both records are built before either is stored, so a failure leaves neither.
+        expense = self._new_expense(data)
+        receipt = new_receipt(self.store, {**receipt, 'expenseId': expense.id})
+        self._insert(expense)
+        insert_receipt(self.store, receipt)
+        return self._with_receipt(expense)
+
+    async def find_by_id(self, expense_id, include_receipt=False):
+        expense = self.store.expenses.get(expense_id)
+        if expense is None:
+            return None
+        return self._with_receipt(expense) if include_receipt else _copy(expense)
+
+    async def update(self, expense_id, data):
+        expense = self.store.expenses.get(expense_id)
+        if expense is None:
+            return None
+        for field, value in data.items():
+            setattr(expense, field, _utc(value))
+        expense.updatedAt = _now()
+        return _copy(expense)
+
+    async def list_for_user(self, where, limit=None):
+        rows = self._filtered(where)
+        if limit is not None:
+            rows = rows[:limit]
+        return [self._with_receipt(e) for e in rows]
+
+    async def search(self, where, order, skip, take):
+        rows = sorted(self._filtered(where), key=_sort_key(order))
+        return [self._with_receipt(e) for e in rows[skip:skip + take]], len(rows)
+
+    async def count(self, where):
+        if set(where) == {'userId'}:
+            return len(self.store.expenses_by_user.get(where['userId'], []))
+        return len(self._filtered(where))
+
+    async def monthly_totals(self, user_id, start, end):
+        start, end = _utc(start), _utc(end)
+        totals = defaultdict(float)
+        for expense in self._user_expenses(user_id):
+            if start <= expense.date <= end:
+                totals[expense.date.strftime('%Y-%m')] += expense.amount
+        return dict(totals)
+
+    async def totals_by_category(self, where):
+        groups = {}
+        for expense in self._filtered(where):
+            group = groups.setdefault((expense.categoryKey, expense.currency), {
+                'categoryKey': expense.categoryKey, 'currency': expense.currency, 'total': 0.0, 'count': 0,
+            })
+            group['total'] += expense.amount
+            group['count'] += 1
+        return list(groups.values())
+
+    async def project(self, user_id, fields, include_receipt):
+        rows = []
+        for expense in self._user_expenses(user_id):
+            row = {field: _enum_value(getattr(expense, field)) for field in fields}
+            if include_receipt:
+                receipt = self.store.receipts.get(self.store.receipt_by_expense.get(expense.id))
+                for field in RECEIPT_FIELDS:
+                    row[f"receipt.{field}"] = getattr(receipt, field) if receipt else None
+            rows.append(row)
+        return rows
+
+
+def new_receipt(store: MemoryStore, data: dict):
+    """Builds a receipt record without storing it, enforcing the unique expenseId."""
+    expense_id = data.get('expenseId')
+    if expense_id is not None and expense_id in store.receipt_by_expense:
+        raise UniqueViolationError({'user_facing_error': {'message': 'Unique constraint failed on the fields: (`expenseId`)'}})
+    receipt = SimpleNamespace(
+        id=store.next_id('receipts'), uploadedAt=_now(), expenseId=None,
+        contentHash=None, contentType=None, size=None, hasThumbnail=False,
+    )
+    for field, value in data.items():
+        setattr(receipt, field, value)
+    return receipt
+
+
+def insert_receipt(store: MemoryStore, receipt) -> None:
+    store.receipts[receipt.id] = receipt
+    if receipt.expenseId is not None:
+        store.receipt_by_expense[receipt.expenseId] = receipt.id
+
+
+class MemoryReceiptRepository(ReceiptRepository):
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    async def create(self, data):
+        receipt = new_receipt(self.store, data)
+        insert_receipt(self.store, receipt)
+        return _copy(receipt)
+
+    async def find_for_user(self, receipt_id, user_id):
+        receipt = self.store.receipts.get(receipt_id)
+        return _copy(receipt) if receipt is not None and receipt.userId == user_id else None
+
+    async def references_blob(self, content_hash):
+        return any(receipt.contentHash == content_hash for receipt in self.store.receipts.values())
+
+
+class MemoryReconcileRepository(ReconcileRepository):
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def _with_expense(self, reconcile):
+        result = _copy(reconcile)
+        result.expense = _copy(self.store.expenses.get(reconcile.expenseId))
+        return result
+
+    def _user_records(self, user_id: int, include_archived: bool = False):
+        index = self.store.reconciles_by_user.get(user_id, [])
+        records = (self.store.reconciles[record_id] for _, record_id in reversed(index))
+        if not include_archived:
+            return records
+        archived = [r for r in self.store.reconcile_archive.values() if r.userId == user_id]
+        return sorted([*records, *archived], key=lambda r: (r.createdAt, r.id), reverse=True)
+
+    async def create(self, data):
+        record = SimpleNamespace(id=self.store.next_id('reconcile'), createdAt=_now(), fxRate=None)
+        for field, value in data.items():
+            setattr(record, field, value)
+        self.store.reconciles[record.id] = record
+        bisect.insort(self.store.reconciles_by_user[record.userId], (record.createdAt, record.id))
+        self.store.reconciles_by_expense[record.expenseId].add(record.id)
+        return self._with_expense(record)
+
+    async def create_many(self, rows):
+        created = []
+        for data in rows:
+            record = await self.create(data)
+            del record.expense
+            created.append(record)
+        return created
+
+    async def history(self, user_id, expense_id: Optional[int] = None, include_archived: bool = False):
+        records = self._user_records(user_id, include_archived)
+        if expense_id is not None:
+            records = (r for r in records if r.expenseId == expense_id)
+        return [self._with_expense(r) for r in records]
+
+    async def count_reconciled_expenses(self, user_id):
+        return len({r.expenseId for r in self._user_records(user_id)})
+
+    async def project(self, user_id, fields, include_expense, include_archived=False):
+        rows = []
+        for record in self._user_records(user_id, include_archived):
+            row = {field: getattr(record, field) for field in fields}
+            if include_expense:
+                expense = self.store.expenses[record.expenseId]
+                for field in RECONCILE_EXPENSE_FIELDS:
+                    row[f"expense.{field}"] = _enum_value(getattr(expense, field))
+            rows.append(row)
+        return rows
+
+    async def archive_superseded(self, batch_size):
+        superseded = []
+        for record_ids in self.store.reconciles_by_expense.values():
+            if len(record_ids) < 2:
+                continue
+            by_currency = defaultdict(list)
+            for record_id in record_ids:
+                record = self.store.reconciles[record_id]
+                by_currency[record.conversionCurrency].append(record)
+            for records in by_currency.values():
+                records.sort(key=lambda r: (r.createdAt, r.id))
+                superseded.extend(r.id for r in records[:-1])
+        superseded.sort()
+        for record_id in superseded[:batch_size]:
+            record = self.store.reconciles.pop(record_id)
+            self.store.reconciles_by_user[record.userId].remove((record.createdAt, record.id))
+            self.store.reconciles_by_expense[record.expenseId].discard(record.id)
+            archived = _copy(record)
+            archived.archivedAt = _now()
+            self.store.reconcile_archive[record.id] = archived
+        return min(len(superseded), batch_size)
+
+
+def memory_repositories(store: Optional[MemoryStore] = None) -> Repositories:
+    """Repositories over one in-memory store, for tests and microbenchmarks."""
+    store = store or MemoryStore()
+    repositories = Repositories(
+        users=MemoryUserRepository(store),
+        expenses=MemoryExpenseRepository(store),
+        receipts=MemoryReceiptRepository(store),
+        reconciles=MemoryReconcileRepository(store),
+    )
+    repositories.store = store
+    return repositories
@@ -0,0 +1,233 @@
+import asyncio
+import json
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Optional
+from app.database.db import prisma, get_read_client
+from app.repositories.base import (
+    Repositories, UserRepository, ExpenseRepository, ReceiptRepository, ReconcileRepository,
+)
+from app.services.sparse_fields import expense_list_query, reconcile_history_query
+
+# All months of the trends chart in one pass over the (userId, date) index.
+MONTHLY_TOTALS_QUERY = """
+SELECT to_char(date_trunc('month', "date"), 'YYYY-MM') AS month, SUM("amount") AS total
+FROM "expenses"
+WHERE "userId" = $1 AND "date" >= $2::timestamp AND "date" <= $3::timestamp
+GROUP BY 1
+"""
+
+# All target currencies of one reconcile request in a single round trip.
+# Prisma keeps DateTime columns as timestamp(3) without time zone in UTC, so
+# raw statements write now() AT TIME ZONE 'UTC', never the session-local now().
+INSERT_RECONCILES_SQL = """
+INSERT INTO "reconcile" ("convertedAmount", "baseCurrency", "conversionCurrency", "fxRate", "expenseId", "userId", "createdAt")
+SELECT v."convertedAmount", v."baseCurrency", v."conversionCurrency", v."fxRate", v."expenseId", v."userId", now() AT TIME ZONE 'UTC'
+FROM jsonb_to_recordset($1::jsonb) AS v(
+    "convertedAmount" float8, "baseCurrency" text, "conversionCurrency" text, "fxRate" float8, "expenseId" int, "userId" int
+)
+RETURNING "id", "convertedAmount", "baseCurrency", "conversionCurrency", "fxRate", "createdAt", "expenseId", "userId"
+"""
+
+# Advisory lock key held (per transaction) by the worker running a compaction
+# batch; every worker starts the job, only one compacts at a time.
+RECONCILE_COMPACTION_LOCK_KEY = 7_202_046
+
+TRY_COMPACTION_LOCK_SQL = 'SELECT pg_try_advisory_xact_lock($1) AS "locked"'
+
+# One batch of compaction: picks superseded records (all but the newest per
+# expense and target currency), deletes them and inserts the deleted rows into the archive in a
+# single statement, so a record is never in both tables or in neither. Only
+# the (expense, currency) pairs with more than one record are ranked: the
+# GROUP BY is answered from the (expenseId, conversionCurrency) index, and the
+# window sort only sees the rows that can actually be superseded.
+ARCHIVE_SUPERSEDED_SQL = """
+WITH repeated AS (
+    SELECT "expenseId", "conversionCurrency"
+    FROM "reconcile"
+    GROUP BY "expenseId", "conversionCurrency"
+    HAVING count(*) > 1
+), superseded AS (
+    SELECT "id" FROM (
+        SELECT r."id", row_number() OVER (
+            PARTITION BY r."expenseId", r."conversionCurrency" ORDER BY r."createdAt" DESC, r."id" DESC
+        ) AS position
+        FROM "reconcile" r
+        JOIN repeated USING ("expenseId", "conversionCurrency")
+    ) ranked
+    WHERE position > 1
+    ORDER BY "id"
+    LIMIT $1
+), moved AS (
+    DELETE FROM "reconcile" r USING superseded s
+    WHERE r."id" = s."id"
+    RETURNING r.*
+)
+INSERT INTO "reconcile_archive"
+    ("id", "convertedAmount", "baseCurrency", "conversionCurrency", "fxRate", "createdAt", "expenseId", "userId", "archivedAt")
+SELECT "id", "convertedAmount", "baseCurrency", "conversionCurrency", "fxRate", "createdAt", "expenseId", "userId", now() AT TIME ZONE 'UTC'
+FROM moved
+"""
+
+# Writes always go to the primary; reads go through get_read_client, which
+# picks the read replica when one is configured (see app/database/db.py).
+
+
+class PrismaUserRepository(UserRepository):
+    async def find_by_email(self, email):
+        return await prisma.users.find_first(where={"email": email})
+
+    async def create(self, email, hashed_password, base_currency):
+        return await prisma.users.create(
+            data={
+                "email": email,
+                "hashedPassword": hashed_password,
+                "baseCurrency": base_currency,
+            }
+        )
+
+    async def update_base_currency(self, user_id, base_currency):
+        return await prisma.users.update(where={'id': user_id}, data={'baseCurrency': base_currency})
+
+
+class PrismaExpenseRepository(ExpenseRepository):
+    async def create(self, data):
+        return await prisma.expense.create(data=data)
+
+    async def create_with_receipt(self, data, receipt):
+        # A nested create: Prisma inserts both rows in one transaction.
+        return await prisma.expense.create(
+            data={**data, 'receipt': {'create': receipt}},
+            include={'receipt': True},
+        )
+
+    async def find_by_id(self, expense_id, include_receipt=False):
+        return await prisma.expense.find_unique(
+            where={'id': expense_id},
+            include={'receipt': True} if include_receipt else None,
+        )
+
+    async def update(self, expense_id, data):
+        return await prisma.expense.update(where={'id': expense_id}, data=data)
+
+    async def list_for_user(self, where, limit=None):
+        return await get_read_client(where['userId']).expense.find_many(
+            where=where,
+            order={'createdAt': 'desc'},
+            take=limit,
+            include={'receipt': True}
+        )
+
+    async def search(self, where, order, skip, take):
+        db = get_read_client(where['userId'])
+        total, items = await asyncio.gather(
+            db.expense.count(where=where),
+            db.expense.find_many(
+                where=where,
+                order=order,
+                skip=skip,
+                take=take,
+                include={'receipt': True},
+            ),
+        )
+        return items, total
+
+    async def count(self, where):
+        return await get_read_client(where['userId']).expense.count(where=where)
+
+    async def monthly_totals(self, user_id, start, end):
+        # The explicit ::timestamp casts avoid Postgres' operator ambiguity for the bound parameters.
+        rows = await get_read_client(user_id).query_raw(MONTHLY_TOTALS_QUERY, user_id, start, end)
+        return {row['month']: float(row['total'] or 0) for row in rows}
+
+    async def totals_by_category(self, where):
+        groups = await get_read_client(where['userId']).expense.group_by(
+            by=['categoryKey', 'currency'],
+            where=where,
+            sum={'amount': True},
+            count=True,
+        )
+        return [
+            {
+                'categoryKey': group['categoryKey'],
+                'currency': group['currency'],
+                'total': float((group.get('_sum') or {}).get('amount') or 0),
+                'count': group['_count']['_all'],
+            }
+            for group in groups
+        ]
+
+    async def project(self, user_id, fields, include_receipt):
+        return await get_read_client(user_id).query_raw(expense_list_query(fields, include_receipt), user_id)
+
+
+class PrismaReceiptRepository(ReceiptRepository):
+    async def create(self, data):
+        return await prisma.receipts.create(data=data)
+
+    async def find_for_user(self, receipt_id, user_id):
+        return await prisma.receipts.find_first(where={"id": receipt_id, "userId": user_id})
+
+    async def references_blob(self, content_hash):
+        # Served by the contentHash index; must see receipts committed a moment ago, so no replica.
+        return await prisma.receipts.find_first(where={"contentHash": content_hash}) is not None
+
+
+class PrismaReconcileRepository(ReconcileRepository):
+    async def create(self, data):
+        return await prisma.reconcile.create(data=data, include={'expense': True})
+
+    async def create_many(self, rows):
+        inserted = await prisma.query_raw(INSERT_RECONCILES_SQL, json.dumps(rows))
+        # query_raw returns timestamps as ISO strings.
+        return [
+            SimpleNamespace(**{**row, "createdAt": datetime.fromisoformat(row["createdAt"])})
+            for row in inserted
+        ]
+
+    async def history(self, user_id, expense_id: Optional[int] = None, include_archived: bool = False):
+        where = {'userId': user_id}
+        if expense_id is not None:
+            where['expenseId'] = expense_id
+        db = get_read_client(user_id)
+        if not include_archived:
+            return await db.reconcile.find_many(
+                where=where,
+                include={'expense': True},
+                order={'createdAt': 'desc'}
+            )
+        current, archived = await asyncio.gather(
+            db.reconcile.find_many(where=where, include={'expense': True}),
+            db.reconcilearchive.find_many(where=where, include={'expense': True}),
+        )
+        return sorted(current + archived, key=lambda r: (r.createdAt, r.id), reverse=True)
+
+    async def count_reconciled_expenses(self, user_id):
+        distinct_expenses = await get_read_client(user_id).reconcile.group_by(
+            by=['expenseId'],
+            where={'userId': user_id}
+        )
+        return len(distinct_expenses)
+
+    async def project(self, user_id, fields, include_expense, include_archived=False):
+        return await get_read_client(user_id).query_raw(
+            reconcile_history_query(fields, include_expense, include_archived), user_id
+        )
+
+    async def archive_superseded(self, batch_size):
+        # The lock is released when the batch's transaction ends, so it never
+        # outlives the pooled connection it was taken on.
+        async with prisma.tx() as transaction:
+            locked = await transaction.query_raw(TRY_COMPACTION_LOCK_SQL, RECONCILE_COMPACTION_LOCK_KEY)
+            if not locked[0]["locked"]:
+                return None
+            return await transaction.execute_raw(ARCHIVE_SUPERSEDED_SQL, batch_size)
+
+
+def prisma_repositories() -> Repositories:
+    return Repositories(
+        users=PrismaUserRepository(),
+        expenses=PrismaExpenseRepository(),
+        receipts=PrismaReceiptRepository(),
+        reconciles=PrismaReconcileRepository(),
+    )
@@ -0,0 +1,32 @@
+from contextlib import contextmanager
+from typing import Optional
+from app.repositories.base import Repositories
+
+_active: Optional[Repositories] = None
+
+
+def repositories() -> Repositories:
+    """The data-access layer the controllers use; Prisma unless another one was installed."""
+    global _active
+    if _active is None:
+        from app.repositories.prisma_repository import prisma_repositories
+        _active = prisma_repositories()
+    return _active
+
+
+def set_repositories(repos: Optional[Repositories]) -> Optional[Repositories]:
+    """Installs `repos` (None restores the Prisma default) and returns the previous ones."""
+    global _active
+    previous, _active = _active, repos
+    return previous
+
+
+@contextmanager
+def use_repositories(repos: Repositories):
+    """Runs a block (a test, a benchmark) against `repos`."""
+    previous = set_repositories(repos)
+    try:
+        yield repos
+    finally:
+        set_repositories(previous)
+
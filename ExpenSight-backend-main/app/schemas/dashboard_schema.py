@@ -1,4 +1,8 @@
 from pydantic import BaseModel
+from typing import Dict, List
+from app.schemas.expense_schema import ExpenseOut
+from app.schemas.trends_schema import TrendPoint
+from app.schemas.user_schema import UserProfileOut
 
 class DashboardStats(BaseModel):
     totalReceipts: int
@@ -7,4 +11,22 @@ class DashboardStats(BaseModel):
     thisMonth: int
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class CategoryTotal(BaseModel):
+    key: str
+    label: str
+    count: int
+    total: float
+    totalsByCurrency: Dict[str, float]
+
+class CategoryBreakdown(BaseModel):
+    data: List[CategoryTotal]
+
+
+class DashboardBundle(BaseModel):
+    """Everything the dashboard loads, in one response."""
+    profile: UserProfileOut
+    stats: DashboardStats
+    trends: List[TrendPoint]
+    recentExpenses: List[ExpenseOut]
@@ -1,7 +1,7 @@
 from pydantic import BaseModel
 from datetime import datetime
 from .receipt_schema import ReceiptSchema # Import the new schema
-from typing import Optional
+from typing import List, Optional
 class ExpenseIn(BaseModel):
     amount: float
     currency: str
@@ -23,6 +23,24 @@ class ExpenseOut(BaseModel):
     class Config:
         orm_mode = True
 
+class ExpenseFieldsOut(BaseModel):
+    """An item of GET /v1/expense/?fields=...: `id` plus only the requested columns and relations."""
+    id: int
+    amount: Optional[float] = None
+    currency: Optional[str] = None
+    category: Optional[str] = None
+    date: Optional[datetime] = None
+    status: Optional[str] = None
+    convertedAmount: Optional[float] = None
+    conversionCurrency: Optional[str] = None
+    receipt: Optional[ReceiptSchema] = None
+
+class ExpenseSearchResponse(BaseModel):
+    items: List[ExpenseOut]
+    total: int
+    page: int
+    pageSize: int
+
 class ReconciledInfo(BaseModel):
     convertedAmount: float
     conversionCurrency: str
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 class ReceiptBase(BaseModel):
     filename: str
@@ -8,6 +9,9 @@ class ReceiptSchema(ReceiptBase):
     id: int
     uploadedAt: datetime
     userId: int
+    contentType: Optional[str] = None
+    size: Optional[int] = None
+    hasThumbnail: bool = False
 
     class Config:
         orm_mode = True
\ No newline at end of file
@@ -1,17 +1,35 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
+
+# Target currencies accepted in one reconcile request.
+RECONCILE_MAX_TARGETS = 10
 
 # --- Request Schemas ---
 
 class ReconcileCreate(BaseModel):
     """
     Schema for the request body when creating a new reconciliation.
-    The user must provide the expense ID and can optionally provide a target currency.
-    If conversionCurrency is omitted, the user's default base currency will be used.
+    The user must provide the expense ID and can optionally provide target currencies,
+    one in conversionCurrency and/or several in conversionCurrencies.
+    If neither is given, the user's default base currency will be used.
     """
     expenseId: int = Field(..., gt=0, description="The ID of the expense to be reconciled.")
     conversionCurrency: Optional[str] = Field(None, description="The currency to convert to (e.g., 'USD'). Defaults to user's base currency.")
+    conversionCurrencies: Optional[List[str]] = Field(
+        None, min_length=1, max_length=RECONCILE_MAX_TARGETS,
+        description="Several currencies to convert to in one request (e.g., ['USD', 'INR']).",
+    )
+
+    def target_currencies(self, default: str) -> list[str]:
+        """The requested targets, upper-cased, without duplicates, in request order."""
+        requested = ([self.conversionCurrency] if self.conversionCurrency else []) + (self.conversionCurrencies or [])
+        targets = []
+        for currency in requested or [default]:
+            currency = currency.upper().strip()
+            if currency and currency not in targets:
+                targets.append(currency)
+        return targets
 
 
 # --- Response Schemas ---
@@ -44,6 +62,24 @@ class ReconcileResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ConversionResult(BaseModel):
+    """One target currency's conversion within a reconcile request."""
+    id: int
+    convertedAmount: float
+    conversionCurrency: str
+    fxRate: float
+    createdAt: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class ReconcileCreateResponse(ReconcileResponse):
+    """
+    Response of POST /v1/reconcile/. The top-level fields describe the first
+    target currency, as before; `conversions` lists every target's result.
+    """
+    conversions: list[ConversionResult]
+
 class ReconciliationHistoryResponse(BaseModel):
     """
     Schema for the history endpoint, returning a list of reconciliations.
@@ -51,3 +87,20 @@ class ReconciliationHistoryResponse(BaseModel):
     message: str
     reconciliation_history: list[ReconcileResponse]
 
+
+class ReconcileFieldsResponse(BaseModel):
+    """An entry of the history with `fields`/`include`: `id` plus only the requested columns and relations."""
+    id: int
+    convertedAmount: Optional[float] = None
+    baseCurrency: Optional[str] = None
+    conversionCurrency: Optional[str] = None
+    fxRate: Optional[float] = None
+    createdAt: Optional[datetime] = None
+    expense: Optional[ExpenseForReconcile] = None
+
+class ReconciliationHistoryFieldsResponse(BaseModel):
+    """
+    Schema for the history endpoint when `fields` or `include` is given.
+    """
+    message: str
+    reconciliation_history: list[ReconcileFieldsResponse]
@@ -1,4 +1,6 @@
 from pydantic import BaseModel,Field
+from datetime import datetime
+from typing import Optional
 
 class RegisterUserIn(BaseModel):
     email: str
@@ -20,4 +22,9 @@ class LoginUserOut(BaseModel):
     token_type: str = "bearer"  # Optional, if you want to return a token on login
 
 class UserSettingsUpdate(BaseModel):
-    baseCurrency: str = Field(..., min_length=2, max_length=3)
\ No newline at end of file
+    baseCurrency: str = Field(..., min_length=2, max_length=3)
+class UserProfileOut(BaseModel):
+    id: int
+    email: str
+    baseCurrency: Optional[str] = None
+    created_at: Optional[datetime] = None
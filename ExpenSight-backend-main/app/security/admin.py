@@ -0,0 +1,10 @@
+import os
+
+# Comma-separated emails of the accounts allowed to use the /v1/admin routes.
+ADMIN_EMAILS = frozenset(
+    email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()
+)
+
+
+def is_admin(email: str) -> bool:
+    return bool(email) and email.strip().lower() in ADMIN_EMAILS
@@ -0,0 +1,138 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional
+from PIL import Image, ImageOps
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+# Root directory of the content-addressed receipt store.
+RECEIPT_STORE_DIR = os.getenv("RECEIPT_STORE_DIR", "receipt_store")
+# Longest side, in pixels, of the thumbnails generated for list views.
+THUMBNAIL_MAX_DIMENSION = int(os.getenv("THUMBNAIL_MAX_DIMENSION", "320"))
+THUMBNAIL_JPEG_QUALITY = 70
+THUMBNAIL_MIME_TYPE = "image/jpeg"
+# Largest receipt file accepted for upload; larger ones are rejected before anything is stored.
+RECEIPT_MAX_UPLOAD_BYTES = int(os.getenv("RECEIPT_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobStore:
+    """
+    Stores receipt files under the SHA-256 of their content.
+
+    Files live at `<root>/<hash[:2]>/<hash[2:4]>/<hash>`, so no directory grows
+    past a few hundred entries, and identical uploads (from any user) share
+    one file. Writes go to a temporary file in the target directory and are
+    renamed into place, so a reader never sees a partial blob. A JPEG
+    thumbnail is rendered next to the blob when it is first stored.
+    """
+
+    def __init__(self, root: str = RECEIPT_STORE_DIR):
+        self.root = Path(root)
+
+    def path_for(self, content_hash: str) -> Path:
+        if not _SHA256_HEX.match(content_hash or ""):
+            raise ValueError(f"Not a SHA-256 content hash: {content_hash!r}")
+        return self.root / content_hash[:2] / content_hash[2:4] / content_hash
+
+    def thumbnail_path_for(self, content_hash: str) -> Path:
+        path = self.path_for(content_hash)
+        return path.with_name(f"{path.name}.thumb.jpg")
+
+    def put(self, data: bytes, mime_type: str) -> dict:
+        """
+        Stores `data` unless an identical blob already exists.
+
+        Returns:
+            A dict with contentHash, contentType, size, hasThumbnail and
+            deduplicated (True when the blob was already stored).
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self.path_for(content_hash)
+        deduplicated = path.exists()
+        if not deduplicated:
+            _write_atomic(path, data)
+
+        thumbnail_path = self.thumbnail_path_for(content_hash)
+        has_thumbnail = thumbnail_path.exists()
+        if not has_thumbnail:
+            thumbnail = render_thumbnail(data, mime_type)
+            if thumbnail is not None:
+                _write_atomic(thumbnail_path, thumbnail)
+                has_thumbnail = True
+
+        return {
+            "contentHash": content_hash,
+            "contentType": mime_type,
+            "size": len(data),
+            "hasThumbnail": has_thumbnail,
+            "deduplicated": deduplicated,
+        }
+
+    def remove(self, content_hash: str) -> None:
+        """Deletes a blob and its thumbnail, if present."""
+        self.path_for(content_hash).unlink(missing_ok=True)
+        self.thumbnail_path_for(content_hash).unlink(missing_ok=True)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+
+def render_thumbnail(data: bytes, mime_type: str) -> Optional[bytes]:
+    """
+    Renders an upright JPEG thumbnail of an image receipt, or of the first
+    embedded image of a scanned PDF. Returns None when there is nothing to
+    render (e.g. a text-only PDF) or the file cannot be decoded.
+    """
+    try:
+        if mime_type.startswith("image/"):
+            source = data
+        elif mime_type == "application/pdf":
+            source = _first_pdf_image(data)
+            if source is None:
+                return None
+        else:
+            return None
+
+        with Image.open(io.BytesIO(source)) as original:
+            image = ImageOps.exif_transpose(original)
+            image.thumbnail((THUMBNAIL_MAX_DIMENSION, THUMBNAIL_MAX_DIMENSION), Image.Resampling.LANCZOS)
+            if image.mode not in ("L", "RGB"):
+                image = image.convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=THUMBNAIL_JPEG_QUALITY, optimize=True)
+            return buffer.getvalue()
+    except Exception as e:
+        logger.warning("Could not render receipt thumbnail (%s): %s", mime_type, e)
+        return None
+
+
+def _first_pdf_image(data: bytes) -> Optional[bytes]:
+    reader = PdfReader(io.BytesIO(data))
+    if not reader.pages:
+        return None
+    for image in reader.pages[0].images:
+        return image.data
+    return None
+
+
+blob_store = BlobStore()
@@ -0,0 +1,118 @@
+import difflib
+import re
+from functools import lru_cache
+from typing import Optional
+
+DEFAULT_CATEGORY_KEY = "other"
+
+# Canonical category keys (stored on Expense.categoryKey) and their display labels.
+CANONICAL_CATEGORIES = {
+    "food": "Food & Dining",
+    "groceries": "Groceries",
+    "fuel": "Fuel",
+    "transport": "Transport",
+    "travel": "Travel",
+    "lodging": "Lodging",
+    "utilities": "Utilities",
+    "rent": "Rent",
+    "software": "Software & Subscriptions",
+    "office_supplies": "Office Supplies",
+    "shopping": "Shopping",
+    "health": "Health",
+    "entertainment": "Entertainment",
+    "education": "Education",
+    "other": "Other",
+}
+
+# Free-text spellings seen from OCR and manual entry, already in cleaned form.
+CATEGORY_ALIASES = {
+    "food": [
+        "food", "food and dining", "dining", "restaurant", "restaurants", "cafe", "coffee", "coffee shop",
+        "meal", "meals", "lunch", "dinner", "breakfast", "takeaway", "takeout", "fast food", "bakery",
+        "bar", "pub", "snacks", "food and beverage", "food and drink", "eating out",
+    ],
+    "groceries": ["groceries", "grocery", "supermarket", "provisions", "household groceries"],
+    "fuel": ["fuel", "petrol", "diesel", "gas station", "gasoline", "ev charging"],
+    "transport": [
+        "transport", "transportation", "taxi", "cab", "uber", "ola", "lyft", "parking", "toll", "tolls",
+        "metro", "bus", "train", "local transport", "commute",
+    ],
+    "travel": ["travel", "flight", "flights", "airfare", "airline", "train ticket", "travel and transport"],
+    "lodging": ["lodging", "hotel", "hotels", "accommodation", "airbnb", "hostel", "stay"],
+    "utilities": [
+        "utilities", "utility", "electricity", "water", "gas bill", "internet", "broadband", "phone",
+        "mobile", "telecom", "phone bill",
+    ],
+    "rent": ["rent", "lease", "housing"],
+    "software": [
+        "software", "subscription", "subscriptions", "saas", "cloud", "hosting", "software and subscriptions",
+        "license", "licence", "apps",
+    ],
+    "office_supplies": ["office supplies", "office", "stationery", "printing", "office equipment"],
+    "shopping": ["shopping", "retail", "clothing", "apparel", "electronics", "general merchandise"],
+    "health": ["health", "healthcare", "medical", "pharmacy", "medicine", "doctor", "hospital", "fitness", "gym"],
+    "entertainment": ["entertainment", "movies", "cinema", "streaming", "concert", "games", "events"],
+    "education": ["education", "books", "course", "courses", "training", "tuition"],
+    "other": ["other", "others", "misc", "miscellaneous", "uncategorized", "general", "unknown"],
+}
+
+# How close (0..1) an unseen spelling must be to a known one to be mapped to it.
+FUZZY_MATCH_CUTOFF = 0.82
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def _clean(text: str) -> str:
+    text = text.lower().replace("&", " and ")
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def _build_lookup() -> dict:
+    lookup = {}
+    for key, label in CANONICAL_CATEGORIES.items():
+        lookup[_clean(key)] = key
+        lookup[_clean(label)] = key
+    for key, aliases in CATEGORY_ALIASES.items():
+        for alias in aliases:
+            lookup[_clean(alias)] = key
+    return lookup
+
+
+# Precomputed once at import: cleaned spelling -> canonical key.
+_LOOKUP = _build_lookup()
+_KNOWN_SPELLINGS = list(_LOOKUP)
+
+
+@lru_cache(maxsize=4096)
+def _fuzzy_match(cleaned: str) -> Optional[str]:
+    matches = difflib.get_close_matches(cleaned, _KNOWN_SPELLINGS, n=1, cutoff=FUZZY_MATCH_CUTOFF)
+    return _LOOKUP[matches[0]] if matches else None
+
+
+def normalize_category(raw: Optional[str]) -> str:
+    """
+    Maps a free-text category ("food & dining", "Restaurant", "Grocceries") to
+    a canonical key such as "food" or "groceries".
+
+    Exact spellings are resolved from the precomputed lookup, then single
+    words of the text ("Team lunch" -> "lunch"), and only then by fuzzy
+    matching, whose results are cached. Anything unrecognised is "other".
+    """
+    if not raw:
+        return DEFAULT_CATEGORY_KEY
+    cleaned = _clean(raw)
+    if not cleaned:
+        return DEFAULT_CATEGORY_KEY
+
+    key = _LOOKUP.get(cleaned)
+    if key:
+        return key
+    for word in cleaned.split():
+        key = _LOOKUP.get(word)
+        if key and key != DEFAULT_CATEGORY_KEY:
+            return key
+    return _fuzzy_match(cleaned) or DEFAULT_CATEGORY_KEY
+
+
+def category_label(key: str) -> str:
+    return CANONICAL_CATEGORIES.get(key, CANONICAL_CATEGORIES[DEFAULT_CATEGORY_KEY])
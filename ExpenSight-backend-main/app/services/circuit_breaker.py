@@ -0,0 +1,141 @@
+import time
+from collections import deque
+from typing import Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_after:.1f}s")
+
+
+class CircuitBreaker:
+    """
+    A failure-rate circuit breaker for calls to an external service.
+
+    The breaker remembers the outcome of the last `window_size` calls. Once at
+    least `min_calls` outcomes are recorded and the share of failures reaches
+    `failure_threshold`, the breaker opens and rejects every call for
+    `cooldown_seconds`. After the cooldown a single probe call is let through
+    (half-open): a success closes the breaker again, a failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: float = 0.5,
+        window_size: int = 20,
+        min_calls: int = 5,
+        cooldown_seconds: float = 30.0,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+        self._outcomes = deque(maxlen=window_size)
+        self._state = self.CLOSED
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+        # Counters for monitoring
+        self.total_calls = 0
+        self.total_failures = 0
+        self.rejected_calls = 0
+        self.times_opened = 0
+        self.last_failure: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._cooldown_remaining() <= 0:
+            return self.HALF_OPEN
+        return self._state
+
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def before_call(self) -> None:
+        """
+        Checks whether a call may go through.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with the
+                probe call already in flight.
+        """
+        if self._state == self.OPEN:
+            remaining = self._cooldown_remaining()
+            if remaining > 0:
+                self.rejected_calls += 1
+                raise CircuitOpenError(self.name, remaining)
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self._state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                self.rejected_calls += 1
+                raise CircuitOpenError(self.name, self.cooldown_seconds)
+            self._probe_in_flight = True
+
+        self.total_calls += 1
+
+    def record_success(self) -> None:
+        if self._state == self.HALF_OPEN:
+            self._close()
+        self._outcomes.append(True)
+
+    def record_failure(self, reason: str = "") -> None:
+        self.total_failures += 1
+        self.last_failure = reason or None
+        if self._state == self.HALF_OPEN:
+            self._open()
+            return
+        self._outcomes.append(False)
+        if len(self._outcomes) >= self.min_calls and self.failure_rate() >= self.failure_threshold:
+            self._open()
+
+    def release(self) -> None:
+        """Frees the half-open probe slot when a call ends without an outcome (e.g. cancellation)."""
+        self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failureRate": round(self.failure_rate(), 4),
+            "windowCalls": len(self._outcomes),
+            "failureThreshold": self.failure_threshold,
+            "cooldownSeconds": self.cooldown_seconds,
+            "retryAfterSeconds": round(max(self._cooldown_remaining(), 0.0), 2) if self._state == self.OPEN else 0.0,
+            "totalCalls": self.total_calls,
+            "totalFailures": self.total_failures,
+            "rejectedCalls": self.rejected_calls,
+            "timesOpened": self.times_opened,
+            "lastFailure": self.last_failure,
+        }
+
+    def _cooldown_remaining(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return self.cooldown_seconds - (self._clock() - self._opened_at)
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._probe_in_flight = False
+        self.times_opened += 1
+
+    def _close(self) -> None:
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._outcomes.clear()
@@ -1,8 +1,42 @@
+import asyncio
+import os
 import httpx
+from cachetools import LRUCache, TTLCache
 from fastapi import HTTPException
-from datetime import date
+from datetime import date, datetime, timezone
+from typing import Iterable
+from dotenv import load_dotenv
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+load_dotenv()
 
 FRANKFURTER_API_URL = "https://api.frankfurter.app"
+FX_API_TIMEOUT_SECONDS = float(os.getenv("FX_API_TIMEOUT_SECONDS", "5"))
+
+# The breaker trips once the share of failed Frankfurter calls in the recent
+# window crosses the threshold, and lets one probe through after the cooldown.
+fx_breaker = CircuitBreaker(
+    name="frankfurter",
+    failure_threshold=float(os.getenv("FX_BREAKER_FAILURE_THRESHOLD", "0.5")),
+    window_size=int(os.getenv("FX_BREAKER_WINDOW", "20")),
+    min_calls=int(os.getenv("FX_BREAKER_MIN_CALLS", "5")),
+    cooldown_seconds=float(os.getenv("FX_BREAKER_COOLDOWN_SECONDS", "30")),
+)
+
+# Local rate store keyed by (from, to, date). Rates for past dates never change;
+# today's (and later) dates resolve to the latest published rate, so those
+# entries expire after FX_RECENT_RATE_TTL_SECONDS.
+_rate_cache: LRUCache = LRUCache(maxsize=int(os.getenv("FX_RATE_CACHE_SIZE", "50000")))
+_recent_rate_cache: TTLCache = TTLCache(
+    maxsize=int(os.getenv("FX_RATE_CACHE_SIZE", "50000")),
+    ttl=float(os.getenv("FX_RECENT_RATE_TTL_SECONDS", "3600")),
+)
+_cache_stats = {"hits": 0, "misses": 0}
+
+# In-flight lookups keyed by (from, to, date). Concurrent identical lookups
+# await the same task instead of each calling Frankfurter.
+_inflight: dict[tuple[str, str, str], asyncio.Task] = {}
+
 
 async def get_historical_fx_rate(
         from_currency:str,
@@ -17,6 +51,9 @@ async def get_historical_fx_rate(
     in the future or on a weekend/holiday, the API automatically provides the
     rate from the closest preceding business day.
 
+    Concurrent calls for the same currency pair and date share a single
+    in-flight request, and calls fail fast while the FX circuit breaker is open.
+
     Args:
         from_currency: The original currency code of the expense (e.g., "USD").
         to_currency: The target currency code for conversion (e.g., "INR").
@@ -27,31 +64,174 @@ async def get_historical_fx_rate(
 
     Raises:
         HTTPException(400): If the 'from_currency' is not supported by the API.
-        HTTPException(503): If the external FX API is unavailable or fails.
+        HTTPException(503): If the external FX API is unavailable or fails,
+            or the circuit breaker is open.
     """
     clean_from = from_currency.upper().strip()
     clean_to = to_currency.upper().strip()
 
     if clean_from == clean_to:
         return 1.0
-    
+
+    date_str = transaction_date.strftime('%Y-%m-%d')
+    key = (clean_from, clean_to, date_str)
+
+    cached = get_cached_rate(*key)
+    if cached is not None:
+        _cache_stats["hits"] += 1
+        return cached
+    _cache_stats["misses"] += 1
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_guarded_fetch(clean_from, clean_to, date_str))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _finish_flight(key, t))
+
+    # Shield the shared task so one caller going away does not cancel it for the others.
+    return await asyncio.shield(task)
+
+
+async def get_historical_fx_rates(
+        from_currency: str,
+        to_currencies: Iterable[str],
+        transaction_date: date
+) -> dict[str, float]:
+    """
+    Fetches the rates from one currency into several others for a date.
+
+    Rates already in the local store are not requested again; the rest come
+    from a single Frankfurter call (`to=A,B,C`) and are stored for later.
+    Targets Frankfurter returns no rate for are left out of the result.
+
+    Raises:
+        HTTPException(400): If the 'from_currency' is not supported by the API.
+        HTTPException(503): If the external FX API is unavailable, or the
+            circuit breaker is open.
+    """
+    clean_from = from_currency.upper().strip()
     date_str = transaction_date.strftime('%Y-%m-%d')
+    rates, missing = {}, []
+    for to_currency in to_currencies:
+        clean_to = to_currency.upper().strip()
+        if clean_to == clean_from:
+            rates[clean_to] = 1.0
+            continue
+        cached = get_cached_rate(clean_from, clean_to, date_str)
+        if cached is not None:
+            rates[clean_to] = cached
+        elif clean_to not in missing:
+            missing.append(clean_to)
+
+    if missing:
+        fetched = await _guarded(lambda: _request_fx_rates(clean_from, missing, date_str))
+        for clean_to, rate in fetched.items():
+            store_rate(clean_from, clean_to, date_str, rate)
+        rates.update(fetched)
+    return rates
+
+
+def _is_recent(date_str: str) -> bool:
+    return date_str >= datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+def get_cached_rate(clean_from: str, clean_to: str, date_str: str):
+    """Returns the stored rate for an (upper-cased) pair and YYYY-MM-DD date, or None."""
+    key = (clean_from, clean_to, date_str)
+    cache = _recent_rate_cache if _is_recent(date_str) else _rate_cache
+    return cache.get(key)
+
 
-    request_url = f"{FRANKFURTER_API_URL}/{date_str}?from={clean_from}&to={clean_to}"
+def store_rate(clean_from: str, clean_to: str, date_str: str, rate: float) -> None:
+    cache = _recent_rate_cache if _is_recent(date_str) else _rate_cache
+    cache[(clean_from, clean_to, date_str)] = rate
+
+
+def clear_rate_cache() -> None:
+    _rate_cache.clear()
+    _recent_rate_cache.clear()
+    _cache_stats.update(hits=0, misses=0)
+
+
+def get_fx_service_status() -> dict:
+    """Returns the FX circuit breaker state, coalesced lookups in flight and rate store usage."""
+    lookups = _cache_stats["hits"] + _cache_stats["misses"]
+    return {
+        "breaker": fx_breaker.snapshot(),
+        "inflightLookups": len(_inflight),
+        "rateCache": {
+            "size": len(_rate_cache) + len(_recent_rate_cache),
+            "hits": _cache_stats["hits"],
+            "misses": _cache_stats["misses"],
+            "hitRate": round(_cache_stats["hits"] / lookups, 3) if lookups else None,
+        },
+    }
+
+
+def _finish_flight(key, task: asyncio.Task) -> None:
+    _inflight.pop(key, None)
+    # Mark the exception as retrieved in case every waiter was cancelled.
+    if not task.cancelled():
+        task.exception()
+
+
+async def _guarded_fetch(clean_from: str, clean_to: str, date_str: str) -> float:
+    rate = await _guarded(lambda: _request_fx_rate(clean_from, clean_to, date_str))
+    # Stored from the shared task, so the rate is kept even if every waiter left.
+    store_rate(clean_from, clean_to, date_str, rate)
+    return rate
+
+
+async def _guarded(request):
+    """Runs one Frankfurter request through the circuit breaker."""
+    try:
+        fx_breaker.before_call()
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The external FX service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(max(int(e.retry_after), 1))}
+        )
 
     try:
-        async with httpx.AsyncClient() as client:
+        result = await request()
+    except HTTPException as e:
+        # Only service-side failures count against the breaker; an unsupported
+        # currency (400) means Frankfurter is healthy.
+        if e.status_code >= 500:
+            fx_breaker.record_failure(str(e.detail))
+        else:
+            fx_breaker.record_success()
+        raise
+    except asyncio.CancelledError:
+        fx_breaker.release()
+        raise
+    fx_breaker.record_success()
+    return result
+
+
+async def _request_fx_rate(clean_from: str, clean_to: str, date_str: str) -> float:
+    rates = await _request_fx_rates(clean_from, [clean_to], date_str)
+    if clean_to not in rates:
+        raise HTTPException(status_code=503,detail=f"FX API did not return a rate for {clean_to}")
+    return rates[clean_to]
+
+
+async def _request_fx_rates(clean_from: str, clean_tos: list[str], date_str: str) -> dict[str, float]:
+    request_url = f"{FRANKFURTER_API_URL}/{date_str}?from={clean_from}&to={','.join(clean_tos)}"
+
+    try:
+        async with httpx.AsyncClient(timeout=FX_API_TIMEOUT_SECONDS) as client:
             response = await client.get(request_url)
 
             response.raise_for_status()
-        
+
         data = response.json()
 
-        if 'rates' in data and clean_to in data['rates']:
-            return data['rates'][clean_to]
-        else:
-            raise HTTPException(status_code=503,detail=f"FX API did not return a rate for {clean_to}")
-    
+        if 'rates' not in data:
+            raise HTTPException(status_code=503,detail="FX API response did not contain any rates")
+        return {to: data['rates'][to] for to in clean_tos if to in data['rates']}
+
     except httpx.HTTPStatusError as e:
         # This catches errors returned by the API, like 404 for an invalid currency.
         if e.response.status_code == 404:
@@ -61,12 +241,17 @@ async def get_historical_fx_rate(
             )
         # For any other HTTP error, we assume the service is unavailable.
         raise HTTPException(
-            status_code=503, 
+            status_code=503,
             detail=f"External FX service failed with status {e.response.status_code}."
         )
+    except httpx.TimeoutException:
+        raise HTTPException(
+            status_code=503,
+            detail="The external FX service timed out."
+        )
     except httpx.RequestError:
         # This catches network-level errors (e.g., DNS failure, connection refused).
         raise HTTPException(
-            status_code=503, 
+            status_code=503,
             detail="Could not connect to the external FX service."
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,50 @@
+import hashlib
+from typing import Optional
+from prisma import Prisma
+from app.database.db import prisma
+
+# One round trip over the (userId, ...) indexes. Counts catch rows that leave a
+# table, the max timestamps catch inserts and updates. Reconciliations only
+# reach reconcile_archive by leaving reconcile, so its count covers both.
+USER_DATA_VERSION_QUERY = """
+SELECT
+    (SELECT COUNT(*) FROM "expenses" WHERE "userId" = $1) AS expense_count,
+    (SELECT MAX("updatedAt") FROM "expenses" WHERE "userId" = $1) AS expense_updated,
+    (SELECT COUNT(*) FROM "receipts" WHERE "userId" = $1) AS receipt_count,
+    (SELECT MAX("uploadedAt") FROM "receipts" WHERE "userId" = $1) AS receipt_uploaded,
+    (SELECT COUNT(*) FROM "reconcile" WHERE "userId" = $1) AS reconcile_count,
+    (SELECT MAX("createdAt") FROM "reconcile" WHERE "userId" = $1) AS reconcile_created
+"""
+
+
+async def get_user_data_version(user_id: int, client: Optional[Prisma] = None) -> str:
+    """
+    Returns a string that changes whenever any of the user's expenses,
+    receipts or reconciliations are created, updated or removed.
+
+    Pass the client the response body will be read from, so a lagging read
+    replica never gets its stale body tagged with the primary's version.
+    """
+    rows = await (client or prisma).query_raw(USER_DATA_VERSION_QUERY, user_id)
+    row = rows[0] if rows else {}
+    return "|".join(str(row.get(key)) for key in (
+        "expense_count", "expense_updated",
+        "receipt_count", "receipt_uploaded",
+        "reconcile_count", "reconcile_created",
+    ))
+
+
+def make_etag(*parts) -> str:
+    """Builds a weak ETag from everything the response body depends on."""
+    digest = hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag (RFC 9110 §13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
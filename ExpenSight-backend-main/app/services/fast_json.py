@@ -0,0 +1,118 @@
+import json
+import os
+import re
+from datetime import datetime
+from typing import Any, Iterable, Optional
+import orjson
+from fastapi.responses import Response
+
+# Set FAST_LIST_SERIALIZATION=false to send list endpoints back through the
+# regular response_model validation path.
+FAST_LIST_SERIALIZATION = os.getenv("FAST_LIST_SERIALIZATION", "true").strip().lower() not in ("0", "false", "no", "off")
+
+# orjson writes exponents as "1e-7"/"1e16" where the stdlib writes "1e-07"/"1e+16".
+# Bodies that may contain one are re-encoded with the stdlib (strings that merely
+# look like an exponent only cost the slower encoder, never a different output).
+_EXPONENT = re.compile(rb"[0-9]e[-0-9]")
+
+
+def _optional_float(value):
+    return None if value is None else float(value)
+
+
+def _enum_value(value):
+    return getattr(value, "value", value)
+
+
+def receipt_to_dict(receipt) -> dict:
+    """Mirrors ReceiptSchema field order."""
+    return {
+        "filename": receipt.filename,
+        "id": int(receipt.id),
+        "uploadedAt": receipt.uploadedAt,
+        "userId": int(receipt.userId),
+        "contentType": receipt.contentType,
+        "size": None if receipt.size is None else int(receipt.size),
+        "hasThumbnail": bool(receipt.hasThumbnail),
+    }
+
+
+def expense_to_dict(expense) -> dict:
+    """Mirrors ExpenseOut field order, including the nested receipt."""
+    receipt = getattr(expense, "receipt", None)
+    return {
+        "id": int(expense.id),
+        "amount": float(expense.amount),
+        "currency": expense.currency,
+        "category": expense.category,
+        "date": expense.date,
+        "status": _enum_value(expense.status),
+        "convertedAmount": _optional_float(expense.convertedAmount),
+        "conversionCurrency": expense.conversionCurrency,
+        "receipt": receipt_to_dict(receipt) if receipt is not None else None,
+    }
+
+
+def reconcile_to_dict(reconcile) -> dict:
+    """Mirrors ReconcileResponse field order, with the nested ExpenseForReconcile."""
+    expense = reconcile.expense
+    return {
+        "id": int(reconcile.id),
+        "convertedAmount": float(reconcile.convertedAmount),
+        "baseCurrency": reconcile.baseCurrency,
+        "conversionCurrency": reconcile.conversionCurrency,
+        "fxRate": _optional_float(reconcile.fxRate),
+        "createdAt": reconcile.createdAt,
+        "expense": {
+            "id": int(expense.id),
+            "amount": float(expense.amount),
+            "currency": expense.currency,
+            "category": expense.category,
+            "status": _enum_value(expense.status),
+            "date": expense.date,
+        },
+    }
+
+
+def _stdlib_default(value):
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Encodes content exactly as FastAPI's JSONResponse would after
+    response_model serialization, but with orjson on the common path.
+    """
+    body = orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    if _EXPONENT.search(body):
+        body = json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+            default=_stdlib_default,
+        ).encode("utf-8")
+    return body
+
+
+class FastJSONResponse(Response):
+    """JSON response for content that is already shaped like its response model."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def expense_list_response(expenses: Iterable, headers: Optional[dict] = None) -> FastJSONResponse:
+    return FastJSONResponse([expense_to_dict(e) for e in expenses], headers=headers)
+
+
+def reconcile_history_response(message: str, history: Iterable, headers: Optional[dict] = None) -> FastJSONResponse:
+    return FastJSONResponse({
+        "message": message,
+        "reconciliation_history": [reconcile_to_dict(r) for r in history],
+    }, headers=headers)
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+from app.database.db import prisma
+from app.services import currency_service
+from app.services.rate_limiter import PostgresBucketStore, RateLimit
+
+logger = logging.getLogger(__name__)
+
+FX_PREFETCH_ENABLED = os.getenv("FX_PREFETCH_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+FX_PREFETCH_INTERVAL_SECONDS = float(os.getenv("FX_PREFETCH_INTERVAL_SECONDS", "300"))
+# Frankfurter calls in flight at once during a pass.
+FX_PREFETCH_CONCURRENCY = int(os.getenv("FX_PREFETCH_CONCURRENCY", "4"))
+# Delay before the first pass; each worker adds a random share of it again, so
+# the workers of a restarting fleet do not all ask for the pass at once.
+FX_PREFETCH_INITIAL_DELAY_SECONDS = float(os.getenv("FX_PREFETCH_INITIAL_DELAY_SECONDS", "5"))
+# Most (from, to, date) lookups one pass looks at.
+FX_PREFETCH_MAX_TRIPLES = int(os.getenv("FX_PREFETCH_MAX_TRIPLES", "5000"))
+
+# Only one worker of the fleet runs each pass: a pass needs the single token of
+# this shared bucket in rate_limit_buckets, which refills once per interval.
+# The take is one atomic statement, as for the per-user rate limits.
+FX_PREFETCH_PASS_BUCKET = "fx_prefetch_pass"
+
+# Distinct (from, to, date) lookups a reconcile of any PENDING expense would
+# make by default: the expense's currency into its owner's base currency. The
+# (status, userId) index keeps the scan to PENDING expenses; $1 bounds a pass.
+PENDING_TRIPLES_QUERY = """
+SELECT DISTINCT
+    UPPER(TRIM(e."currency")) AS from_currency,
+    UPPER(TRIM(u."baseCurrency")) AS to_currency,
+    to_char(e."date", 'YYYY-MM-DD') AS on_date
+FROM "expenses" e
+JOIN "users" u ON u."id" = e."userId"
+WHERE e."status" = 'PENDING'
+  AND UPPER(TRIM(e."currency")) <> UPPER(TRIM(u."baseCurrency"))
+LIMIT $1
+"""
+
+
+class FXPrefetcher:
+    """
+    Periodically warms the local FX rate store with the rates PENDING expenses
+    will need when they are reconciled.
+
+    Each pass lists the distinct (from, to, date) triples, drops those already
+    stored, and fetches the rest with one Frankfurter call per (from, date)
+    covering every target currency, at most `concurrency` calls at a time. A
+    pass stops early when Frankfurter is unavailable, leaving the circuit
+    breaker to decide when to try again.
+
+    Every worker runs the loop, but each interval only one of them, the first
+    to take the shared pass token, queries and fetches; the others count the
+    pass in `skippedPasses`. The rate store is in-process, so a pass warms the
+    store of the worker that ran it; which worker that is varies from pass to
+    pass, and the others fall back to on-demand lookups meanwhile. If the
+    election cannot be checked (database down) the worker runs the pass.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float = FX_PREFETCH_INTERVAL_SECONDS,
+        concurrency: int = FX_PREFETCH_CONCURRENCY,
+        initial_delay_seconds: float = FX_PREFETCH_INITIAL_DELAY_SECONDS,
+        enabled: bool = FX_PREFETCH_ENABLED,
+        max_triples: int = FX_PREFETCH_MAX_TRIPLES,
+        pass_store=None,
+    ):
+        self.interval_seconds = interval_seconds
+        self.concurrency = max(concurrency, 1)
+        self.initial_delay_seconds = initial_delay_seconds
+        self.enabled = enabled
+        self.max_triples = max(max_triples, 1)
+        self.pass_store = pass_store or PostgresBucketStore()
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.runs = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.pending_triples = 0
+        self.covered_triples = 0
+        self.rates_fetched = 0
+        self.failed_requests = 0
+        self.skipped_passes = 0
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        await asyncio.sleep(self.initial_delay_seconds * (1 + random.random()))
+        while True:
+            try:
+                if await self._elected():
+                    await self.run_once()
+                else:
+                    self.skipped_passes += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e) or e.__class__.__name__
+                logger.warning("FX prefetch pass failed: %s", self.last_error)
+            await asyncio.sleep(self.interval_seconds)
+
+    async def _elected(self) -> bool:
+        """True when this worker takes this interval's pass token (or the election is unreachable)."""
+        try:
+            wait = await self.pass_store.take(FX_PREFETCH_PASS_BUCKET, 0, RateLimit(1, self.interval_seconds))
+        except Exception as e:
+            logger.warning("Could not check the FX prefetch election; running the pass: %s", e)
+            return True
+        return wait == 0
+
+    async def run_once(self) -> dict:
+        """Runs one prefetch pass and returns its stats."""
+        started = time.perf_counter()
+        rows = await prisma.query_raw(PENDING_TRIPLES_QUERY, self.max_triples)
+        triples = {(row["from_currency"], row["to_currency"], row["on_date"]) for row in rows}
+
+        groups = defaultdict(list)
+        for from_currency, to_currency, date_str in triples:
+            if currency_service.get_cached_rate(from_currency, to_currency, date_str) is None:
+                groups[(from_currency, date_str)].append(to_currency)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        unavailable = asyncio.Event()
+
+        async def fetch(from_currency: str, date_str: str, targets: list) -> None:
+            async with semaphore:
+                if unavailable.is_set():
+                    return
+                try:
+                    rates = await currency_service.get_historical_fx_rates(
+                        from_currency, targets, datetime.strptime(date_str, "%Y-%m-%d").date()
+                    )
+                    self.rates_fetched += len(rates)
+                except HTTPException as e:
+                    self.failed_requests += 1
+                    if e.status_code >= 500:
+                        unavailable.set()
+                    logger.info("FX prefetch of %s on %s failed: %s", from_currency, date_str, e.detail)
+
+        await asyncio.gather(*[fetch(f, d, targets) for (f, d), targets in groups.items()])
+
+        self.runs += 1
+        self.last_run_at = datetime.now()
+        self.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.last_error = "FX service unavailable; pass stopped early" if unavailable.is_set() else None
+        self.pending_triples = len(triples)
+        self.covered_triples = sum(
+            currency_service.get_cached_rate(*triple) is not None for triple in triples
+        )
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None and not self._task.done(),
+            "intervalSeconds": self.interval_seconds,
+            "concurrency": self.concurrency,
+            "runs": self.runs,
+            "skippedPasses": self.skipped_passes,
+            "lastRunAt": self.last_run_at.isoformat() if self.last_run_at else None,
+            "lastDurationMs": self.last_duration_ms,
+            "lastError": self.last_error,
+            "pendingTriples": self.pending_triples,
+            "coveredTriples": self.covered_triples,
+            "coverage": round(self.covered_triples / self.pending_triples, 3) if self.pending_triples else None,
+            "ratesFetched": self.rates_fetched,
+            "failedRequests": self.failed_requests,
+        }
+
+
+fx_prefetcher = FXPrefetcher()
@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from prisma.errors import UniqueViolationError
+from app.database.db import prisma
+
+logger = logging.getLogger(__name__)
+
+# How long a completed response is replayed for the same key.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# How long a duplicate waits for the first request with its key to finish.
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "60"))
+# An IN_PROGRESS key older than this is assumed abandoned (e.g. the worker died) and taken over.
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "300"))
+# Poll interval when the first request runs on another worker.
+IDEMPOTENCY_POLL_SECONDS = float(os.getenv("IDEMPOTENCY_POLL_SECONDS", "0.25"))
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+UNSERIALIZABLE_RESPONSE_DETAIL = "The request was processed, but its response could not be returned"
+
+# (userId, route, key) -> set when the execution on this worker finishes.
+_in_flight: dict[tuple, asyncio.Event] = {}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _status(row) -> str:
+    return getattr(row.status, "value", row.status)
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """
+    SHA-256 over the request's meaningful content (validated body fields,
+    uploaded file bytes), so a retry matches regardless of JSON key order or
+    multipart boundaries.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = json.dumps(jsonable_encoder(part), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+def _replay(row) -> JSONResponse:
+    return JSONResponse(
+        status_code=row.statusCode,
+        content=json.loads(row.responseBody),
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+async def _claim(user_id: int, route: str, key: str, fingerprint: str) -> tuple[Optional[Any], Optional[Any]]:
+    """
+    Inserts the IN_PROGRESS row for this key. Returns (claimed row, None) when
+    this request now owns the key, otherwise (None, existing row).
+    """
+    while True:
+        try:
+            claimed = await prisma.idempotencykey.create(data={
+                'userId': user_id,
+                'route': route,
+                'key': key,
+                'fingerprint': fingerprint,
+                'expiresAt': _now() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            })
+            return claimed, None
+        except UniqueViolationError:
+            existing = await prisma.idempotencykey.find_unique(
+                where={'userId_route_key': {'userId': user_id, 'route': route, 'key': key}}
+            )
+            if existing is None:
+                continue  # released between our insert and the lookup
+            stale = _status(existing) == "IN_PROGRESS" and existing.createdAt < _now() - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+            if existing.expiresAt < _now() or stale:
+                await prisma.idempotencykey.delete_many(where={'id': existing.id})
+                continue
+            return None, existing
+
+
+async def _wait_for_completion(user_id: int, route: str, key: str):
+    """Waits for the first execution of a key, on this worker or another one."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + IDEMPOTENCY_WAIT_SECONDS
+    event = _in_flight.get((user_id, route, key))
+    if event is not None:
+        try:
+            await asyncio.wait_for(event.wait(), timeout=IDEMPOTENCY_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    while True:
+        row = await prisma.idempotencykey.find_unique(
+            where={'userId_route_key': {'userId': user_id, 'route': route, 'key': key}}
+        )
+        if row is None or _status(row) == "COMPLETED" or loop.time() >= deadline:
+            return row
+        await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+
+async def is_completed_replay(user_id: int, route: str, key: Optional[str]) -> bool:
+    """
+    Whether a request with this key will be answered from a stored response
+    (or rejected as a reused key) rather than executed, so rate limits need
+    not charge it.
+    """
+    if key is None or not key.strip():
+        return False
+    row = await prisma.idempotencykey.find_unique(
+        where={'userId_route_key': {'userId': user_id, 'route': route, 'key': key.strip()}}
+    )
+    return row is not None and _status(row) == "COMPLETED" and row.expiresAt >= _now()
+
+
+async def run_idempotent(
+    user_id: int,
+    route: str,
+    key: Optional[str],
+    fingerprint: str,
+    call: Callable[[], Awaitable[Any]],
+    serialize: Callable[[Any], Any] = jsonable_encoder,
+):
+    """
+    Runs `call()` at most once per (user, route, Idempotency-Key).
+
+    Without a key the call just runs. With one, the first request executes
+    and its response is stored; duplicates arriving while it runs wait for
+    it, and later ones get the stored response with `Idempotent-Replayed:
+    true`. Reusing a key for a different request is a 422. If the call
+    fails, the key is released so the client can retry; once it has
+    succeeded the key is never released, so a retry cannot run it twice.
+
+    Every later write targets the row this request claimed, and only while
+    it is still IN_PROGRESS: if the request outlived IDEMPOTENCY_LOCK_SECONDS
+    and a retry took the key over, the retry's row is left alone.
+    """
+    if key is None:
+        return await call()
+    key = key.strip()
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+
+    for _ in range(2):
+        claimed, existing = await _claim(user_id, route, key, fingerprint)
+        if claimed is not None:
+            break
+        if existing.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if _status(existing) == "IN_PROGRESS":
+            existing = await _wait_for_completion(user_id, route, key)
+            if existing is None:
+                continue  # the first attempt failed and released the key; run it ourselves
+        if _status(existing) == "COMPLETED":
+            return _replay(existing)
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still being processed",
+            headers={"Retry-After": str(max(int(IDEMPOTENCY_POLL_SECONDS), 1))},
+        )
+    else:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+
+    owned = {'id': claimed.id, 'status': 'IN_PROGRESS'}
+    event = _in_flight[(user_id, route, key)] = asyncio.Event()
+    try:
+        try:
+            result = await call()
+        except BaseException:
+            await prisma.idempotencykey.delete_many(where=owned)
+            raise
+
+        # The write has happened: a response that cannot be serialized or
+        # stored must not release the key, or a retry would repeat the write.
+        try:
+            content = serialize(result)
+            status_code = 200
+        except Exception:
+            logger.exception("Could not serialize the response for Idempotency-Key %r on %s", key, route)
+            content = None
+            status_code = 500
+        stored = content if content is not None else {"detail": UNSERIALIZABLE_RESPONSE_DETAIL}
+        try:
+            updated = await prisma.idempotencykey.update_many(
+                where=owned,
+                data={'status': 'COMPLETED', 'statusCode': status_code, 'responseBody': json.dumps(stored)},
+            )
+            if not updated:
+                logger.warning("Idempotency-Key %r on %s was taken over before its response was stored", key, route)
+        except Exception as e:
+            logger.error("Could not store the response for Idempotency-Key %r on %s: %s", key, route, e)
+
+        if content is None:
+            raise HTTPException(status_code=500, detail=UNSERIALIZABLE_RESPONSE_DETAIL)
+        return JSONResponse(content=content)
+    finally:
+        event.set()
+        _in_flight.pop((user_id, route, key), None)
+
+
+async def purge_expired_keys() -> int:
+    """Deletes keys past their TTL."""
+    return await prisma.idempotencykey.delete_many(where={'expiresAt': {'lt': _now()}})
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+from fastapi import HTTPException
+from typing import Awaitable, Callable, Optional
+from app.services.ocr_dispatcher import PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+OCR_BATCH_ENABLED = os.getenv("OCR_BATCH_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+# How long the first receipt of a batch waits for others to join it.
+OCR_BATCH_WINDOW_MS = float(os.getenv("OCR_BATCH_WINDOW_MS", "50"))
+OCR_BATCH_MAX_SIZE = int(os.getenv("OCR_BATCH_MAX_SIZE", "4"))
+
+SingleExtractor = Callable[[dict, int], Awaitable[dict]]
+BatchExtractor = Callable[[list, int], Awaitable[list]]
+
+
+class OCRBatcher:
+    """
+    Collects receipts that arrive within a short window and extracts them with
+    one multi-part model call.
+
+    `extract_batch` receives the file blobs in arrival order and returns one
+    entry per blob: the parsed dict, or None when that receipt could not be
+    read. Receipts that come back as None, and every receipt of a batch whose
+    call or response failed as a whole, are retried one by one with
+    `extract_single`, so one bad receipt never fails the others.
+
+    Both extractors also receive a dispatch priority; a batch carries the most
+    urgent priority of its receipts. An HTTPException (OCR disabled, provider
+    overloaded) is a final answer and is passed to every receipt of the batch
+    instead of triggering per-receipt retries.
+    """
+
+    def __init__(
+        self,
+        extract_single: SingleExtractor,
+        extract_batch: BatchExtractor,
+        window_ms: float = OCR_BATCH_WINDOW_MS,
+        max_size: int = OCR_BATCH_MAX_SIZE,
+        enabled: bool = OCR_BATCH_ENABLED,
+    ):
+        self.extract_single = extract_single
+        self.extract_batch = extract_batch
+        self.window_seconds = window_ms / 1000
+        self.max_size = max(max_size, 1)
+        self.enabled = enabled and self.max_size > 1
+        self._pending: list[tuple[dict, int, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: set[asyncio.Task] = set()
+
+        # Counters for monitoring
+        self.batches_sent = 0
+        self.receipts_batched = 0
+        self.single_calls = 0
+        self.fallbacks = 0
+
+    async def submit(self, file_blob: dict, priority: int = PRIORITY_INTERACTIVE) -> dict:
+        """Extracts one receipt, possibly together with others submitted at the same time."""
+        if not self.enabled:
+            self.single_calls += 1
+            return await self.extract_single(file_blob, priority)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((file_blob, priority, future))
+        if len(self._pending) >= self.max_size:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush_now)
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "windowMs": self.window_seconds * 1000,
+            "maxBatchSize": self.max_size,
+            "pending": len(self._pending),
+            "batchesSent": self.batches_sent,
+            "receiptsBatched": self.receipts_batched,
+            "singleCalls": self.single_calls,
+            "fallbacks": self.fallbacks,
+        }
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            # Hold a reference so the batch is not garbage-collected mid-flight.
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list) -> None:
+        if len(batch) == 1:
+            blob, priority, future = batch[0]
+            self.single_calls += 1
+            await self._settle(future, self.extract_single(blob, priority))
+            return
+
+        self.batches_sent += 1
+        self.receipts_batched += len(batch)
+        try:
+            results = await self.extract_batch(
+                [blob for blob, _, _ in batch], min(priority for _, priority, _ in batch)
+            )
+            if len(results) != len(batch):
+                raise ValueError(f"Expected {len(batch)} results from batched OCR, got {len(results)}")
+        except HTTPException as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except Exception as e:
+            logger.warning("Batched OCR of %d receipts failed, retrying one by one: %s", len(batch), e)
+            results = [None] * len(batch)
+
+        retries = []
+        for (blob, priority, future), result in zip(batch, results):
+            if result is not None:
+                if not future.done():
+                    future.set_result(result)
+            else:
+                self.fallbacks += 1
+                retries.append(self._settle(future, self.extract_single(blob, priority)))
+        if retries:
+            await asyncio.gather(*retries)
+
+    @staticmethod
+    async def _settle(future: asyncio.Future, work: Awaitable) -> None:
+        try:
+            result = await work
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,224 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "bulk": PRIORITY_BULK}
+
+# Provider-wide request rate (token bucket) shared by every OCR call of this worker; 0 turns pacing off.
+OCR_RATE_PER_SECOND = float(os.getenv("OCR_RATE_PER_SECOND", "5"))
+OCR_RATE_BURST = int(os.getenv("OCR_RATE_BURST", "10"))
+# Concurrency starts at OCR_INITIAL_CONCURRENCY and moves between the bounds below.
+OCR_MIN_CONCURRENCY = int(os.getenv("OCR_MIN_CONCURRENCY", "1"))
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "8"))
+OCR_INITIAL_CONCURRENCY = int(os.getenv("OCR_INITIAL_CONCURRENCY", "4"))
+OCR_QUEUE_MAX = int(os.getenv("OCR_QUEUE_MAX", "50"))
+OCR_QUEUE_RETRY_AFTER_SECONDS = int(os.getenv("OCR_QUEUE_RETRY_AFTER_SECONDS", "5"))
+
+# Status codes with which the provider signals it is overloaded or rate limiting us.
+OVERLOAD_STATUS_CODES = {429, 503}
+
+
+def is_overload_error(error: Exception) -> bool:
+    """Recognises 429/503 from the Google API client (`.code`) or our own HTTPException."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    try:
+        return int(code) in OVERLOAD_STATUS_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second, holding at most `capacity`.
+    A rate of 0 means unlimited, as "0" does for the per-user rate limits.
+    """
+
+    def __init__(self, rate: float, capacity: int, clock=time.monotonic):
+        if not rate >= 0:
+            raise ValueError(f"Token bucket rate must be 0 (unlimited) or positive, not {rate!r}")
+        self.rate = rate
+        self.unlimited = rate == 0
+        self.capacity = max(capacity, 1)
+        self._clock = clock
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        if self.unlimited:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    @property
+    def tokens(self) -> float:
+        if self.unlimited:
+            return float(self.capacity)
+        self._refill()
+        return self._tokens
+
+
+class OCRDispatcher:
+    """
+    Process-wide gate in front of the OCR provider.
+
+    Calls wait in a bounded priority queue (interactive uploads ahead of bulk
+    ones, FIFO within a priority), are paced by a token bucket and run under an
+    adaptive concurrency limit: the limit is halved whenever the provider
+    answers 429/503 and grows by one after a full window of successes (AIMD).
+    When the queue is full new calls are rejected with 503 and Retry-After.
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float = OCR_RATE_PER_SECOND,
+        burst: int = OCR_RATE_BURST,
+        min_concurrency: int = OCR_MIN_CONCURRENCY,
+        max_concurrency: int = OCR_MAX_CONCURRENCY,
+        initial_concurrency: int = OCR_INITIAL_CONCURRENCY,
+        queue_max: int = OCR_QUEUE_MAX,
+        retry_after_seconds: int = OCR_QUEUE_RETRY_AFTER_SECONDS,
+    ):
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.min_concurrency = max(min_concurrency, 1)
+        self.max_concurrency = max(max_concurrency, self.min_concurrency)
+        self.limit = min(max(initial_concurrency, self.min_concurrency), self.max_concurrency)
+        self.queue_max = queue_max
+        self.retry_after_seconds = retry_after_seconds
+        self.in_flight = 0
+        self._queue: list = []
+        self._sequence = itertools.count()
+        self._successes_since_increase = 0
+        self._running: set[asyncio.Task] = set()
+
+        # Metrics
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.overloads = 0
+        self._wait_times = deque(maxlen=500)
+
+    async def submit(self, call: Callable[[], Awaitable[T]], priority: int = PRIORITY_INTERACTIVE) -> T:
+        """
+        Queues `call` and returns its result once it has run.
+
+        Raises:
+            HTTPException(503): If the queue is full, or the provider reported
+                that it is overloaded.
+        """
+        if len(self._queue) >= self.queue_max:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Receipt processing is busy right now. Please retry shortly.",
+                headers={"Retry-After": str(self.retry_after_seconds)},
+            )
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), time.monotonic(), call, future))
+        self._pump()
+        return await future
+
+    def _pump(self) -> None:
+        while self._queue and self.in_flight < self.limit:
+            priority, _, enqueued_at, call, future = heapq.heappop(self._queue)
+            if future.done():  # the waiting request went away
+                continue
+            self.in_flight += 1
+            task = asyncio.ensure_future(self._execute(enqueued_at, call, future))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, enqueued_at: float, call, future: asyncio.Future) -> None:
+        try:
+            await self.bucket.acquire()
+            self._wait_times.append(time.monotonic() - enqueued_at)
+            result = await call()
+        except Exception as e:
+            self.failed += 1
+            if is_overload_error(e):
+                self._on_overload()
+                e = HTTPException(
+                    status_code=503,
+                    detail="The OCR provider is rate limiting requests. Please retry shortly.",
+                    headers={"Retry-After": str(self.retry_after_seconds)},
+                )
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.completed += 1
+            self._on_success()
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self.in_flight -= 1
+            self._pump()
+
+    def _on_overload(self) -> None:
+        self.overloads += 1
+        self._successes_since_increase = 0
+        new_limit = max(self.min_concurrency, self.limit // 2)
+        if new_limit != self.limit:
+            logger.warning("OCR provider overloaded; concurrency %d -> %d", self.limit, new_limit)
+        self.limit = new_limit
+
+    def _on_success(self) -> None:
+        self._successes_since_increase += 1
+        if self._successes_since_increase >= self.limit and self.limit < self.max_concurrency:
+            self.limit += 1
+            self._successes_since_increase = 0
+
+    def queue_depth(self) -> dict:
+        names = {value: name for name, value in PRIORITIES.items()}
+        depth = {name: 0 for name in PRIORITIES}
+        for priority, *_ in self._queue:
+            depth[names[priority]] += 1
+        return depth
+
+    def stats(self) -> dict:
+        waits = sorted(self._wait_times)
+        p95 = waits[max(int(len(waits) * 0.95) - 1, 0)] if waits else 0.0
+        return {
+            "queueDepth": len(self._queue),
+            "queueDepthByPriority": self.queue_depth(),
+            "queueMax": self.queue_max,
+            "inFlight": self.in_flight,
+            "concurrencyLimit": self.limit,
+            "concurrencyBounds": [self.min_concurrency, self.max_concurrency],
+            "rateTokensAvailable": round(self.bucket.tokens, 2),
+            "waitMsAvg": round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+            "waitMsP95": round(p95 * 1000, 2),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "overloads": self.overloads,
+        }
+
+
+ocr_dispatcher = OCRDispatcher()
+
+
+def parse_priority(value: Optional[str]) -> int:
+    """Maps an 'interactive' / 'bulk' label to a queue priority; unknown labels count as interactive."""
+    return PRIORITIES.get((value or "").strip().lower(), PRIORITY_INTERACTIVE)
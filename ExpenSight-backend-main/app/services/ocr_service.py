@@ -0,0 +1,95 @@
+import os
+import sys
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+import dotenv
+from fastapi import HTTPException
+
+dotenv.load_dotenv()
+
+# Workers started with OCR_ENABLED=false never import the OCR SDK; receipt
+# uploads on them are answered with a 503 so a load balancer can retry on an
+# OCR-capable worker.
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+OCR_PROVIDER = os.getenv("OCR_PROVIDER", "gemini")
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+
+class OCRProvider(ABC):
+    """
+    Interface for OCR backends.
+
+    `generate` takes the prompt and file parts for a single model call and
+    returns the raw text of the model's answer. Implementations must not do
+    any heavy work (SDK imports, client set-up) before the first call.
+    """
+    name = "base"
+
+    @abstractmethod
+    def generate(self, contents: list) -> str:
+        """Runs one model call and returns the raw text of its answer."""
+
+
+class GeminiOCRProvider(OCRProvider):
+    """Google Gemini backend. The SDK is imported and configured on first use."""
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL_NAME, api_key: Optional[str] = None):
+        self.model_name = model_name
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, contents: list) -> str:
+        response = self._get_model().generate_content(contents=contents)
+        if not response or not response.candidates:
+            raise ValueError("No response from Gemini AI")
+        return response.text
+
+
+_PROVIDER_FACTORIES: dict[str, Callable[[], OCRProvider]] = {
+    "gemini": GeminiOCRProvider,
+}
+_provider: Optional[OCRProvider] = None
+_provider_lock = threading.Lock()
+
+
+def register_ocr_provider(name: str, factory: Callable[[], OCRProvider]) -> None:
+    """Makes an OCR backend selectable through the OCR_PROVIDER setting."""
+    _PROVIDER_FACTORIES[name] = factory
+
+
+def get_ocr_provider() -> OCRProvider:
+    """
+    Returns the process-wide OCR provider, creating it on first use.
+
+    Raises:
+        HTTPException(503): If OCR is disabled on this worker.
+        HTTPException(500): If OCR_PROVIDER names an unknown backend.
+    """
+    global _provider
+    if not OCR_ENABLED:
+        raise HTTPException(status_code=503, detail="Receipt OCR is not enabled on this server.")
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                factory = _PROVIDER_FACTORIES.get(OCR_PROVIDER)
+                if factory is None:
+                    raise HTTPException(status_code=500, detail=f"Unknown OCR provider '{OCR_PROVIDER}'.")
+                _provider = factory()
+    return _provider
+
+
+def is_ocr_sdk_loaded() -> bool:
+    return "google.generativeai" in sys.modules
@@ -0,0 +1,205 @@
+import io
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Optional
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+LOCAL_PDF_EXTRACTION_ENABLED = os.getenv("LOCAL_PDF_EXTRACTION_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+# Results below this confidence are handed to the OCR model instead.
+LOCAL_EXTRACTION_MIN_CONFIDENCE = float(os.getenv("LOCAL_EXTRACTION_MIN_CONFIDENCE", "0.8"))
+# Invoices longer than this are not worth parsing locally.
+LOCAL_EXTRACTION_MAX_PAGES = 10
+
+# Currencies supported by the Frankfurter API, so a local result can always be reconciled.
+KNOWN_CURRENCIES = {
+    "AUD", "BGN", "BRL", "CAD", "CHF", "CNY", "CZK", "DKK", "EUR", "GBP", "HKD", "HUF", "IDR", "ILS",
+    "INR", "ISK", "JPY", "KRW", "MXN", "MYR", "NOK", "NZD", "PHP", "PLN", "RON", "SEK", "SGD", "THB",
+    "TRY", "USD", "ZAR",
+}
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "₹": "INR", "¥": "JPY", "Rs.": "INR"}
+
+# Ordered from most to least specific; the first marker that yields an amount wins.
+TOTAL_MARKERS = [
+    r"grand\s+total", r"total\s+due", r"amount\s+due", r"balance\s+due",
+    r"total\s+amount", r"amount\s+paid", r"(?<!sub)(?<!sub\s)total",
+]
+
+CATEGORY_KEYWORDS = {
+    "software": ["software", "subscription", "saas", "cloud", "license", "hosting"],
+    "food": ["restaurant", "cafe", "coffee", "dining", "meal", "bistro", "pizza"],
+    "groceries": ["grocery", "groceries", "supermarket", "mart"],
+    "fuel": ["fuel", "petrol", "diesel", "gasoline"],
+    "travel": ["airline", "flight", "hotel", "taxi", "uber", "railway", "boarding"],
+    "utilities": ["electricity", "water bill", "broadband", "internet", "telecom"],
+    "office supplies": ["stationery", "office supplies", "printer", "toner"],
+}
+
+_AMOUNT = r"([0-9]{1,3}(?:[,. ][0-9]{3})+(?:[.,][0-9]{1,2})?|[0-9]+(?:[.,][0-9]{1,2})?)"
+_AMOUNT_RE = re.compile(_AMOUNT)
+_ISO_CODE = re.compile(r"\b([A-Z]{3})\b")
+_EXPLICIT_CATEGORY = re.compile(r"^\s*category\s*[:\-]\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+_DATE_PATTERNS = [
+    (re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b"), "%Y-%m-%d"),
+    (re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b"), "%d/%m/%Y"),
+    (re.compile(r"\b(\d{1,2})-(\d{1,2})-(\d{4})\b"), "%d-%m-%Y"),
+    (re.compile(r"\b(\d{1,2}) ([A-Za-z]{3})[a-z]* (\d{4})\b"), "%d %b %Y"),
+    (re.compile(r"\b([A-Za-z]{3})[a-z]* (\d{1,2}),? (\d{4})\b"), "%b %d %Y"),
+]
+# Numeric formats read day first; 03/04/2025 could as well be March 4th.
+_DAY_FIRST_FORMATS = {"%d/%m/%Y", "%d-%m-%Y"}
+
+
+def extract_pdf_text(data: bytes) -> str:
+    """Returns the text layer of a PDF, or an empty string for scans and unreadable files."""
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        if len(reader.pages) > LOCAL_EXTRACTION_MAX_PAGES:
+            return ""
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    except Exception as e:
+        logger.debug("Could not read PDF text layer: %s", e)
+        return ""
+
+
+def parse_amount(raw: str) -> Optional[float]:
+    """Parses '4,897.00', '4.897,00', '1 234,5' or '12.43' into a float."""
+    text = raw.replace(" ", "")
+    if "," in text and "." in text:
+        decimal = "," if text.rfind(",") > text.rfind(".") else "."
+        thousands = "." if decimal == "," else ","
+        text = text.replace(thousands, "").replace(decimal, ".")
+    elif "," in text:
+        head, _, tail = text.rpartition(",")
+        text = f"{head.replace(',', '')}.{tail}" if len(tail) in (1, 2) else text.replace(",", "")
+    elif text.count(".") > 1:
+        head, _, tail = text.rpartition(".")
+        text = f"{head.replace('.', '')}.{tail}" if len(tail) in (1, 2) else text.replace(".", "")
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _find_total(lines: list[str]) -> Optional[tuple[float, str]]:
+    for marker in TOTAL_MARKERS:
+        pattern = re.compile(marker + r"\b", re.IGNORECASE)
+        # The last labelled line is the final figure on invoices that repeat the label.
+        for line in reversed(lines):
+            match = pattern.search(line)
+            if not match:
+                continue
+            # Take the last figure after the label ("Total 2 items 150.00" -> 150.00).
+            figures = _AMOUNT_RE.findall(line[match.end():])
+            amount = parse_amount(figures[-1]) if figures else None
+            if amount is not None and amount > 0:
+                return amount, line
+    return None
+
+
+def _find_currency(total_line: str, text: str) -> tuple[Optional[str], bool]:
+    """Returns (currency, found_on_total_line)."""
+    for scope, on_total_line in ((total_line, True), (text, False)):
+        codes = [c for c in _ISO_CODE.findall(scope) if c in KNOWN_CURRENCIES]
+        if codes:
+            return max(set(codes), key=codes.count), on_total_line
+        for symbol, code in CURRENCY_SYMBOLS.items():
+            if symbol in scope:
+                return code, on_total_line
+    return None, False
+
+
+def _is_ambiguous(groups: tuple, fmt: str) -> bool:
+    """True when a numeric date reads as a valid date both day-first and month-first."""
+    if fmt not in _DAY_FIRST_FORMATS:
+        return False
+    day, month = int(groups[0]), int(groups[1])
+    return day != month and day <= 12 and month <= 12
+
+
+def _find_date(lines: list[str]) -> tuple[Optional[str], bool]:
+    """
+    Returns (YYYY-MM-DD, found_on_a_line_labelled 'date'). Numeric dates whose
+    day and month could be swapped are skipped, so a document with only such
+    dates has no local date and the OCR model reads it with the layout.
+    """
+    labelled = [line for line in lines if "date" in line.lower() and "due" not in line.lower()]
+    for scope, is_labelled in ((labelled, True), (lines, False)):
+        for line in scope:
+            for pattern, fmt in _DATE_PATTERNS:
+                match = pattern.search(line)
+                if not match or _is_ambiguous(match.groups(), fmt):
+                    continue
+                try:
+                    parsed = datetime.strptime(" ".join(match.groups()), fmt.replace("-", " ").replace("/", " "))
+                except ValueError:
+                    continue
+                return parsed.strftime("%Y-%m-%d"), is_labelled
+    return None, False
+
+
+def _find_category(text: str) -> tuple[Optional[str], bool]:
+    """Returns (category, stated_explicitly_on_the_document)."""
+    explicit = _EXPLICIT_CATEGORY.search(text)
+    if explicit:
+        return explicit.group(1).strip().lower(), True
+    lowered = text.lower()
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(keyword in lowered for keyword in keywords):
+            return category, False
+    return None, False
+
+
+def extract_receipt_fields(data: bytes) -> Optional[dict]:
+    """
+    Extracts total, currency, date and category from a digital PDF receipt
+    using deterministic rules over its text layer.
+
+    Returns:
+        A dict shaped like the OCR result plus a 'confidence' score in [0, 1],
+        or None when the PDF has no usable text layer or no total.
+    """
+    text = extract_pdf_text(data)
+    if len(text.strip()) < 20:
+        return None
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+
+    total = _find_total(lines)
+    if total is None:
+        return None
+    amount, total_line = total
+    currency, currency_on_total = _find_currency(total_line, text)
+    date_str, date_labelled = _find_date(lines)
+    category, category_explicit = _find_category(text)
+
+    confidence = 0.4
+    confidence += (0.25 if currency_on_total else 0.2) if currency else 0.0
+    confidence += (0.2 if date_labelled else 0.15) if date_str else 0.0
+    confidence += (0.15 if category_explicit else 0.1) if category else 0.0
+
+    return {
+        "amount": amount,
+        "currency": currency,
+        "category": category or "Uncategorized",
+        "date": date_str,
+        "confidence": round(min(confidence, 1.0), 2),
+    }
+
+
+def try_local_extraction(data: bytes) -> Optional[dict]:
+    """
+    Returns the locally extracted fields when they are confident enough to
+    skip the OCR model, otherwise None.
+    """
+    if not LOCAL_PDF_EXTRACTION_ENABLED:
+        return None
+    result = extract_receipt_fields(data)
+    if not result or not result["currency"] or not result["date"]:
+        return None
+    if result["confidence"] < LOCAL_EXTRACTION_MIN_CONFIDENCE:
+        logger.info("Local PDF extraction not confident enough (%.2f); using OCR", result["confidence"])
+        return None
+    return result
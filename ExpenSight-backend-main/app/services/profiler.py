@@ -0,0 +1,228 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+from fastapi import HTTPException
+from app.security import admin
+from app.security.jwt import verify_access_token
+
+logger = logging.getLogger(__name__)
+
+# Off by default: the /v1/admin profiling routes answer 404 and the per-request
+# middleware is not installed, so a disabled worker pays nothing.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "60"))
+PROFILING_DEFAULT_INTERVAL_MS = float(os.getenv("PROFILING_DEFAULT_INTERVAL_MS", "5"))
+# Per-request cProfile results kept for download, oldest dropped first.
+PROFILING_KEEP_RESULTS = int(os.getenv("PROFILING_KEEP_RESULTS", "20"))
+# Where per-request results are written. Every worker reads and writes the same
+# directory, so a report can be fetched from whichever worker answers; with
+# several hosts, point it at a shared mount.
+PROFILING_RESULTS_DIR = os.getenv("PROFILING_RESULTS_DIR", "profiling_results")
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+PSTATS_SORT_KEYS = ("cumulative", "tottime", "calls", "ncalls")
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{12}$")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame, thread_name: str) -> str:
+    """One sample in flamegraph.pl's collapsed format: root first, frames joined by ';'."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """
+    Samples the stacks of every thread in this worker with sys._current_frames()
+    from a dedicated thread, so it sees the event loop even while a handler is
+    blocking it (bcrypt, a synchronous SDK call, heavy serialization). Wall
+    clock, not CPU: a thread waiting on I/O shows up in the waiting frame.
+
+    Only one sampling run is allowed at a time per worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def sample(self, seconds: float, interval_seconds: float) -> tuple[Counter, int]:
+        """Blocks for `seconds`, returning the collapsed-stack counts and the number of sampling ticks."""
+        own_ident = threading.get_ident()
+        stacks = Counter()
+        ticks = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own_ident:
+                    stacks[collapse_stack(frame, names.get(ident, f"thread-{ident}"))] += 1
+            ticks += 1
+            time.sleep(interval_seconds)
+        return stacks, ticks
+
+    async def profile(self, seconds: float, interval_ms: float = PROFILING_DEFAULT_INTERVAL_MS) -> str:
+        """
+        Samples for `seconds` without blocking the event loop and returns the
+        collapsed stacks, one "frame;frame;... count" line each.
+
+        Raises:
+            HTTPException(409): If a sampling run is already in progress on this worker.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="A profile is already being taken on this worker")
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def run():
+            try:
+                result = self.sample(seconds, interval_ms / 1000)
+                loop.call_soon_threadsafe(lambda: done.done() or done.set_result(result))
+            except BaseException as e:
+                loop.call_soon_threadsafe(lambda: done.done() or done.set_exception(e))
+            finally:
+                self._lock.release()
+
+        # Not the default executor: it may be the very thing that is saturated.
+        threading.Thread(target=run, name="stack-sampler", daemon=True).start()
+        stacks, ticks = await asyncio.shield(done)
+        logger.info("Sampled %d stacks over %d ticks in %.1fs", sum(stacks.values()), ticks, seconds)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class RequestProfiles:
+    """
+    The latest per-request cProfile results, by id, as pstats files in a
+    directory shared by the workers (`<id>.pstats`).
+    """
+
+    def __init__(self, directory: str = PROFILING_RESULTS_DIR, keep: int = PROFILING_KEEP_RESULTS):
+        self.directory = Path(directory)
+        self.keep = keep
+
+    def _path(self, profile_id: str) -> Path:
+        return self.directory / f"{profile_id}.pstats"
+
+    def add(self, profile_id: str, profile: cProfile.Profile) -> None:
+        """Writes the result (atomically, so readers never load a partial file) and drops the oldest beyond `keep`."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        os.close(fd)
+        try:
+            profile.dump_stats(tmp_name)
+            os.replace(tmp_name, self._path(profile_id))
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            raise
+        results = sorted(self.directory.glob("*.pstats"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for old in results[self.keep:]:
+            old.unlink(missing_ok=True)
+
+    def report(self, profile_id: str, sort: str = "cumulative", limit: int = 50) -> str:
+        """
+        Raises:
+            HTTPException(404): If the id is unknown or its result was dropped.
+            HTTPException(400): If `sort` is not a supported pstats key.
+        """
+        if not _PROFILE_ID.match(profile_id):
+            raise HTTPException(status_code=404, detail="Profile not found")
+        if sort not in PSTATS_SORT_KEYS:
+            raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(PSTATS_SORT_KEYS)}")
+        stream = io.StringIO()
+        try:
+            stats = pstats.Stats(str(self._path(profile_id)), stream=stream)
+        except (FileNotFoundError, EOFError):
+            raise HTTPException(status_code=404, detail="Profile not found")
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+def _bearer_email(scope) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                payload = verify_access_token(token)
+                return payload.get("sub") if payload else None
+    return None
+
+
+def _wants_profile(scope) -> bool:
+    return any(name == PROFILE_HEADER.encode() and value not in (b"", b"0") for name, value in scope.get("headers", ()))
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that runs a request under cProfile when it carries
+    `X-Profile: 1` and an admin's bearer token. The response gets an
+    `X-Profile-Id` header; the report is at /v1/admin/profiles/{id}, from any
+    worker sharing PROFILING_RESULTS_DIR.
+
+    cProfile follows the event loop thread, so coroutines of other requests
+    that run while the profiled one awaits are included. One request is
+    profiled at a time; the header is ignored while another one is.
+    Installed only when PROFILING_ENABLED is set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._active = False
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or self._active or not _wants_profile(scope)
+            or not admin.is_admin(_bearer_email(scope))
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (PROFILE_ID_HEADER.encode(), profile_id.encode())]}
+            await send(message)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) already owns the hook.
+            await self.app(scope, receive, send)
+            return
+        self._active = True
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.disable()
+            self._active = False
+            try:
+                await asyncio.to_thread(request_profiles.add, profile_id, profile)
+            except OSError as e:
+                logger.warning("Could not store request profile %s: %s", profile_id, e)
+
+
+stack_sampler = StackSampler()
+request_profiles = RequestProfiles()
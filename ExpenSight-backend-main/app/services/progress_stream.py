@@ -0,0 +1,86 @@
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# Called by long-running controllers at each stage: progress(stage, details).
+ProgressCallback = Callable[[str, dict], Awaitable[None]]
+
+# Comment lines sent while a stage takes long, so proxies keep the stream open.
+KEEPALIVE_SECONDS = 15
+
+# Work whose client went away is finished, not cancelled; these hold references.
+_detached: set[asyncio.Task] = set()
+
+
+async def report(progress: Optional[ProgressCallback], stage: str, **details) -> None:
+    """Forwards a stage to the progress callback, if the caller passed one."""
+    if progress is not None:
+        await progress(stage, details)
+
+
+def format_sse(event: str, data: Any) -> bytes:
+    payload = json.dumps(jsonable_encoder(data), separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+def _error_payload(error: Exception) -> dict:
+    if isinstance(error, HTTPException):
+        payload = {"status": error.status_code, "detail": error.detail}
+        retry_after = (error.headers or {}).get("Retry-After")
+        if retry_after:
+            payload["retryAfter"] = retry_after
+        return payload
+    logger.exception("Streamed request failed", exc_info=error)
+    return {"status": 500, "detail": str(error)}
+
+
+def progress_stream_response(run: Callable[[ProgressCallback], Awaitable[Any]]) -> StreamingResponse:
+    """
+    Runs `run(progress)` and streams every reported stage as a Server-Sent
+    Event named after the stage. The stream ends with a `complete` event
+    carrying the result, or an `error` event with the status and detail the
+    regular endpoint would have answered with.
+
+    If the client disconnects, the work still runs to completion so nothing
+    is left half-saved.
+    """
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def progress(stage: str, details: dict) -> None:
+            queue.put_nowait((stage, details))
+
+        task = asyncio.ensure_future(run(progress))
+        _detached.add(task)
+        task.add_done_callback(_detached.discard)
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if item is None:
+                break
+            stage, details = item
+            yield format_sse(stage, details)
+
+        error = task.exception()
+        if error is not None:
+            yield format_sse("error", _error_payload(error))
+        else:
+            yield format_sse("complete", task.result())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx from holding events back until the end.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,242 @@
+import logging
+import math
+import os
+import re
+import time
+from collections import defaultdict
+from typing import Optional
+from cachetools import TTLCache
+from fastapi import HTTPException
+from app.database.db import prisma
+
+logger = logging.getLogger(__name__)
+
+# "memory" keeps buckets per worker; "postgres" shares them across workers through
+# the rate_limit_buckets table.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+# Upper bound on users tracked per route by the memory backend.
+RATE_LIMIT_MAX_TRACKED_USERS = int(os.getenv("RATE_LIMIT_MAX_TRACKED_USERS", "100000"))
+
+# Per-route limits, overridable with RATE_LIMIT_<ROUTE> (e.g. RATE_LIMIT_RECEIPT_UPLOAD="20/minute").
+# "0" or "off" disables a route's limit.
+DEFAULT_LIMITS = {
+    "receipt_upload": "10/minute",
+    "reconcile": "30/minute",
+}
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class RateLimit:
+    """
+    A token bucket holding up to `capacity` requests, refilled continuously
+    so that `capacity` requests are allowed per `period_seconds`.
+    """
+
+    def __init__(self, capacity: int, period_seconds: float):
+        self.capacity = capacity
+        self.period_seconds = period_seconds
+        self.refill_per_second = capacity / period_seconds
+
+    def __str__(self):
+        return f"{self.capacity}/{self.period_seconds:g}s"
+
+
+def parse_limit(value: str) -> Optional[RateLimit]:
+    """
+    Parses "<count>/<period>", where the period is second, minute, hour or day,
+    optionally prefixed by a number ("100/5minutes"). Returns None for "0" or "off".
+    """
+    value = value.strip().lower()
+    if value in ("0", "off", "none", ""):
+        return None
+    match = re.fullmatch(r"(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?", value)
+    if not match:
+        raise ValueError(f"Invalid rate limit {value!r}; expected e.g. '10/minute'")
+    count, multiplier, unit = match.groups()
+    if int(count) == 0:
+        return None
+    return RateLimit(int(count), int(multiplier or 1) * _PERIODS[unit])
+
+
+def route_limit(route: str) -> Optional[RateLimit]:
+    return parse_limit(os.getenv(f"RATE_LIMIT_{route.upper()}", DEFAULT_LIMITS.get(route, "0")))
+
+
+class MemoryBucketStore:
+    """
+    Buckets in this worker's memory. A bucket left alone for as long as it
+    takes to refill completely is dropped, since a missing bucket is a full one.
+    """
+
+    name = "memory"
+
+    def __init__(self, clock=time.monotonic, max_users: int = RATE_LIMIT_MAX_TRACKED_USERS):
+        self._clock = clock
+        self._max_users = max_users
+        self._buckets: dict[str, TTLCache] = {}
+
+    def _route_buckets(self, route: str, limit: RateLimit) -> TTLCache:
+        buckets = self._buckets.get(route)
+        if buckets is None:
+            buckets = self._buckets[route] = TTLCache(maxsize=self._max_users, ttl=limit.period_seconds, timer=self._clock)
+        return buckets
+
+    async def take(self, route: str, user_id: int, limit: RateLimit) -> float:
+        """Takes one token; returns 0 if the request may proceed, else the seconds until it may."""
+        buckets = self._route_buckets(route, limit)
+        now = self._clock()
+        tokens, refilled_at = buckets.get(user_id, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - refilled_at) * limit.refill_per_second)
+        if tokens >= 1:
+            buckets[user_id] = (tokens - 1, now)
+            return 0.0
+        buckets[user_id] = (tokens, now)
+        return (1 - tokens) / limit.refill_per_second
+
+    def reset(self):
+        self._buckets.clear()
+
+
+# Refills and takes a token in one statement. The row lock taken by ON CONFLICT
+# serialises concurrent requests for the same bucket across workers; when the
+# refilled bucket holds less than one token the WHERE clause skips the update
+# and nothing is returned.
+TAKE_TOKEN_SQL = """
+INSERT INTO "rate_limit_buckets" AS b ("route", "userId", "tokens", "refilledAt")
+VALUES ($1, $2, $3::float8 - 1, EXTRACT(EPOCH FROM clock_timestamp()))
+ON CONFLICT ("route", "userId") DO UPDATE SET
+    "tokens" = LEAST($3::float8, b."tokens" + GREATEST(EXCLUDED."refilledAt" - b."refilledAt", 0) * $4::float8) - 1,
+    "refilledAt" = EXCLUDED."refilledAt"
+WHERE LEAST($3::float8, b."tokens" + GREATEST(EXCLUDED."refilledAt" - b."refilledAt", 0) * $4::float8) >= 1
+RETURNING b."tokens"
+"""
+
+CURRENT_TOKENS_SQL = """
+SELECT LEAST($3::float8, "tokens" + GREATEST(EXTRACT(EPOCH FROM clock_timestamp()) - "refilledAt", 0) * $4::float8) AS "tokens"
+FROM "rate_limit_buckets" WHERE "route" = $1 AND "userId" = $2
+"""
+
+
+class PostgresBucketStore:
+    """Buckets shared by every worker, in the rate_limit_buckets table."""
+
+    name = "postgres"
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or prisma
+
+    async def take(self, route: str, user_id: int, limit: RateLimit) -> float:
+        taken = await self.client.query_raw(TAKE_TOKEN_SQL, route, user_id, limit.capacity, limit.refill_per_second)
+        if taken:
+            return 0.0
+        rows = await self.client.query_raw(CURRENT_TOKENS_SQL, route, user_id, limit.capacity, limit.refill_per_second)
+        tokens = float(rows[0]["tokens"]) if rows else 0.0
+        return max(1 - tokens, 0.0) / limit.refill_per_second
+
+    async def purge_idle(self, max_period_seconds: float) -> int:
+        """Deletes buckets that have been full for a while; they behave exactly like missing ones."""
+        return await self.client.execute_raw(
+            'DELETE FROM "rate_limit_buckets" WHERE "refilledAt" < EXTRACT(EPOCH FROM clock_timestamp()) - $1::float8',
+            max_period_seconds,
+        )
+
+    def reset(self):
+        pass
+
+
+def make_store(backend: str = RATE_LIMIT_BACKEND):
+    if backend == "postgres":
+        return PostgresBucketStore()
+    if backend != "memory":
+        raise ValueError(f"RATE_LIMIT_BACKEND must be 'memory' or 'postgres', not {backend!r}")
+    return MemoryBucketStore()
+
+
+class RateLimiter:
+    """
+    Per-user token buckets for the expensive routes (OCR uploads, FX-backed
+    reconciliations). Over-limit requests get 429 with Retry-After. If the
+    shared backend cannot be reached the request is let through: a database
+    hiccup should not turn into an outage of the limited routes.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or make_store()
+        self._limits: dict[str, Optional[RateLimit]] = {}
+
+        # Counters for monitoring
+        self.allowed = defaultdict(int)
+        self.throttled = defaultdict(int)
+        self.backend_errors = 0
+
+    def limit_for(self, route: str) -> Optional[RateLimit]:
+        if route not in self._limits:
+            self._limits[route] = route_limit(route)
+        return self._limits[route]
+
+    async def check(self, route: str, user_id: int) -> None:
+        """
+        Raises:
+            HTTPException(429): If the user has no tokens left for `route`.
+        """
+        limit = self.limit_for(route)
+        if limit is None:
+            return
+        try:
+            retry_after = await self.store.take(route, user_id, limit)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning("Rate limit check for %s failed open: %s", route, e)
+            return
+        if retry_after <= 0:
+            self.allowed[route] += 1
+            return
+        self.throttled[route] += 1
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit of {limit.capacity} requests per {limit.period_seconds:g}s exceeded for this route",
+            headers={"Retry-After": str(max(math.ceil(retry_after), 1))},
+        )
+
+    async def purge_idle(self) -> None:
+        if not isinstance(self.store, PostgresBucketStore):
+            return
+        periods = [limit.period_seconds for route in DEFAULT_LIMITS if (limit := self.limit_for(route))]
+        if not periods:
+            return
+        try:
+            removed = await self.store.purge_idle(max(periods))
+            if removed:
+                logger.info("Removed %d idle rate limit bucket(s)", removed)
+        except Exception as e:
+            logger.warning("Could not purge idle rate limit buckets: %s", e)
+
+    def reset(self) -> None:
+        self.store.reset()
+        self._limits.clear()
+        self.allowed.clear()
+        self.throttled.clear()
+        self.backend_errors = 0
+
+    def stats(self) -> dict:
+        routes = set(DEFAULT_LIMITS) | set(self.allowed) | set(self.throttled)
+        return {
+            "backend": self.store.name,
+            "routes": {
+                route: {
+                    "limit": str(limit) if (limit := self.limit_for(route)) else None,
+                    "allowed": self.allowed[route],
+                    "throttled": self.throttled[route],
+                }
+                for route in sorted(routes)
+            },
+            "backendErrors": self.backend_errors,
+        }
+
+
+rate_limiter = RateLimiter()
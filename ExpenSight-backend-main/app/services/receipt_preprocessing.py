@@ -0,0 +1,135 @@
+import io
+import logging
+import os
+import re
+from PIL import Image, ImageOps
+from pypdf import PdfReader, PdfWriter
+
+logger = logging.getLogger(__name__)
+
+OCR_PREPROCESSING_ENABLED = os.getenv("OCR_PREPROCESSING_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+# Longest side, in pixels, of an image sent to the OCR model.
+OCR_MAX_DIMENSION = int(os.getenv("OCR_MAX_DIMENSION", "1600"))
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "80"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").strip().lower() not in ("0", "false", "no", "off")
+# Most pages of a PDF that are forwarded to the OCR model.
+OCR_PDF_MAX_PAGES = int(os.getenv("OCR_PDF_MAX_PAGES", "2"))
+
+IMAGE_MIME_TYPES = {"image/png", "image/jpeg"}
+PDF_MIME_TYPE = "application/pdf"
+
+# Words that mark the page of an invoice carrying the amount we extract.
+_TOTAL_MARKERS = re.compile(r"\b(grand\s+total|total|amount\s+due|balance\s+due|amount\s+paid)\b", re.IGNORECASE)
+
+
+def preprocess_receipt(data: bytes, mime_type: str) -> tuple[bytes, str, dict]:
+    """
+    Shrinks a receipt before it is sent to the OCR model.
+
+    Images are auto-rotated from their EXIF orientation, downscaled so the
+    longest side is at most OCR_MAX_DIMENSION, converted to grayscale and
+    re-encoded as JPEG. PDFs are cut down to the pages most likely to hold the
+    total (at most OCR_PDF_MAX_PAGES). Anything that cannot be processed is
+    passed through unchanged, so preprocessing never blocks OCR.
+
+    Args:
+        data: The raw uploaded bytes.
+        mime_type: The MIME type of the upload.
+
+    Returns:
+        A tuple of (bytes to send, their MIME type, stats), where stats holds
+        the byte counts before and after and the steps that were applied.
+    """
+    stats = {"bytesBefore": len(data), "bytesAfter": len(data), "steps": []}
+    if not OCR_PREPROCESSING_ENABLED:
+        return data, mime_type, stats
+
+    try:
+        if mime_type in IMAGE_MIME_TYPES:
+            out, out_mime = _preprocess_image(data, mime_type, stats["steps"])
+        elif mime_type == PDF_MIME_TYPE:
+            out, out_mime = _preprocess_pdf(data, stats["steps"])
+        else:
+            return data, mime_type, stats
+    except Exception as e:
+        logger.warning("Receipt preprocessing skipped (%s): %s", mime_type, e)
+        stats["steps"] = ["skipped"]
+        return data, mime_type, stats
+
+    stats["bytesAfter"] = len(out)
+    return out, out_mime, stats
+
+
+def _preprocess_image(data: bytes, mime_type: str, steps: list) -> tuple[bytes, str]:
+    with Image.open(io.BytesIO(data)) as original:
+        rotated = _has_rotation(original)
+        # Returns a new, upright image with the orientation tag removed.
+        image = ImageOps.exif_transpose(original)
+        if rotated:
+            steps.append("rotate")
+
+        if max(image.size) > OCR_MAX_DIMENSION:
+            image.thumbnail((OCR_MAX_DIMENSION, OCR_MAX_DIMENSION), Image.Resampling.LANCZOS)
+            steps.append("downscale")
+
+        if OCR_GRAYSCALE and image.mode != "L":
+            image = image.convert("L")
+            steps.append("grayscale")
+        elif image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=OCR_JPEG_QUALITY, optimize=True)
+        steps.append("recompress")
+
+    out = buffer.getvalue()
+    # A small, already well-compressed upload can grow on re-encoding; only keep
+    # the original when nothing had to be fixed about its orientation.
+    if len(out) >= len(data) and not rotated:
+        steps.clear()
+        steps.append("unchanged")
+        return data, mime_type
+    return out, "image/jpeg"
+
+
+def _has_rotation(image: Image.Image) -> bool:
+    return image.getexif().get(0x0112, 1) not in (1, None)
+
+
+def _preprocess_pdf(data: bytes, steps: list) -> tuple[bytes, str]:
+    reader = PdfReader(io.BytesIO(data))
+    if len(reader.pages) <= OCR_PDF_MAX_PAGES:
+        steps.append("unchanged")
+        return data, PDF_MIME_TYPE
+
+    writer = PdfWriter()
+    for index in relevant_pdf_pages(reader, OCR_PDF_MAX_PAGES):
+        writer.add_page(reader.pages[index])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    steps.append(f"pages:{len(writer.pages)}/{len(reader.pages)}")
+    return buffer.getvalue(), PDF_MIME_TYPE
+
+
+def relevant_pdf_pages(reader: PdfReader, max_pages: int) -> list[int]:
+    """
+    Picks the pages worth sending to OCR: those whose text layer mentions a
+    total, in document order, topped up with the first pages. Scanned PDFs
+    without a text layer simply keep their first pages.
+    """
+    marked = []
+    for index, page in enumerate(reader.pages):
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = ""
+        if _TOTAL_MARKERS.search(text):
+            marked.append(index)
+
+    chosen = marked[-max_pages:]  # totals are usually on the last marked pages
+    for index in range(len(reader.pages)):
+        if len(chosen) >= max_pages:
+            break
+        if index not in chosen:
+            chosen.append(index)
+    return sorted(chosen)
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Optional
+from app.repositories.registry import repositories
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_COMPACTION_ENABLED = os.getenv("RECONCILE_COMPACTION_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+RECONCILE_COMPACTION_INTERVAL_SECONDS = float(os.getenv("RECONCILE_COMPACTION_INTERVAL_SECONDS", "3600"))
+# Records moved per statement; each batch is its own short transaction.
+RECONCILE_COMPACTION_BATCH_SIZE = int(os.getenv("RECONCILE_COMPACTION_BATCH_SIZE", "1000"))
+# Delay before the first pass, so it does not compete with startup traffic.
+RECONCILE_COMPACTION_INITIAL_DELAY_SECONDS = float(os.getenv("RECONCILE_COMPACTION_INITIAL_DELAY_SECONDS", "60"))
+
+
+class ReconcileCompactor:
+    """
+    Keeps the reconcile table at one record per reconciled expense and target
+    currency.
+
+    Every re-reconcile (by the user or a base-currency re-conversion) adds a
+    record. Each pass moves the superseded ones into reconcile_archive in
+    batches of `batch_size` until none are left, so the history and dashboard
+    queries scan a table whose size tracks the number of expenses, not the
+    number of conversions. The archive stays readable with
+    `include_archived=true` on the history routes.
+
+    Every worker runs the loop, but each batch holds a Postgres advisory lock:
+    a worker that finds it taken ends its pass right away and counts it in
+    `skippedPasses`, so passes do not pile up against each other.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float = RECONCILE_COMPACTION_INTERVAL_SECONDS,
+        batch_size: int = RECONCILE_COMPACTION_BATCH_SIZE,
+        initial_delay_seconds: float = RECONCILE_COMPACTION_INITIAL_DELAY_SECONDS,
+        enabled: bool = RECONCILE_COMPACTION_ENABLED,
+    ):
+        self.interval_seconds = interval_seconds
+        self.batch_size = max(batch_size, 1)
+        self.initial_delay_seconds = initial_delay_seconds
+        self.enabled = enabled
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.runs = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_archived = 0
+        self.archived_total = 0
+        self.batches = 0
+        self.skipped_passes = 0
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        await asyncio.sleep(self.initial_delay_seconds)
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e) or e.__class__.__name__
+                logger.warning("Reconcile compaction pass failed: %s", self.last_error)
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run_once(self) -> dict:
+        """Archives every superseded record, batch by batch, and returns the stats."""
+        started = time.perf_counter()
+        archived = 0
+        while True:
+            moved = await repositories().reconciles.archive_superseded(self.batch_size)
+            if moved is None:
+                # Another worker holds the compaction lock and is doing this pass.
+                self.skipped_passes += 1
+                break
+            self.batches += 1
+            archived += moved
+            self.archived_total += moved
+            if moved < self.batch_size:
+                break
+            # Let request handlers run between batches.
+            await asyncio.sleep(0)
+
+        self.runs += 1
+        self.last_run_at = datetime.now()
+        self.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.last_error = None
+        self.last_archived = archived
+        if archived:
+            logger.info("Archived %d superseded reconciliation(s)", archived)
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None and not self._task.done(),
+            "intervalSeconds": self.interval_seconds,
+            "batchSize": self.batch_size,
+            "runs": self.runs,
+            "batches": self.batches,
+            "skippedPasses": self.skipped_passes,
+            "lastRunAt": self.last_run_at.isoformat() if self.last_run_at else None,
+            "lastDurationMs": self.last_duration_ms,
+            "lastError": self.last_error,
+            "lastArchived": self.last_archived,
+            "archivedTotal": self.archived_total,
+        }
+
+
+reconcile_compactor = ReconcileCompactor()
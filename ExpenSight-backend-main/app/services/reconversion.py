@@ -0,0 +1,319 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException
+from app.database.db import prisma, mark_user_write
+from app.services.currency_service import get_historical_fx_rate
+
+logger = logging.getLogger(__name__)
+
+# Expenses re-converted per transaction.
+RECONVERSION_CHUNK_SIZE = int(os.getenv("RECONVERSION_CHUNK_SIZE", "500"))
+# Distinct (currency, date) rates resolved at once for a chunk.
+RECONVERSION_FX_CONCURRENCY = int(os.getenv("RECONVERSION_FX_CONCURRENCY", "4"))
+# A worker renews its lease on every chunk, FX batch and retry; if it dies, another worker may take over once it expires.
+RECONVERSION_LEASE_SECONDS = int(os.getenv("RECONVERSION_LEASE_SECONDS", "120"))
+# How often a chunk is retried while the FX service is unavailable before the job is marked FAILED.
+RECONVERSION_MAX_RETRIES = int(os.getenv("RECONVERSION_MAX_RETRIES", "5"))
+RECONVERSION_RETRY_DELAY_SECONDS = float(os.getenv("RECONVERSION_RETRY_DELAY_SECONDS", "30"))
+
+ACTIVE_STATUSES = ["PENDING", "RUNNING"]
+
+# Both statements only apply while the job is still RUNNING under the caller's
+# lease ($5 is the owner token of the claim), so a chunk of a job that was
+# superseded or taken over mid-flight cannot land after its successor.
+UPDATE_EXPENSES_SQL = """
+UPDATE "expenses" AS e
+SET "convertedAmount" = round((e."amount" * v."rate")::numeric, 2)::float8,
+    "conversionCurrency" = $1,
+    "updatedAt" = now() AT TIME ZONE 'UTC'
+FROM jsonb_to_recordset($2::jsonb) AS v("id" int, "rate" float8)
+WHERE e."id" = v."id"
+  AND e."userId" = $3
+  AND EXISTS (SELECT 1 FROM "reconversion_jobs" j WHERE j."id" = $4 AND j."status" = 'RUNNING' AND j."leaseOwner" = $5)
+"""
+
+INSERT_RECONCILE_SQL = """
+INSERT INTO "reconcile" ("convertedAmount", "baseCurrency", "conversionCurrency", "fxRate", "expenseId", "userId", "createdAt")
+SELECT round((e."amount" * v."rate")::numeric, 2)::float8, e."currency", $1, v."rate", e."id", e."userId", now() AT TIME ZONE 'UTC'
+FROM jsonb_to_recordset($2::jsonb) AS v("id" int, "rate" float8)
+JOIN "expenses" e ON e."id" = v."id"
+WHERE e."userId" = $3
+  AND EXISTS (SELECT 1 FROM "reconversion_jobs" j WHERE j."id" = $4 AND j."status" = 'RUNNING' AND j."leaseOwner" = $5)
+"""
+
+
+class LeaseLostError(Exception):
+    """The job's lease expired and another runner claimed it; this runner must stop writing."""
+
+
+def _status(job) -> str:
+    return getattr(job.status, "value", job.status)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _expense_filter(user_id: int, from_currencies: list) -> dict:
+    return {
+        'userId': user_id,
+        'status': 'RECONCILED',
+        'conversionCurrency': {'in': list(from_currencies)},
+    }
+
+
+def job_progress(job) -> dict:
+    done = job.processedExpenses + job.skippedExpenses
+    return {
+        "id": job.id,
+        "status": _status(job),
+        "fromCurrencies": list(job.fromCurrencies),
+        "toCurrency": job.toCurrency,
+        "totalExpenses": job.totalExpenses,
+        "processedExpenses": job.processedExpenses,
+        "skippedExpenses": job.skippedExpenses,
+        "percent": round(100 * done / job.totalExpenses, 1) if job.totalExpenses else 100.0,
+        "error": job.error,
+        "createdAt": job.createdAt,
+        "updatedAt": job.updatedAt,
+        "finishedAt": job.finishedAt,
+    }
+
+
+class ReconversionRunner:
+    """
+    Runs re-conversion jobs in the background of this worker.
+
+    A job is claimed with a lease before it runs. Each chunk of expenses
+    (ordered by id, after the job's cursor) gets its rates resolved through
+    the FX service, then one transaction bulk-updates the expenses, records
+    the new conversions in the reconcile history and advances the cursor.
+
+    Every claim writes a fresh owner token to the job. All later writes of the
+    run (lease renewals, chunk statements, cursor, final status) match on it,
+    so a runner whose lease expired and was taken over stops at its next write
+    instead of applying a chunk the new owner applies as well.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = RECONVERSION_CHUNK_SIZE,
+        fx_concurrency: int = RECONVERSION_FX_CONCURRENCY,
+        lease_seconds: int = RECONVERSION_LEASE_SECONDS,
+        max_retries: int = RECONVERSION_MAX_RETRIES,
+        retry_delay_seconds: float = RECONVERSION_RETRY_DELAY_SECONDS,
+    ):
+        self.chunk_size = max(chunk_size, 1)
+        self.fx_concurrency = max(fx_concurrency, 1)
+        self.lease_seconds = lease_seconds
+        self.max_retries = max_retries
+        self.retry_delay_seconds = retry_delay_seconds
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def start_job(self, user_id: int, old_currency: str, new_currency: str):
+        """
+        Creates (and starts) the job for a base-currency change. Unfinished
+        jobs of the user are superseded; their source currencies are folded
+        into the new job so expenses they had not reached yet are covered.
+        """
+        old_currency, new_currency = old_currency.upper().strip(), new_currency.upper().strip()
+        unfinished = await prisma.reconversionjob.find_many(
+            where={'userId': user_id, 'status': {'in': ACTIVE_STATUSES + ["FAILED"]}}
+        )
+        from_currencies = {old_currency}
+        for job in unfinished:
+            from_currencies.update(job.fromCurrencies)
+        from_currencies.discard(new_currency)
+        from_currencies = sorted(from_currencies)
+
+        if unfinished:
+            await prisma.reconversionjob.update_many(
+                where={'id': {'in': [job.id for job in unfinished]}},
+                data={'status': 'SUPERSEDED', 'finishedAt': _now(), 'leaseExpiresAt': None},
+            )
+
+        total = await prisma.expense.count(where=_expense_filter(user_id, from_currencies))
+        job = await prisma.reconversionjob.create(data={
+            'userId': user_id,
+            'fromCurrencies': from_currencies,
+            'toCurrency': new_currency,
+            'totalExpenses': total,
+            **({'status': 'COMPLETED', 'finishedAt': _now()} if total == 0 else {}),
+        })
+        if total:
+            self.submit(job.id)
+        return job
+
+    def submit(self, job_id: int) -> None:
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._run(job_id))
+            self._tasks[job_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def resume_pending(self) -> int:
+        """Picks up jobs left unfinished by a restart (or by a worker whose lease ran out)."""
+        jobs = await prisma.reconversionjob.find_many(
+            where={
+                'status': {'in': ACTIVE_STATUSES},
+                'OR': [{'leaseExpiresAt': None}, {'leaseExpiresAt': {'lt': _now()}}],
+            },
+            order={'id': 'asc'},
+        )
+        for job in jobs:
+            logger.info("Resuming reconversion job %s at expense id > %s", job.id, job.lastExpenseId)
+            self.submit(job.id)
+        return len(jobs)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _claim(self, job_id: int) -> Optional[str]:
+        """Returns the owner token of the new lease, or None if the job is not claimable."""
+        owner = uuid.uuid4().hex
+        claimed = await prisma.reconversionjob.update_many(
+            where={
+                'id': job_id,
+                'status': {'in': ACTIVE_STATUSES},
+                'OR': [{'leaseExpiresAt': None}, {'leaseExpiresAt': {'lt': _now()}}],
+            },
+            data={'status': 'RUNNING', 'leaseExpiresAt': self._lease(), 'leaseOwner': owner},
+        )
+        return owner if claimed == 1 else None
+
+    def _lease(self) -> datetime:
+        return _now() + timedelta(seconds=self.lease_seconds)
+
+    @staticmethod
+    def _owned(job_id: int, owner: str) -> dict:
+        return {'id': job_id, 'status': 'RUNNING', 'leaseOwner': owner}
+
+    async def _renew(self, job_id: int, owner: str) -> None:
+        """Extends the lease; raises LeaseLostError if another runner holds the job by now."""
+        renewed = await prisma.reconversionjob.update_many(
+            where=self._owned(job_id, owner), data={'leaseExpiresAt': self._lease()}
+        )
+        if renewed != 1:
+            raise LeaseLostError()
+
+    async def _run(self, job_id: int) -> None:
+        owner = await self._claim(job_id)
+        if owner is None:
+            return
+        try:
+            await self._process(job_id, owner)
+        except LeaseLostError:
+            logger.warning("Reconversion job %s was taken over by another runner; stopping", job_id)
+        except asyncio.CancelledError:
+            # Shutting down: give the lease back so the next start resumes at once.
+            try:
+                await prisma.reconversionjob.update_many(
+                    where=self._owned(job_id, owner), data={'leaseExpiresAt': None}
+                )
+            except Exception:
+                pass
+            raise
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.exception("Reconversion job %s failed", job_id)
+            await prisma.reconversionjob.update_many(
+                where=self._owned(job_id, owner),
+                data={'status': 'FAILED', 'error': str(detail)[:500], 'leaseExpiresAt': None},
+            )
+
+    async def _process(self, job_id: int, owner: str) -> None:
+        while True:
+            job = await prisma.reconversionjob.find_unique(where={'id': job_id})
+            if job is None or _status(job) != "RUNNING":
+                return  # superseded while running
+            if job.leaseOwner != owner:
+                raise LeaseLostError()
+            rows = await prisma.expense.find_many(
+                where={**_expense_filter(job.userId, job.fromCurrencies), 'id': {'gt': job.lastExpenseId}},
+                order={'id': 'asc'},
+                take=self.chunk_size,
+            )
+            if not rows:
+                await prisma.reconversionjob.update_many(
+                    where=self._owned(job_id, owner),
+                    data={'status': 'COMPLETED', 'finishedAt': _now(), 'leaseExpiresAt': None, 'error': None},
+                )
+                logger.info("Reconversion job %s completed", job_id)
+                return
+            rates = await self._resolve_rates_with_retry(job_id, owner, rows, job.toCurrency)
+            await self._apply_chunk(job, owner, rows, rates)
+
+    async def _resolve_rates_with_retry(self, job_id: int, owner: str, rows, to_currency: str) -> dict:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._resolve_rates(job_id, owner, rows, to_currency)
+            except HTTPException as e:
+                if e.status_code < 500 or attempt == self.max_retries:
+                    raise
+                logger.warning("FX service unavailable during reconversion; retrying in %ss", self.retry_delay_seconds)
+                await self._renew(job_id, owner)
+                await asyncio.sleep(self.retry_delay_seconds)
+
+    async def _resolve_rates(self, job_id: int, owner: str, rows, to_currency: str) -> dict:
+        """
+        Rates keyed by (currency, YYYY-MM-DD). Currencies Frankfurter does not
+        know are left out. Lookups run `fx_concurrency` at a time, and the
+        lease is renewed before each batch of them.
+        """
+        keys = sorted({(row.currency.upper().strip(), row.date.strftime('%Y-%m-%d')) for row in rows})
+        rates = {}
+
+        async def resolve(from_currency: str, date_str: str) -> None:
+            try:
+                rates[(from_currency, date_str)] = await get_historical_fx_rate(
+                    from_currency, to_currency, datetime.strptime(date_str, '%Y-%m-%d').date()
+                )
+            except HTTPException as e:
+                if e.status_code >= 500:
+                    raise
+                logger.info("Skipping %s expenses on %s: %s", from_currency, date_str, e.detail)
+
+        for start in range(0, len(keys), self.fx_concurrency):
+            await self._renew(job_id, owner)
+            await asyncio.gather(*[resolve(*key) for key in keys[start:start + self.fx_concurrency]])
+        return rates
+
+    async def _apply_chunk(self, job, owner: str, rows, rates: dict) -> None:
+        payload = []
+        for row in rows:
+            rate = rates.get((row.currency.upper().strip(), row.date.strftime('%Y-%m-%d')))
+            if rate is not None:
+                payload.append({"id": row.id, "rate": rate})
+        skipped = len(rows) - len(payload)
+
+        async with prisma.tx(timeout=timedelta(seconds=30)) as transaction:
+            # The cursor moves first: the row lock it takes keeps a concurrent
+            # claim waiting until this chunk commits, and a lost lease (or a
+            # cursor someone else already moved) rolls the chunk back.
+            advanced = await transaction.reconversionjob.update_many(
+                where={**self._owned(job.id, owner), 'lastExpenseId': job.lastExpenseId},
+                data={
+                    'processedExpenses': {'increment': len(payload)},
+                    'skippedExpenses': {'increment': skipped},
+                    'lastExpenseId': rows[-1].id,
+                    'leaseExpiresAt': self._lease(),
+                },
+            )
+            if advanced != 1:
+                raise LeaseLostError()
+            if payload:
+                encoded = json.dumps(payload)
+                await transaction.execute_raw(UPDATE_EXPENSES_SQL, job.toCurrency, encoded, job.userId, job.id, owner)
+                await transaction.execute_raw(INSERT_RECONCILE_SQL, job.toCurrency, encoded, job.userId, job.id, owner)
+        await mark_user_write(job.userId)
+
+
+reconversion_runner = ReconversionRunner()
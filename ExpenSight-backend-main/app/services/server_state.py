@@ -0,0 +1,90 @@
+import logging
+import os
+import threading
+import time
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+# How long shutdown waits for in-flight requests before disconnecting anyway.
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "30"))
+# How long a worker keeps serving after SIGTERM while /v1/monitoring/ready
+# answers 503, so the load balancer stops routing to it before it closes its
+# listener. Set it above the probe's period x failure threshold.
+DRAIN_GRACE_SECONDS = float(os.getenv("DRAIN_GRACE_SECONDS", "10"))
+
+
+class InFlightTracker:
+    """
+    Counts the HTTP requests a worker is currently serving.
+
+    Once draining starts the readiness probe reports the worker as unavailable.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.draining = False
+        self.started_at = time.time()
+
+    def enter(self) -> None:
+        self.in_flight += 1
+
+    def exit(self) -> None:
+        self.in_flight = max(self.in_flight - 1, 0)
+
+    def start_draining(self) -> None:
+        self.draining = True
+
+
+tracker = InFlightTracker()
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    A uvicorn server that drains before it stops listening.
+
+    The first SIGTERM/SIGINT marks the worker as draining, so the readiness
+    probe answers 503 while requests are still accepted and served. After
+    `grace_seconds` the signal is handed to uvicorn, which closes the
+    listener and waits up to timeout_graceful_shutdown (DRAIN_TIMEOUT_SECONDS)
+    for in-flight requests before the lifespan shutdown disconnects Prisma.
+    A second signal skips the rest of the grace period.
+
+    The module's `tracker` is looked up when the signal arrives: workers are
+    spawned with a pickled copy of the server, and only the module global is
+    the one the app's middleware and probe use.
+    """
+
+    def __init__(self, config, grace_seconds: float = DRAIN_GRACE_SECONDS):
+        super().__init__(config)
+        self.grace_seconds = grace_seconds
+        self._grace_timer = None
+
+    def handle_exit(self, sig, frame) -> None:
+        if self._grace_timer is not None or self.grace_seconds <= 0:
+            if self._grace_timer is not None:
+                self._grace_timer.cancel()
+            super().handle_exit(sig, frame)
+            return
+        tracker.start_draining()
+        logger.info("Draining: not ready, still serving %d request(s) for %gs", tracker.in_flight, self.grace_seconds)
+        self._grace_timer = threading.Timer(self.grace_seconds, super().handle_exit, args=(sig, frame))
+        self._grace_timer.daemon = True
+        self._grace_timer.start()
+
+
+class InFlightMiddleware:
+    """ASGI middleware that registers every HTTP request with the tracker."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        tracker.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            tracker.exit()
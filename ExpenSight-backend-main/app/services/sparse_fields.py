@@ -0,0 +1,125 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+
+# Selectable columns per resource, in response-model order. Names are both the
+# JSON keys and the (quoted) column names, so only whitelisted identifiers
+# ever reach the SQL below.
+EXPENSE_FIELDS = ("id", "amount", "currency", "category", "date", "status", "convertedAmount", "conversionCurrency")
+RECEIPT_FIELDS = ("filename", "id", "uploadedAt", "userId", "contentType", "size", "hasThumbnail")
+RECONCILE_FIELDS = ("id", "convertedAmount", "baseCurrency", "conversionCurrency", "fxRate", "createdAt")
+RECONCILE_EXPENSE_FIELDS = ("id", "amount", "currency", "category", "status", "date")
+
+EXPENSE_INCLUDES = ("receipt",)
+RECONCILE_INCLUDES = ("expense",)
+
+
+def _to_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+# Raw rows carry timestamps as ISO strings and whole doubles as ints; these
+# columns are coerced so values serialize exactly like the model-based path.
+_COERCE = {
+    "amount": float,
+    "convertedAmount": float,
+    "fxRate": float,
+    "date": _to_datetime,
+    "createdAt": _to_datetime,
+    "uploadedAt": _to_datetime,
+}
+
+
+def _split(raw: str) -> list:
+    return [part.strip() for part in raw.split(",") if part.strip()]
+
+
+def parse_fields(raw: Optional[str], allowed: tuple) -> Optional[list]:
+    """
+    Parses a `fields=a,b` parameter into the selected columns in model order.
+    `id` is always returned so clients can key their rows. None means the
+    parameter was not given.
+    """
+    if raw is None:
+        return None
+    requested = set(_split(raw))
+    unknown = requested - set(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s): {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}",
+        )
+    requested.add("id")
+    return [field for field in allowed if field in requested]
+
+
+def parse_include(raw: Optional[str], allowed: tuple) -> Optional[set]:
+    """Parses an `include=a,b` parameter into the relations to join. None means not given."""
+    if raw is None:
+        return None
+    requested = set(_split(raw))
+    unknown = requested - set(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown include(s): {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}",
+        )
+    return requested
+
+
+def _columns(alias: str, fields, prefix: str = "") -> list:
+    return [f'{alias}."{field}" AS "{prefix}{field}"' for field in fields]
+
+
+def expense_list_query(fields: list, include_receipt: bool) -> str:
+    columns = _columns("e", fields)
+    join = ""
+    if include_receipt:
+        columns += _columns("r", RECEIPT_FIELDS, "receipt.")
+        join = 'LEFT JOIN "receipts" r ON r."expenseId" = e."id"'
+    return f"""
+SELECT {", ".join(columns)}
+FROM "expenses" e
+{join}
+WHERE e."userId" = $1
+ORDER BY e."createdAt" DESC, e."id" DESC
+"""
+
+
+def reconcile_history_query(fields: list, include_expense: bool, include_archived: bool = False) -> str:
+    columns = _columns("c", fields)
+    join = ""
+    if include_expense:
+        columns += _columns("e", RECONCILE_EXPENSE_FIELDS, "expense.")
+        join = 'JOIN "expenses" e ON e."id" = c."expenseId"'
+    source = '"reconcile"'
+    if include_archived:
+        # The userId filter is pushed down into both branches and their indexes.
+        shared = ", ".join(f'"{field}"' for field in RECONCILE_FIELDS + ("expenseId", "userId"))
+        source = f'(SELECT {shared} FROM "reconcile" UNION ALL SELECT {shared} FROM "reconcile_archive")'
+    return f"""
+SELECT {", ".join(columns)}
+FROM {source} c
+{join}
+WHERE c."userId" = $1
+ORDER BY c."createdAt" DESC, c."id" DESC
+"""
+
+
+def _value(row: dict, key: str, field: str):
+    value = row[key]
+    if value is None or field not in _COERCE:
+        return value
+    return _COERCE[field](value)
+
+
+def shape_row(row: dict, fields: list, relation: Optional[str] = None, relation_fields: tuple = ()) -> dict:
+    """
+    Turns a flat raw row into the response shape: the selected fields, then
+    the joined relation nested under its name (None when the join found nothing).
+    """
+    item = {field: _value(row, field, field) for field in fields}
+    if relation:
+        nested = {field: _value(row, f"{relation}.{field}", field) for field in relation_fields}
+        item[relation] = nested if nested["id"] is not None else None
+    return item
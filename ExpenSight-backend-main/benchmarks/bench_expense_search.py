@@ -0,0 +1,95 @@
+"""
+Expense search latency benchmark.
+
+Seeds a throwaway user with N expenses (default 100k) straight in SQL, runs
+typical `search_expenses` queries against them and prints median / p95
+latency plus the plan Postgres picked for each. The user and its expenses
+are deleted afterwards. Needs DATABASE_URL with the search migrations
+applied (pg_trgm and the expense indexes from prisma/schema.prisma).
+
+Usage (from the backend root):
+    python benchmarks/bench_expense_search.py --rows 100000 --runs 30
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import date
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.database.db import prisma
+from app.controllers.expense_controller import search_expenses
+
+SEED_SQL = """
+INSERT INTO "expenses" ("amount", "currency", "category", "date", "userId", "createdAt", "updatedAt", "status")
+SELECT
+    round((random() * 5000)::numeric, 2),
+    (ARRAY['INR', 'USD', 'EUR', 'GBP'])[1 + (i % 4)],
+    (ARRAY['Food', 'Groceries', 'Fuel', 'Travel', 'Office Supplies', 'Software', 'Utilities', 'Rent'])[1 + (i % 8)]
+        || ' ' || md5(i::text),
+    now() - (i % 1500) * interval '1 day',
+    $1, now(), now(),
+    (CASE WHEN i % 3 = 0 THEN 'RECONCILED' ELSE 'PENDING' END)::"ReconciliationStatus"
+FROM generate_series(1, $2) AS i
+"""
+
+SCENARIOS = {
+    "latest page": {},
+    "category text": {"q": "grocer"},
+    "amount range, by amount": {"min_amount": 100, "max_amount": 150, "sort": "amount", "order": "asc"},
+    "date range + currency": {"start_date": date(2024, 1, 1), "end_date": date(2024, 3, 31), "currency": "USD"},
+    "pending, deep page": {"status": "PENDING", "page": 200},
+    "by category": {"sort": "category", "order": "asc"},
+}
+
+
+async def run(rows: int, runs: int):
+    await prisma.connect()
+    user = await prisma.users.create(data={
+        "email": f"bench-{uuid.uuid4().hex}@example.com", "hashedPassword": "x",
+    })
+    try:
+        start = time.perf_counter()
+        await prisma.execute_raw(SEED_SQL, user.id, rows)
+        await prisma.execute_raw('ANALYZE "expenses"')
+        print(f"seeded {rows} expenses in {time.perf_counter() - start:.1f}s\n")
+
+        current_user = SimpleNamespace(id=user.id)
+        print(f"{'scenario':<26} {'total':>7} {'median ms':>10} {'p95 ms':>8}")
+        for name, filters in SCENARIOS.items():
+            latencies = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                result = await search_expenses(current_user, **filters)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+            print(f"{name:<26} {result['total']:>7} {statistics.median(latencies):>10.1f} {p95:>8.1f}")
+
+        plan = await prisma.query_raw(
+            'EXPLAIN SELECT id FROM "expenses" WHERE "userId" = $1 AND "category" ILIKE $2', user.id, "%grocer%"
+        )
+        print("\nplan for category text:")
+        for row in plan:
+            print("  " + next(iter(row.values())))
+    finally:
+        await prisma.execute_raw('DELETE FROM "expenses" WHERE "userId" = $1', user.id)
+        await prisma.users.delete(where={"id": user.id})
+        await prisma.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.runs))
+
+
+if __name__ == "__main__":
+    main()
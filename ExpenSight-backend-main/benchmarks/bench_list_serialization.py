@@ -0,0 +1,102 @@
+"""
+Compares the two response paths of the list endpoints:
+
+  * validated: FastAPI re-validates the Prisma rows through the response model
+    (List[ExpenseOut] / ReconciliationHistoryResponse) and encodes with the stdlib.
+  * fast: rows are mapped straight to dicts and encoded with orjson
+    (app/services/fast_json.py).
+
+Both bodies are checked to be byte-identical before timing.
+
+Usage (from the backend root):
+    python benchmarks/bench_list_serialization.py --rows 5000 --repeat 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.schemas.expense_schema import ExpenseOut
+from app.schemas.reconcile_schema import ReconciliationHistoryResponse
+from app.services.fast_json import expense_list_response, reconcile_history_response
+from tests.test_fast_json import Expense, Receipts, Reconcile, ReconciliationStatus
+
+UTC = timezone.utc
+
+
+def build_rows(n: int):
+    base = datetime(2025, 1, 1, tzinfo=UTC)
+    expenses, history = [], []
+    for i in range(1, n + 1):
+        stamp = base + timedelta(minutes=i, microseconds=i)
+        expense = Expense(
+            id=i, amount=10 + i * 0.37, currency="USD", category="Food & Dining", date=base + timedelta(days=i % 365),
+            userId=1, createdAt=stamp, updatedAt=stamp,
+            status=ReconciliationStatus.RECONCILED if i % 2 else ReconciliationStatus.PENDING,
+            convertedAmount=(10 + i * 0.37) * 83.4 if i % 2 else None, conversionCurrency="INR" if i % 2 else None,
+            receipt=Receipts(id=i, filename=f"receipt_{i}.jpg", uploadedAt=stamp, userId=1, expenseId=i) if i % 3 else None,
+        )
+        expenses.append(expense)
+        history.append(Reconcile(
+            id=i, convertedAmount=expense.amount * 83.4, baseCurrency="USD", conversionCurrency="INR", fxRate=83.4,
+            createdAt=stamp, expenseId=i, userId=1, expense=expense,
+        ))
+    return expenses, history
+
+
+async def validated_body(field, content) -> bytes:
+    value = await serialize_response(field=field, response_content=content)
+    return JSONResponse(value).body
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    expenses, history = build_rows(args.rows)
+    expense_field = create_model_field(name="Response", type_=List[ExpenseOut], mode="serialization")
+    history_field = create_model_field(name="Response", type_=ReconciliationHistoryResponse, mode="serialization")
+    history_content = {"message": "History fetched successfully", "reconciliation_history": history}
+    loop = asyncio.new_event_loop()
+
+    cases = {
+        "GET /v1/expense/": (
+            lambda: loop.run_until_complete(validated_body(expense_field, expenses)),
+            lambda: expense_list_response(expenses).body,
+        ),
+        "GET /v1/reconcile/history": (
+            lambda: loop.run_until_complete(validated_body(history_field, history_content)),
+            lambda: reconcile_history_response("History fetched successfully", history).body,
+        ),
+    }
+
+    print(f"{args.rows} rows, best of {args.repeat}")
+    print(f"{'endpoint':<26} {'validated (ms)':>15} {'fast (ms)':>10} {'speed-up':>9} {'identical':>10}")
+    for name, (validated, fast) in cases.items():
+        identical = validated() == fast()
+        slow_s, fast_s = timed(validated, args.repeat), timed(fast, args.repeat)
+        print(f"{name:<26} {slow_s * 1000:>15.1f} {fast_s * 1000:>10.1f} {slow_s / fast_s:>8.1f}x {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
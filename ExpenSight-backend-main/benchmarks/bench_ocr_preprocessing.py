@@ -0,0 +1,70 @@
+"""
+OCR latency / accuracy benchmark for receipt preprocessing.
+
+Runs every fixture in tests/fixtures/receipts through `process_receipt` twice,
+once with the raw upload and once preprocessed, and reports payload size,
+model latency and whether the extracted fields match expected.json.
+Needs GEMINI_API_KEY (and calls the real model).
+
+Usage (from the backend root):
+    python benchmarks/bench_ocr_preprocessing.py --runs 3
+"""
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.controllers import receipt_controller
+from app.services import receipt_preprocessing
+
+FIXTURES = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "receipts"))
+
+
+def matches(parsed: dict, expected: dict) -> bool:
+    try:
+        amount_ok = abs(float(parsed.get("amount")) - expected["amount"]) < 0.01
+    except (TypeError, ValueError):
+        return False
+    return (
+        amount_ok
+        and str(parsed.get("currency", "")).upper() == expected["currency"]
+        and str(parsed.get("date")) == expected["date"]
+    )
+
+
+async def run(runs: int):
+    with open(os.path.join(FIXTURES, "expected.json")) as f:
+        expected = json.load(f)
+
+    print(f"{'fixture':<26} {'mode':<12} {'bytes':>9} {'median ms':>10} {'accurate':>9}")
+    for name, want in expected.items():
+        path = os.path.join(FIXTURES, name)
+        for mode, enabled in (("raw", False), ("preprocessed", True)):
+            receipt_preprocessing.OCR_PREPROCESSING_ENABLED = enabled
+            with open(path, "rb") as f:
+                data = f.read()
+            payload, _, _ = receipt_preprocessing.preprocess_receipt(data, mimetypes.guess_type(name)[0])
+            latencies, correct = [], 0
+            for _ in range(runs):
+                start = time.perf_counter()
+                parsed = await receipt_controller.process_receipt(path)
+                latencies.append((time.perf_counter() - start) * 1000)
+                correct += matches(parsed, want)
+            print(f"{name:<26} {mode:<12} {len(payload):>9} {statistics.median(latencies):>10.0f} {correct:>6}/{runs}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.runs))
+
+
+if __name__ == "__main__":
+    main()
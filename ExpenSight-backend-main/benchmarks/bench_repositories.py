@@ -0,0 +1,94 @@
+"""
+Controller latency over the in-memory data-access layer.
+
+Seeds one user with N expenses (default 20k, a third reconciled, a third
+with receipts) in app/repositories/memory.py and times the controllers
+behind the list, search and dashboard endpoints (including /v1/dashboard/bundle). No database is needed, so
+the numbers isolate the Python side of each endpoint (filtering, shaping,
+aggregation) from Postgres; run bench_expense_search.py for the query side.
+
+Usage (from the backend root):
+    python benchmarks/bench_repositories.py --rows 20000 --runs 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.controllers.dashboard_controller import get_category_breakdown, get_dashboard_bundle, get_dashboard_stats, get_expense_trends
+from app.controllers.expense_controller import get_all_expenses, search_expenses
+from app.repositories.memory import memory_repositories
+from app.repositories.registry import use_repositories
+from app.services.category_normalizer import normalize_category
+
+CATEGORIES = ["Food", "Groceries", "Fuel", "Travel", "Office Supplies", "Software", "Utilities", "Rent"]
+CURRENCIES = ["INR", "USD", "EUR", "GBP"]
+
+SCENARIOS = {
+    "list all": lambda user: get_all_expenses(user),
+    "search latest page": lambda user: search_expenses(user),
+    "search text + amount": lambda user: search_expenses(user, q="grocer", min_amount=100, max_amount=2000, sort="amount"),
+    "search deep page": lambda user: search_expenses(user, status="PENDING", page=200),
+    "dashboard stats": lambda user: get_dashboard_stats(user),
+    "dashboard trends": lambda user: get_expense_trends(user),
+    "dashboard bundle": lambda user: get_dashboard_bundle(user),
+    "category breakdown": lambda user: get_category_breakdown(user, date(2024, 1, 1), date(2024, 12, 31)),
+}
+
+
+async def seed(repos, rows: int):
+    user = await repos.users.create("bench@example.com", "x", "INR")
+    today = datetime(2025, 6, 1)
+    for i in range(rows):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        expense = await repos.expenses.create({
+            "amount": round(10 + (i * 37) % 5000, 2), "currency": CURRENCIES[i % len(CURRENCIES)],
+            "category": category, "categoryKey": normalize_category(category),
+            "date": today - timedelta(days=i % 1500), "userId": user.id,
+        })
+        if i % 3 == 0:
+            await repos.receipts.create({"filename": f"receipt_{i}.jpg", "userId": user.id, "expenseId": expense.id})
+        if i % 3 == 1:
+            await repos.expenses.update(expense.id, {"status": "RECONCILED"})
+            await repos.reconciles.create({
+                "expenseId": expense.id, "userId": user.id, "convertedAmount": expense.amount * 83.4,
+                "baseCurrency": expense.currency, "conversionCurrency": "INR", "fxRate": 83.4,
+            })
+    return SimpleNamespace(id=user.id, email=user.email, baseCurrency=user.baseCurrency, created_at=user.created_at)
+
+
+async def run(rows: int, runs: int):
+    repos = memory_repositories()
+    with use_repositories(repos):
+        start = time.perf_counter()
+        user = await seed(repos, rows)
+        print(f"seeded {rows} expenses in {time.perf_counter() - start:.1f}s\n")
+
+        print(f"{'scenario':<24} {'median ms':>10} {'p95 ms':>8}")
+        for name, call in SCENARIOS.items():
+            latencies = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                await call(user)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+            print(f"{name:<24} {statistics.median(latencies):>10.2f} {p95:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.runs))
+
+
+if __name__ == "__main__":
+    main()
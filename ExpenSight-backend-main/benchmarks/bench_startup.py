@@ -0,0 +1,64 @@
+"""
+Import-time / startup benchmark for the API workers.
+
+Each scenario imports the app in a fresh interpreter (so module caches do not
+leak between runs) and reports the median wall time of `import main`, the
+peak RSS of the process and whether the Gemini SDK ended up loaded.
+
+Usage (from the backend root):
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import main
+{extra}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "sdk_loaded": "google.generativeai" in sys.modules,
+}}))
+"""
+
+SCENARIOS = {
+    # What a worker paid before the OCR client became lazy.
+    "eager-sdk": ({"OCR_ENABLED": "true"}, "import google.generativeai"),
+    "lazy-ocr-worker": ({"OCR_ENABLED": "true"}, ""),
+    "non-ocr-worker": ({"OCR_ENABLED": "false"}, ""),
+}
+
+
+def run_probe(env_overrides: dict, extra: str) -> dict:
+    env = {**os.environ, **env_overrides}
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(extra=extra)],
+        cwd=BACKEND_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<18} {'median import (ms)':>20} {'max rss (MB)':>14} {'sdk loaded':>11}")
+    for name, (env_overrides, extra) in SCENARIOS.items():
+        samples = [run_probe(env_overrides, extra) for _ in range(args.runs)]
+        median_ms = statistics.median(s["seconds"] for s in samples) * 1000
+        rss = statistics.median(s["max_rss_mb"] for s in samples)
+        print(f"{name:<18} {median_ms:>20.1f} {rss:>14.1f} {str(samples[0]['sdk_loaded']):>11}")
+
+
+if __name__ == "__main__":
+    main()
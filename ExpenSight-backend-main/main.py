@@ -1,6 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database.db import prisma
+from app.database.db import prisma, pool_settings, connect_read_replica, disconnect_read_replica
+from app.services.server_state import tracker, InFlightMiddleware
+from app.services.fx_prefetch import fx_prefetcher
+from app.services.reconversion import reconversion_runner
+from app.services.reconcile_compaction import reconcile_compactor
+from app.services.idempotency import purge_expired_keys
+from app.services.rate_limiter import rate_limiter
+from app.services.profiler import PROFILING_ENABLED, ProfilingMiddleware
 import logging
 from app.api.v1.auth import router as auth_router
 from app.api.v1.user import router as user_router
@@ -8,15 +15,37 @@ from app.api.v1.receipt import router as receipt_router
 from app.api.v1.reconcile import router as reconcile_router
 from app.api.v1.expense import router as expense_router
 from app.api.v1 import dashboard as dashboard_router
+from app.api.v1.monitoring import router as monitoring_router
+from app.api.v1.admin import router as admin_router
 
 
 logging.basicConfig(level=logging.INFO)
 
 async def lifespan(app:FastAPI):
-    logging.info("Connecting to Prisma")
+    logging.info("Connecting to Prisma with pool settings %s", pool_settings())
     await prisma.connect()
+    # Read-only endpoints use the replica when READ_DATABASE_URL is set and reachable.
+    await connect_read_replica()
+    # Warm the FX rate store for PENDING expenses in the background.
+    fx_prefetcher.start()
+    # Move superseded reconciliations into the archive table periodically.
+    reconcile_compactor.start()
+    # Pick up base-currency re-conversions interrupted by the last shutdown.
+    await reconversion_runner.resume_pending()
+    # Expired keys are also replaced lazily when reused; this keeps the table small.
+    await purge_expired_keys()
+    await rate_limiter.purge_idle()
     yield
+    await fx_prefetcher.stop()
+    await reconcile_compactor.stop()
+    await reconversion_runner.stop()
+    # The server drained before it got here (DrainingServer in serve.py, then
+    # uvicorn's graceful shutdown); anything still counted was cut off.
+    tracker.start_draining()
+    if tracker.in_flight:
+        logging.warning("Shutting down with %d request(s) still in flight", tracker.in_flight)
     logging.info("Disconnecting from Prisma")
+    await disconnect_read_replica()
     await prisma.disconnect()
 
 app = FastAPI(title="ExpenSight",lifespan=lifespan)
@@ -33,6 +62,10 @@ app.add_middleware(
     allow_methods=["*"], # Allows all methods
     allow_headers=["*"], # Allows all headers
 )
+app.add_middleware(InFlightMiddleware)
+if PROFILING_ENABLED:
+    # Per-request cProfile for admins sending X-Profile: 1.
+    app.add_middleware(ProfilingMiddleware)
 
 app.include_router(auth_router)
 app.include_router(user_router)
@@ -40,6 +73,8 @@ app.include_router(receipt_router)
 app.include_router(expense_router)
 app.include_router(reconcile_router)
 app.include_router(dashboard_router.router)
+app.include_router(monitoring_router)
+app.include_router(admin_router)
 
 
 @app.get("/")
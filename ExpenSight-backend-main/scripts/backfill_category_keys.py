@@ -0,0 +1,50 @@
+"""
+Backfills Expense.categoryKey for rows created before category normalization.
+
+Normalizes each distinct free-text category once and updates all expenses
+carrying it with a single UPDATE, so the run costs one statement per distinct
+spelling rather than one per expense. Safe to re-run; rows whose key is
+already correct are left untouched.
+
+Usage (from the backend root):
+    python scripts/backfill_category_keys.py [--dry-run]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.database.db import prisma
+from app.services.category_normalizer import normalize_category
+
+
+async def run(dry_run: bool):
+    await prisma.connect()
+    try:
+        groups = await prisma.expense.group_by(by=['category'], count=True)
+        updated = 0
+        for group in sorted(groups, key=lambda g: g['category']):
+            category = group['category']
+            key = normalize_category(category)
+            print(f"{group['_count']['_all']:>8}  {category!r} -> {key}")
+            if not dry_run:
+                updated += await prisma.expense.update_many(
+                    where={'category': category, 'NOT': {'categoryKey': key}},
+                    data={'categoryKey': key},
+                )
+        print(f"\n{len(groups)} distinct categories, {updated} expenses updated")
+    finally:
+        await prisma.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only print the mapping")
+    args = parser.parse_args()
+    asyncio.run(run(args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Multi-process entry point.
+
+    python serve.py
+
+Starts WEB_CONCURRENCY uvicorn workers, each with its own Prisma client whose
+pool is sized by DB_CONNECTION_LIMIT (or DB_MAX_CONNECTIONS / WEB_CONCURRENCY).
+On SIGTERM each worker first reports unavailable on /v1/monitoring/ready while
+still serving for DRAIN_GRACE_SECONDS, then stops accepting connections,
+drains in-flight requests for up to DRAIN_TIMEOUT_SECONDS and disconnects from
+the database.
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from uvicorn import Config
+from uvicorn.supervisors import Multiprocess
+from app.services.server_state import DRAIN_TIMEOUT_SECONDS, DrainingServer
+
+
+def main():
+    config = Config(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=max(int(os.getenv("WEB_CONCURRENCY", "1")), 1),
+        timeout_graceful_shutdown=int(DRAIN_TIMEOUT_SECONDS),
+        proxy_headers=True,
+    )
+    # uvicorn.run() always builds a plain Server, so the worker setup is done here.
+    server = DrainingServer(config)
+    if config.workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
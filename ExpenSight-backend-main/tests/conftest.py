@@ -0,0 +1,94 @@
+import itertools
+import pytest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+from prisma.errors import UniqueViolationError
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.repositories.memory import memory_repositories
+from app.repositories.registry import use_repositories
+from app.dependencies import deps
+from app.security import jwt as jwt_settings
+from app.services import idempotency
+from app.services.rate_limiter import rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def memory_database():
+    """
+    Every test runs on a fresh in-memory data-access layer, so no Postgres is
+    needed. Tests that seed data use their own `repos` fixture, which nests a
+    new one inside this.
+    """
+    with use_repositories(memory_repositories()) as repositories:
+        yield repositories
+
+
+@pytest.fixture(autouse=True)
+def token_signing(monkeypatch):
+    """Tokens can be issued and verified without a .env providing SECRET_KEY / ALGORITHM."""
+    secret = jwt_settings.SECRET_KEY or "test-secret"
+    algorithm = jwt_settings.ALGORITHM or "HS256"
+    for module in (jwt_settings, deps):
+        monkeypatch.setattr(module, "SECRET_KEY", secret)
+        monkeypatch.setattr(module, "ALGORITHM", algorithm)
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Every test starts with full per-user buckets, whatever ran before it."""
+    rate_limiter.reset()
+    yield
+    rate_limiter.reset()
+
+
+class FakeKeyTable:
+    """In-memory stand-in for prisma.idempotencykey with the (userId, route, key) unique constraint."""
+
+    def __init__(self):
+        self.rows = {}
+        self.ids = itertools.count(1)
+
+    async def create(self, data):
+        key = (data['userId'], data['route'], data['key'])
+        if key in self.rows:
+            raise UniqueViolationError({})
+        self.rows[key] = SimpleNamespace(
+            id=next(self.ids), status="IN_PROGRESS", statusCode=None, responseBody=None,
+            createdAt=datetime.now(timezone.utc), **data,
+        )
+        return self.rows[key]
+
+    async def find_unique(self, where):
+        k = where['userId_route_key']
+        return self.rows.get((k['userId'], k['route'], k['key']))
+
+    def _matching(self, where):
+        return [key for key, row in self.rows.items()
+                if all(getattr(row, field) == value for field, value in where.items())]
+
+    async def delete_many(self, where):
+        matching = self._matching(where)
+        for key in matching:
+            del self.rows[key]
+        return len(matching)
+
+    async def update_many(self, where, data):
+        matching = self._matching(where)
+        for key in matching:
+            for field, value in data.items():
+                setattr(self.rows[key], field, value)
+        return len(matching)
+
+
+@pytest.fixture
+def key_table():
+    table = FakeKeyTable()
+    with patch('app.services.idempotency.prisma') as mock_prisma_client, \
+            patch.object(idempotency, 'IDEMPOTENCY_POLL_SECONDS', 0.01):
+        mock_prisma_client.idempotencykey = table
+        yield table
@@ -0,0 +1,102 @@
+"""
+Regenerates the receipt fixtures in this directory.
+
+    python tests/fixtures/receipts/generate_fixtures.py
+
+The expected extraction for every fixture lives in expected.json; keep the two
+in sync when changing the receipts drawn here.
+"""
+import io
+import os
+from PIL import Image, ImageDraw, ImageFont
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PAPER = (246, 241, 228)
+INK = (30, 30, 40)
+
+
+def draw_receipt(size, lines, font_size):
+    image = Image.new("RGB", size, PAPER)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=font_size)
+    y = font_size * 2
+    for line in lines:
+        draw.text((font_size * 2, y), line, fill=INK, font=font)
+        y += int(font_size * 1.6)
+    return image
+
+
+def text_pdf(pages):
+    """Builds a PDF with a real text layer; `pages` is a list of line lists."""
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for lines in pages:
+        page = writer.add_blank_page(width=612, height=792)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+        })
+        ops = ["BT", "/F1 12 Tf", "14 TL", "72 720 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        stream = DecodedStreamObject()
+        stream.set_data("\n".join(ops).encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(stream)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def main():
+    # 8 MP phone photo stored sideways with an EXIF "rotate 90° CW" tag.
+    upright = draw_receipt((2448, 3264), [
+        "CAFE MILANO",
+        "12 Via Roma, Milano",
+        "Date: 2025-03-14",
+        "",
+        "Cappuccino          3.50",
+        "Cornetto            2.20",
+        "Spremuta            4.00",
+        "",
+        "TOTAL EUR           9.70",
+        "Thank you!",
+    ], font_size=96)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    upright.transpose(Image.Transpose.ROTATE_90).save(
+        os.path.join(HERE, "phone_photo_rotated.jpg"), format="JPEG", quality=92, exif=exif
+    )
+
+    # A4 scan at 300 dpi.
+    draw_receipt((2480, 3508), [
+        "FRESH MART GROCERIES",
+        "Invoice date: 2025-06-02",
+        "",
+        "Milk 1L              1.99",
+        "Bread                2.49",
+        "Apples 1kg           3.80",
+        "Eggs x12             4.15",
+        "",
+        "Grand Total USD     12.43",
+    ], font_size=72).save(os.path.join(HERE, "scanned_receipt.png"), format="PNG")
+
+    # Four-page invoice whose total sits on the last page.
+    pdf = text_pdf([
+        ["ACME CLOUD SERVICES", "Invoice INV-2025-0042", "Invoice Date: 2025-05-31", "Bill to: ExpenSight Ltd"],
+        ["Usage details"] + [f"Compute hours line {i}    0.10" for i in range(1, 40)],
+        ["Usage details (continued)"] + [f"Storage GB line {i}    0.05" for i in range(1, 40)],
+        ["Summary", "Subtotal    INR 4,150.00", "GST 18%     INR 747.00", "Grand Total INR 4,897.00", "Category: Software"],
+    ])
+    with open(os.path.join(HERE, "multipage_invoice.pdf"), "wb") as f:
+        f.write(pdf)
+
+
+if __name__ == "__main__":
+    main()
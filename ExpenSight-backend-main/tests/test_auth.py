@@ -2,20 +2,16 @@ import pytest
 from httpx import AsyncClient
 from httpx import ASGITransport
 from main import app
-from app.database.db import prisma  # import your prisma instance
+
 
 @pytest.mark.asyncio
 async def test_register_and_login():
-    await prisma.connect()
-
-    # Delete user if already exists (clean up before test)
-    await prisma.users.delete_many(where={"email": "testuser@example.com"})
-
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://testserver") as ac:
         response = await ac.post("/v1/auth/register", json={
             "email": "testuser@example.com",
-            "password": "testpassword"
+            "password": "testpassword",
+            "baseCurrency": "INR"
         })
         assert response.status_code == 200
 
@@ -27,5 +23,19 @@ async def test_register_and_login():
         data = response.json()
         assert "access_token" in data
 
-    await prisma.disconnect()
 
+@pytest.mark.asyncio
+async def test_login_with_wrong_password_is_rejected():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://testserver") as ac:
+        await ac.post("/v1/auth/register", json={
+            "email": "testuser@example.com",
+            "password": "testpassword",
+            "baseCurrency": "INR"
+        })
+
+        response = await ac.post("/v1/auth/login", json={
+            "email": "testuser@example.com",
+            "password": "wrongpassword"
+        })
+        assert response.status_code == 400
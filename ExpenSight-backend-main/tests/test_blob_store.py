@@ -0,0 +1,83 @@
+import hashlib
+import io
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+from app.services.blob_store import BlobStore, render_thumbnail, THUMBNAIL_MAX_DIMENSION
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "receipts")
+
+
+def fixture_bytes(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+def test_blob_is_sharded_by_hash(tmp_path):
+    """Scenario: ✅ Stored blob -> <root>/<aa>/<bb>/<sha256>, byte-identical"""
+    store = BlobStore(tmp_path)
+    data = fixture_bytes("scanned_receipt.png")
+
+    stored = store.put(data, "image/png")
+
+    sha = hashlib.sha256(data).hexdigest()
+    assert stored["contentHash"] == sha
+    assert stored["size"] == len(data)
+    path = store.path_for(sha)
+    assert path == tmp_path / sha[:2] / sha[2:4] / sha
+    assert path.read_bytes() == data
+    assert not [p for p in path.parent.iterdir() if p.name.startswith(".tmp-")]
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    """Scenario: ✅ Same file uploaded twice (any user) -> one blob, second put deduplicated"""
+    store = BlobStore(tmp_path)
+    data = fixture_bytes("scanned_receipt.png")
+
+    first = store.put(data, "image/png")
+    second = store.put(data, "image/png")
+
+    assert first["deduplicated"] is False
+    assert second["deduplicated"] is True
+    blobs = [p for p in tmp_path.rglob("*") if p.is_file() and not p.name.endswith(".thumb.jpg")]
+    assert len(blobs) == 1
+
+
+def test_thumbnail_is_small_and_upright(tmp_path):
+    """Scenario: ✅ Sideways phone photo -> upright JPEG thumbnail within the size limit"""
+    store = BlobStore(tmp_path)
+    stored = store.put(fixture_bytes("phone_photo_rotated.jpg"), "image/jpeg")
+
+    assert stored["hasThumbnail"] is True
+    with Image.open(store.thumbnail_path_for(stored["contentHash"])) as thumb:
+        assert thumb.format == "JPEG"
+        assert max(thumb.size) <= THUMBNAIL_MAX_DIMENSION
+        assert thumb.height > thumb.width  # the receipt is portrait once rotated
+
+
+def test_scanned_pdf_gets_a_thumbnail_text_pdf_does_not():
+    """Scenario: ✅ Scanned PDF -> thumbnail from its page image; text-only PDF -> None"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (1200, 1800), (240, 240, 240)).save(buffer, format="PDF")
+
+    assert render_thumbnail(buffer.getvalue(), "application/pdf") is not None
+    assert render_thumbnail(fixture_bytes("multipage_invoice.pdf"), "application/pdf") is None
+
+
+def test_undecodable_image_is_stored_without_thumbnail(tmp_path):
+    """Scenario: ❌ Corrupt image -> blob kept, no thumbnail, no error"""
+    store = BlobStore(tmp_path)
+    stored = store.put(b"not really a png", "image/png")
+
+    assert stored["hasThumbnail"] is False
+    assert store.path_for(stored["contentHash"]).exists()
+
+
+def test_path_for_rejects_non_hashes(tmp_path):
+    """Scenario: ❌ Path traversal attempt -> ValueError"""
+    with pytest.raises(ValueError):
+        BlobStore(tmp_path).path_for("../../etc/passwd")
@@ -0,0 +1,58 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import category_normalizer
+from app.services.category_normalizer import (
+    normalize_category, category_label, CANONICAL_CATEGORIES, CATEGORY_ALIASES
+)
+
+
+@pytest.mark.parametrize("raw, key", [
+    ("Food", "food"),
+    ("food & dining", "food"),
+    ("Restaurant", "food"),
+    ("FOOD AND BEVERAGES", "food"),
+    ("Groceries", "groceries"),
+    ("office-supplies", "office_supplies"),
+    ("Software & Subscriptions", "software"),
+    ("Hotel stay", "lodging"),
+    ("Team lunch", "food"),
+])
+def test_known_spellings_map_to_canonical_keys(raw, key):
+    """Scenario: ✅ OCR / manual spellings -> one canonical key"""
+    assert normalize_category(raw) == key
+
+
+@pytest.mark.parametrize("raw, key", [
+    ("Grocceries", "groceries"),
+    ("Electricty", "utilities"),
+    ("Softwre", "software"),
+])
+def test_misspellings_are_fuzzy_matched(raw, key):
+    """Scenario: ✅ OCR typo -> nearest known spelling"""
+    assert normalize_category(raw) == key
+
+
+@pytest.mark.parametrize("raw", [None, "", "   ", "Uncategorized", "qwerty zxcv"])
+def test_unknown_or_empty_is_other(raw):
+    """Scenario: ❌ Nothing recognisable -> 'other'"""
+    assert normalize_category(raw) == "other"
+
+
+def test_fuzzy_results_are_cached():
+    """Scenario: ✅ Same unseen spelling twice -> difflib runs once"""
+    category_normalizer._fuzzy_match.cache_clear()
+    normalize_category("Pharmacyy")
+    normalize_category("pharmacyy!")
+    info = category_normalizer._fuzzy_match.cache_info()
+    assert info.misses == 1 and info.hits == 1
+
+
+def test_aliases_only_point_at_canonical_keys():
+    """Scenario: ✅ Dictionary is consistent -> every alias key has a label"""
+    assert set(CATEGORY_ALIASES) <= set(CANONICAL_CATEGORIES)
+    assert category_label("groceries") == "Groceries"
+    assert category_label("no-such-key") == "Other"
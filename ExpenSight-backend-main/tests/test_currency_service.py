@@ -0,0 +1,204 @@
+import asyncio
+import pytest
+from datetime import date, datetime, timezone
+from fastapi import HTTPException
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import currency_service
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def empty_rate_cache():
+    currency_service.clear_rate_cache()
+    yield
+    currency_service.clear_rate_cache()
+
+
+@pytest.fixture
+def fresh_breaker(monkeypatch):
+    clock = FakeClock()
+    breaker = CircuitBreaker(name="test", failure_threshold=0.5, window_size=4, min_calls=2, cooldown_seconds=10, clock=clock)
+    monkeypatch.setattr(currency_service, "fx_breaker", breaker)
+    return breaker, clock
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_lookups_share_one_call(monkeypatch, fresh_breaker):
+    calls = []
+
+    async def fake_request(clean_from, clean_to, date_str):
+        calls.append((clean_from, clean_to, date_str))
+        await asyncio.sleep(0.05)
+        return 83.5
+
+    monkeypatch.setattr(currency_service, "_request_fx_rate", fake_request)
+
+    results = await asyncio.gather(*[
+        currency_service.get_historical_fx_rate("usd", "INR", date(2025, 7, 19))
+        for _ in range(10)
+    ])
+
+    assert results == [83.5] * 10
+    assert calls == [("USD", "INR", "2025-07-19")]
+    assert currency_service.get_fx_service_status()["inflightLookups"] == 0
+
+
+@pytest.mark.asyncio
+async def test_coalesced_failure_is_raised_to_every_waiter(monkeypatch, fresh_breaker):
+    async def failing_request(clean_from, clean_to, date_str):
+        await asyncio.sleep(0.01)
+        raise HTTPException(status_code=503, detail="Could not connect to the external FX service.")
+
+    monkeypatch.setattr(currency_service, "_request_fx_rate", failing_request)
+
+    results = await asyncio.gather(*[
+        currency_service.get_historical_fx_rate("EUR", "USD", date(2025, 1, 2))
+        for _ in range(3)
+    ], return_exceptions=True)
+
+    assert all(isinstance(r, HTTPException) and r.status_code == 503 for r in results)
+    breaker, _ = fresh_breaker
+    assert breaker.total_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_breaker_fails_fast_then_probes_after_cooldown(monkeypatch, fresh_breaker):
+    breaker, clock = fresh_breaker
+    calls = []
+
+    async def failing_request(clean_from, clean_to, date_str):
+        calls.append(date_str)
+        raise HTTPException(status_code=503, detail="External FX service failed with status 502.")
+
+    monkeypatch.setattr(currency_service, "_request_fx_rate", failing_request)
+
+    for day in (1, 2):
+        with pytest.raises(HTTPException):
+            await currency_service.get_historical_fx_rate("EUR", "USD", date(2025, 1, day))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # While open, calls are rejected without touching the network.
+    with pytest.raises(HTTPException) as exc_info:
+        await currency_service.get_historical_fx_rate("EUR", "USD", date(2025, 1, 3))
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+    assert len(calls) == 2
+
+    # After the cooldown one probe goes through; a success closes the breaker.
+    async def healthy_request(clean_from, clean_to, date_str):
+        calls.append(date_str)
+        return 1.1
+
+    monkeypatch.setattr(currency_service, "_request_fx_rate", healthy_request)
+    clock.now += 11
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert await currency_service.get_historical_fx_rate("EUR", "USD", date(2025, 1, 4)) == 1.1
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+async def unsupported_currency():
+    raise HTTPException(status_code=400, detail="The currency code 'XXX' is not supported or invalid.")
+
+
+async def service_error():
+    raise HTTPException(status_code=503, detail="External FX service failed with status 502.")
+
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_trip_the_breaker(fresh_breaker):
+    breaker, _ = fresh_breaker
+    for _ in range(breaker.min_calls + 2):
+        with pytest.raises(HTTPException) as exc_info:
+            await currency_service._guarded(unsupported_currency)
+        assert exc_info.value.status_code == 400
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.total_calls == breaker.min_calls + 2
+
+
+@pytest.mark.asyncio
+async def test_server_errors_trip_the_breaker(fresh_breaker):
+    breaker, _ = fresh_breaker
+    for _ in range(breaker.min_calls):
+        with pytest.raises(HTTPException) as exc_info:
+            await currency_service._guarded(service_error)
+        assert exc_info.value.status_code == 503
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Rejected without calling the service.
+    with pytest.raises(HTTPException) as exc_info:
+        await currency_service._guarded(unsupported_currency)
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+
+
+def test_half_open_allows_a_single_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(name="test", failure_threshold=0.5, window_size=2, min_calls=1, cooldown_seconds=5, clock=clock)
+    breaker.before_call()
+    breaker.record_failure("boom")
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 5
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure("still down")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()["timesOpened"] == 2
+
+
+@pytest.mark.asyncio
+async def test_rates_are_served_from_the_local_store(monkeypatch, fresh_breaker):
+    calls = []
+
+    async def fake_request(clean_from, clean_to, date_str):
+        calls.append((clean_from, clean_to, date_str))
+        return 0.012
+
+    monkeypatch.setattr(currency_service, "_request_fx_rate", fake_request)
+
+    first = await currency_service.get_historical_fx_rate("INR", "USD", date(2025, 3, 3))
+    second = await currency_service.get_historical_fx_rate("inr", "usd", date(2025, 3, 3))
+
+    assert first == second == 0.012
+    assert len(calls) == 1
+    assert currency_service.get_fx_service_status()["rateCache"]["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_lookup_fetches_only_missing_targets_in_one_call(monkeypatch, fresh_breaker):
+    calls = []
+
+    async def fake_bulk(clean_from, clean_tos, date_str):
+        calls.append((clean_from, list(clean_tos), date_str))
+        return {to: rate for to, rate in {"INR": 90.1, "GBP": 0.85}.items() if to in clean_tos}
+
+    monkeypatch.setattr(currency_service, "_request_fx_rates", fake_bulk)
+    currency_service.store_rate("EUR", "USD", "2025-03-03", 1.08)
+
+    rates = await currency_service.get_historical_fx_rates("eur", ["USD", "inr", "GBP", "EUR", "JPY"], date(2025, 3, 3))
+
+    assert rates == {"USD": 1.08, "INR": 90.1, "GBP": 0.85, "EUR": 1.0}
+    assert calls == [("EUR", ["INR", "GBP", "JPY"], "2025-03-03")]
+    assert currency_service.get_cached_rate("EUR", "INR", "2025-03-03") == 90.1
+
+
+def test_todays_rates_use_the_expiring_store():
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    currency_service.store_rate("USD", "INR", today, 83.0)
+    currency_service.store_rate("USD", "INR", "2020-01-02", 71.0)
+
+    assert currency_service._recent_rate_cache.get(("USD", "INR", today)) == 83.0
+    assert currency_service._rate_cache.get(("USD", "INR", "2020-01-02")) == 71.0
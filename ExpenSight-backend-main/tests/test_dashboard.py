@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from app.dependencies.deps import get_current_user, conditional_user_data
+from app.repositories.memory import memory_repositories
+from app.repositories.registry import use_repositories
+
+client = TestClient(app)
+
+VALID_USER_ID = 123
+
+
+def override_get_current_user():
+    mock_user = MagicMock()
+    mock_user.id = VALID_USER_ID
+    return mock_user
+
+
+@pytest.fixture
+def repos():
+    with use_repositories(memory_repositories()) as repositories:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+        app.dependency_overrides[conditional_user_data] = lambda: {}
+        yield repositories
+        app.dependency_overrides = {}
+
+
+def add_expense(repos, amount, currency, category_key, date, user_id=VALID_USER_ID):
+    return asyncio.run(repos.expenses.create({
+        'amount': amount, 'currency': currency, 'category': category_key, 'categoryKey': category_key,
+        'date': date, 'userId': user_id,
+    }))
+
+
+def test_category_breakdown_groups_by_canonical_key(repos):
+    """Scenario: ✅ One grouped query -> per-category totals, largest first, within the date range"""
+    for amount in (400.0, 500.5, 300.0):
+        add_expense(repos, amount, 'INR', 'food', datetime(2025, 1, 10))
+    add_expense(repos, 20.0, 'USD', 'food', datetime(2025, 1, 31, 18))  # end date is inclusive
+    add_expense(repos, 1000.0, 'INR', 'fuel', datetime(2025, 1, 1))
+    add_expense(repos, 2000.0, 'INR', 'fuel', datetime(2025, 1, 2))
+    add_expense(repos, 999.0, 'INR', 'fuel', datetime(2025, 2, 1))  # outside the range
+    add_expense(repos, 999.0, 'INR', 'food', datetime(2025, 1, 5), user_id=VALID_USER_ID + 1)
+
+    response = client.get("/v1/dashboard/categories", params={"start_date": "2025-01-01", "end_date": "2025-01-31"})
+
+    assert response.status_code == 200
+    assert response.json() == {"data": [
+        {"key": "fuel", "label": "Fuel", "count": 2, "total": 3000.0, "totalsByCurrency": {"INR": 3000.0}},
+        {"key": "food", "label": "Food & Dining", "count": 4, "total": 1220.5,
+         "totalsByCurrency": {"INR": 1200.5, "USD": 20.0}},
+    ]}
+
+
+def test_category_breakdown_without_expenses_is_empty(repos):
+    """Scenario: ✅ No expenses -> empty list"""
+    response = client.get("/v1/dashboard/categories")
+
+    assert response.status_code == 200
+    assert response.json() == {"data": []}
+
+
+def test_stats_count_reconciled_expenses_once(repos):
+    """Scenario: ✅ An expense reconciled twice counts once as converted"""
+    first = add_expense(repos, 10.0, 'USD', 'food', datetime(2025, 1, 10))
+    add_expense(repos, 20.0, 'USD', 'food', datetime(2025, 1, 11))
+    for rate in (83.0, 84.0):
+        asyncio.run(repos.reconciles.create({
+            'expenseId': first.id, 'userId': VALID_USER_ID, 'convertedAmount': 10 * rate,
+            'baseCurrency': 'USD', 'conversionCurrency': 'INR', 'fxRate': rate,
+        }))
+
+    response = client.get("/v1/dashboard/stats")
+
+    assert response.status_code == 200
+    assert response.json() == {"totalReceipts": 2, "converted": 1, "pending": 1, "thisMonth": 2}
+
+
+def this_month(day):
+    today = datetime.now()
+    return datetime(today.year, today.month, day)
+
+
+def test_trends_fill_six_months_from_one_grouped_query(repos):
+    """Scenario: ✅ One monthly_totals call -> six months, oldest first, empty months as 0"""
+    add_expense(repos, 100.0, 'INR', 'food', this_month(1))
+    add_expense(repos, 50.5, 'INR', 'fuel', this_month(2))
+    add_expense(repos, 999.0, 'INR', 'food', datetime(2000, 1, 1))  # outside the window
+
+    with patch.object(repos.expenses, 'monthly_totals', wraps=repos.expenses.monthly_totals) as monthly_totals:
+        response = client.get("/v1/dashboard/trends")
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert len(data) == 6
+    assert data[-1] == {"name": this_month(1).strftime('%b'), "total": 150.5}
+    assert [point["total"] for point in data[:-1]] == [0.0] * 5
+    assert monthly_totals.call_count == 1
+
+
+def test_bundle_combines_profile_stats_trends_and_recent_expenses(repos):
+    """Scenario: ✅ One request -> profile, stats, trends and the newest `recent_limit` expenses"""
+    user = SimpleNamespace(id=VALID_USER_ID, email='a@example.com', baseCurrency='INR', created_at=datetime(2025, 1, 1))
+    app.dependency_overrides[get_current_user] = lambda: user
+    expenses = [add_expense(repos, 10.0 * i, 'INR', 'food', this_month(1)) for i in range(1, 4)]
+
+    response = client.get("/v1/dashboard/bundle", params={"recent_limit": 2})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["profile"] == {"id": VALID_USER_ID, "email": 'a@example.com', "baseCurrency": 'INR', "created_at": '2025-01-01T00:00:00'}
+    assert body["stats"] == {"totalReceipts": 3, "converted": 0, "pending": 3, "thisMonth": 3}
+    assert body["trends"][-1]["total"] == 60.0
+    assert [e["id"] for e in body["recentExpenses"]] == [expenses[2].id, expenses[1].id]
+    assert body["recentExpenses"][0]["receipt"] is None
+
+
+def test_bundle_rejects_an_out_of_range_limit(repos):
+    """Scenario: ❌ recent_limit above the maximum -> 422"""
+    response = client.get("/v1/dashboard/bundle", params={"recent_limit": 1000})
+
+    assert response.status_code == 422
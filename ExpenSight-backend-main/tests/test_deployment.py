@@ -0,0 +1,166 @@
+import signal
+import time
+import pytest
+import contextvars
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import db
+from fastapi.testclient import TestClient
+from uvicorn import Config
+from main import app
+from app.api.v1 import monitoring
+from app.services import server_state
+from app.services.server_state import DrainingServer, InFlightTracker
+
+
+def test_datasource_url_carries_pool_settings():
+    """Scenario: ✅ Pool size and timeout are pushed into the Prisma URL"""
+    url = db.build_datasource_url("postgresql://u:p@localhost:5432/app?schema=public&connection_limit=99", 5, 10)
+
+    assert url == "postgresql://u:p@localhost:5432/app?schema=public&connection_limit=5&pool_timeout=10"
+
+
+def test_connection_budget_is_split_across_workers(monkeypatch):
+    """Scenario: ✅ DB_MAX_CONNECTIONS is shared evenly by WEB_CONCURRENCY workers"""
+    monkeypatch.delenv("DB_CONNECTION_LIMIT", raising=False)
+    monkeypatch.setenv("DB_MAX_CONNECTIONS", "40")
+    monkeypatch.setattr(db, "WEB_CONCURRENCY", 4)
+
+    assert db.worker_connection_limit() == 10
+
+    monkeypatch.setenv("DB_CONNECTION_LIMIT", "3")
+    assert db.worker_connection_limit() == 3
+
+
+@pytest.fixture
+def fresh_tracker(monkeypatch):
+    state = InFlightTracker()
+    monkeypatch.setattr(server_state, "tracker", state)
+    monkeypatch.setattr(monitoring, "tracker", state)
+    return state
+
+
+def test_sigterm_reports_draining_before_the_listener_closes(fresh_tracker):
+    """Scenario: ✅ SIGTERM -> readiness flips at once, uvicorn is told to exit only after the grace period"""
+    server = DrainingServer(Config(app=app), grace_seconds=0.05)
+
+    server.handle_exit(signal.SIGTERM, None)
+
+    assert fresh_tracker.draining is True
+    assert server.should_exit is False
+    time.sleep(0.2)
+    assert server.should_exit is True
+
+
+def test_second_signal_skips_the_grace_period(fresh_tracker):
+    """Scenario: ✅ Second SIGTERM during the grace period -> exit immediately"""
+    server = DrainingServer(Config(app=app), grace_seconds=60)
+
+    server.handle_exit(signal.SIGTERM, None)
+    server.handle_exit(signal.SIGTERM, None)
+
+    assert server.should_exit is True
+
+
+def test_draining_worker_is_not_ready(fresh_tracker):
+    """Scenario: ✅ Draining -> /v1/monitoring/ready answers 503 while the worker still serves requests"""
+    fresh_tracker.start_draining()
+
+    response = TestClient(app).get("/v1/monitoring/ready")
+
+    assert response.status_code == 503
+    assert response.json()["draining"] is True
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    read_client = MagicMock()
+    read_client.is_connected.return_value = True
+    monkeypatch.setattr(db, "read_prisma", read_client)
+    monkeypatch.setattr(db, "READ_YOUR_WRITES_SECONDS", 5)
+    monkeypatch.setattr(db, "_pinned_until", {})
+    return read_client
+
+
+def test_reads_go_to_the_replica(replica):
+    """Scenario: ✅ Replica configured and connected -> read-only queries use it"""
+    assert db.get_read_client(7) is replica
+
+
+def test_reads_fall_back_to_the_primary(replica, monkeypatch):
+    """Scenario: ❌ Replica down or not configured -> reads use the primary"""
+    replica.is_connected.return_value = False
+    assert db.get_read_client(7) is db.prisma
+
+    monkeypatch.setattr(db, "read_prisma", None)
+    assert db.get_read_client(7) is db.prisma
+
+
+@pytest.fixture
+def primary(monkeypatch):
+    primary_client = MagicMock()
+    primary_client.users.update_many = AsyncMock(return_value=1)
+    monkeypatch.setattr(db, "prisma", primary_client)
+    return primary_client
+
+
+@pytest.mark.asyncio
+async def test_writer_is_pinned_to_the_primary(replica, primary, monkeypatch):
+    """Scenario: ✅ After a write the user reads from the primary until the window passes"""
+    clock = [100.0]
+    monkeypatch.setattr(db.time, "monotonic", lambda: clock[0])
+
+    await db.mark_user_write(7)
+    assert db.get_read_client(7) is primary
+    assert db.get_read_client(8) is replica  # other users are unaffected
+
+    clock[0] += 6
+    assert db.get_read_client(7) is replica
+
+
+@pytest.mark.asyncio
+async def test_pin_is_stored_on_the_user_for_other_workers(replica, primary):
+    """Scenario: ✅ Write -> Users.readPinnedUntil set on the primary, READ_YOUR_WRITES_SECONDS ahead"""
+    await db.mark_user_write(7)
+
+    kwargs = primary.users.update_many.await_args.kwargs
+    assert kwargs["where"] == {"id": 7}
+    remaining = kwargs["data"]["readPinnedUntil"] - datetime.now(timezone.utc)
+    assert timedelta(seconds=4) < remaining <= timedelta(seconds=5)
+
+
+def test_pin_set_by_another_worker_is_honoured(replica, primary):
+    """Scenario: ✅ Request loads a user whose pin is still active -> that request reads from the primary"""
+    def handle_request(pinned_until):
+        db.note_read_pin(SimpleNamespace(id=7, readPinnedUntil=pinned_until))
+        return db.get_read_client(7), db.get_read_client(8)
+
+    now = datetime.now(timezone.utc)
+    assert contextvars.copy_context().run(handle_request, now + timedelta(seconds=3)) == (primary, replica)
+    assert contextvars.copy_context().run(handle_request, now - timedelta(seconds=1)) == (replica, replica)
+    assert contextvars.copy_context().run(handle_request, None) == (replica, replica)
+
+
+@pytest.mark.asyncio
+async def test_pinning_can_be_disabled(replica, primary, monkeypatch):
+    """Scenario: ✅ READ_YOUR_WRITES_SECONDS=0 -> writes never pin reads"""
+    monkeypatch.setattr(db, "READ_YOUR_WRITES_SECONDS", 0)
+    await db.mark_user_write(7)
+    assert db.get_read_client(7) is replica
+    primary.users.update_many.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_failed_pin_store_still_pins_this_worker(replica, primary):
+    """Scenario: ❌ Storing the pin fails -> logged, and this worker still reads the user's data from the primary"""
+    primary.users.update_many.side_effect = RuntimeError("connection lost")
+
+    await db.mark_user_write(7)
+
+    assert db.get_read_client(7) is primary
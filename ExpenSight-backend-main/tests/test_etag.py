@@ -0,0 +1,74 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.dependencies.deps import get_current_user, conditional_user_data
+from app.services.etag import make_etag, etag_matches
+
+app = FastAPI()
+calls = {"endpoint": 0}
+
+@app.get("/data")
+async def read_data(cache_headers=Depends(conditional_user_data)):
+    calls["endpoint"] += 1
+    return {"value": 42}
+
+
+def override_get_current_user():
+    mock_user = MagicMock()
+    mock_user.id = 7
+    mock_user.baseCurrency = "INR"
+    return mock_user
+
+app.dependency_overrides[get_current_user] = override_get_current_user
+client = TestClient(app)
+
+
+@pytest.fixture
+def data_version():
+    with patch('app.dependencies.deps.get_user_data_version', new_callable=AsyncMock) as mock_version:
+        mock_version.return_value = "3|2025-07-19T10:00:00+00:00|1|...|0|None"
+        calls["endpoint"] = 0
+        yield mock_version
+
+
+def test_etag_matching_rules():
+    etag = make_etag("/v1/expense/", "", 7, "v1")
+    assert etag.startswith('W/"')
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag.removeprefix("W/"), etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
+
+
+def test_unchanged_data_returns_304_without_running_the_endpoint(data_version):
+    """Scenario: ✅ If-None-Match matches -> 304, endpoint body never runs"""
+    first = client.get("/data")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    second = client.get("/data", headers={"If-None-Match": etag})
+
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    assert calls["endpoint"] == 1
+
+
+def test_changed_data_returns_fresh_body(data_version):
+    """Scenario: ✅ A write bumps the version -> new ETag and 200"""
+    etag = client.get("/data").headers["etag"]
+    data_version.return_value = "4|2025-07-19T11:00:00+00:00|1|...|0|None"
+
+    response = client.get("/data", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json() == {"value": 42}
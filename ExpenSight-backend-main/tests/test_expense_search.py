@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from datetime import date, datetime
+from fastapi.testclient import TestClient
+from fastapi import HTTPException
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from app.dependencies.deps import get_current_user, conditional_user_data
+from app.controllers.expense_controller import build_search_where
+from app.repositories.memory import memory_repositories
+from app.repositories.prisma_repository import PrismaExpenseRepository
+from app.repositories.registry import use_repositories
+
+client = TestClient(app)
+
+VALID_USER_ID = 123
+
+
+def override_get_current_user():
+    mock_user = MagicMock()
+    mock_user.id = VALID_USER_ID
+    return mock_user
+
+
+@pytest.fixture
+def repos():
+    with use_repositories(memory_repositories()) as repositories:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+        app.dependency_overrides[conditional_user_data] = lambda: {}
+        yield repositories
+        app.dependency_overrides = {}
+
+
+@pytest.fixture
+def read_client():
+    with patch('app.repositories.prisma_repository.get_read_client') as mock_get_read_client:
+        mock_prisma_client = mock_get_read_client.return_value
+        mock_prisma_client.expense.count = AsyncMock(return_value=0)
+        mock_prisma_client.expense.find_many = AsyncMock(return_value=[])
+        yield mock_prisma_client
+
+
+def add_expense(repos, amount, category, date, user_id=VALID_USER_ID):
+    return asyncio.run(repos.expenses.create({
+        'amount': amount, 'currency': 'INR', 'category': category, 'date': date, 'userId': user_id,
+    }))
+
+
+def test_where_clause_combines_all_filters():
+    """Scenario: ✅ Every filter -> one indexed where clause, end date inclusive"""
+    where = build_search_where(
+        VALID_USER_ID, q=" groc ", min_amount=10, max_amount=250.5,
+        start_date=date(2025, 1, 1), end_date=date(2025, 1, 31), currency="usd", status="PENDING",
+    )
+
+    assert where == {
+        'userId': VALID_USER_ID,
+        'category': {'contains': 'groc', 'mode': 'insensitive'},
+        'amount': {'gte': 10, 'lte': 250.5},
+        'date': {'gte': datetime(2025, 1, 1), 'lt': datetime(2025, 2, 1)},
+        'currency': 'USD',
+        'status': 'PENDING',
+    }
+
+
+def test_where_clause_without_filters_is_user_scoped():
+    """Scenario: ✅ No filters -> only the user's own expenses"""
+    assert build_search_where(VALID_USER_ID, q="   ") == {'userId': VALID_USER_ID}
+
+
+def test_inverted_ranges_are_rejected():
+    """Scenario: ❌ min > max or start > end -> 400"""
+    with pytest.raises(HTTPException) as exc:
+        build_search_where(VALID_USER_ID, min_amount=50, max_amount=5)
+    assert exc.value.status_code == 400
+    with pytest.raises(HTTPException):
+        build_search_where(VALID_USER_ID, start_date=date(2025, 2, 1), end_date=date(2025, 1, 1))
+
+
+def test_search_paginates_and_sorts(repos):
+    """Scenario: ✅ Page 2 of 2 by amount asc -> matching expenses only, ties broken by id"""
+    for i, amount in enumerate([30.0, 10.0, 20.0, 10.0, 50.0]):
+        add_expense(repos, amount, "Food & Dining", datetime(2025, 1, i + 1))
+    add_expense(repos, 1.0, "Fuel", datetime(2025, 1, 9))
+    add_expense(repos, 1.0, "food", datetime(2025, 1, 9), user_id=VALID_USER_ID + 1)
+
+    response = client.get("/v1/expense/search", params={
+        "q": "FOOD", "sort": "amount", "order": "asc", "page": 2, "page_size": 3,
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["total"], body["page"], body["pageSize"]) == (5, 2, 3)
+    assert [item["amount"] for item in body["items"]] == [30.0, 50.0]
+
+
+@pytest.mark.asyncio
+async def test_prisma_search_pushes_paging_to_the_database(read_client):
+    """Scenario: ✅ skip/take/order and the where clause go to Prisma, count and page share the filter"""
+    read_client.expense.count.return_value = 42
+    where = build_search_where(VALID_USER_ID, q="food")
+
+    items, total = await PrismaExpenseRepository().search(where, [{'amount': 'asc'}, {'id': 'asc'}], skip=20, take=10)
+
+    assert (items, total) == ([], 42)
+    kwargs = read_client.expense.find_many.call_args.kwargs
+    assert kwargs['skip'] == 20 and kwargs['take'] == 10
+    assert kwargs['order'] == [{'amount': 'asc'}, {'id': 'asc'}]
+    assert kwargs['where']['category'] == {'contains': 'food', 'mode': 'insensitive'}
+    assert read_client.expense.count.call_args.kwargs['where'] == kwargs['where']
+
+
+def test_search_rejects_unknown_sort_and_oversized_pages(repos):
+    """Scenario: ❌ Unsupported sort column or page_size > 100 -> 422"""
+    assert client.get("/v1/expense/search", params={"sort": "userId"}).status_code == 422
+    assert client.get("/v1/expense/search", params={"page_size": 1000}).status_code == 422
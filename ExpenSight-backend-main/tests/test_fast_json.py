@@ -0,0 +1,135 @@
+from datetime import datetime, timezone, timedelta
+from enum import Enum
+from typing import List, Optional
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.schemas.expense_schema import ExpenseOut
+from app.schemas.reconcile_schema import ReconciliationHistoryResponse
+from app.services.fast_json import expense_list_response, reconcile_history_response
+
+
+# --- Stand-ins shaped like the generated Prisma models ---
+
+class ReconciliationStatus(str, Enum):
+    PENDING = "PENDING"
+    RECONCILED = "RECONCILED"
+
+class Receipts(BaseModel):
+    id: int
+    filename: str
+    uploadedAt: datetime
+    userId: int
+    expenseId: Optional[int] = None
+    contentHash: Optional[str] = None
+    contentType: Optional[str] = None
+    size: Optional[int] = None
+    hasThumbnail: bool = False
+
+class Expense(BaseModel):
+    id: int
+    amount: float
+    currency: str
+    category: str
+    date: datetime
+    userId: int
+    createdAt: datetime
+    updatedAt: datetime
+    status: ReconciliationStatus
+    convertedAmount: Optional[float] = None
+    conversionCurrency: Optional[str] = None
+    receipt: Optional[Receipts] = None
+
+class Reconcile(BaseModel):
+    id: int
+    convertedAmount: float
+    baseCurrency: str
+    conversionCurrency: str
+    fxRate: float
+    createdAt: datetime
+    expenseId: int
+    userId: int
+    expense: Optional[Expense] = None
+
+
+UTC = timezone.utc
+
+def make_expenses():
+    stamp = datetime(2025, 7, 19, 10, 20, 30, 123000, tzinfo=UTC)
+    return [
+        Expense(
+            id=1, amount=150.75, currency="USD", category="Office Supplies", date=datetime(2025, 7, 19, tzinfo=UTC),
+            userId=7, createdAt=stamp, updatedAt=stamp, status=ReconciliationStatus.RECONCILED,
+            convertedAmount=12577.07, conversionCurrency="INR",
+            receipt=Receipts(
+                id=3, filename="café ☕.png", uploadedAt=stamp, userId=7, expenseId=1,
+                contentHash="ab" * 32, contentType="image/png", size=48213, hasThumbnail=True,
+            ),
+        ),
+        Expense(
+            id=2, amount=1e16, currency="IDR", category="Food \"quoted\"\n", date=datetime(2025, 1, 1, 5, 30, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+            userId=7, createdAt=stamp, updatedAt=stamp, status=ReconciliationStatus.PENDING,
+        ),
+        Expense(
+            id=3, amount=0.5, currency="EUR", category="Fuel", date=datetime(2024, 12, 31, 23, 59, 59, 5, tzinfo=UTC),
+            userId=7, createdAt=stamp, updatedAt=stamp, status=ReconciliationStatus.PENDING,
+        ),
+    ]
+
+def make_history():
+    expenses = make_expenses()
+    return [
+        Reconcile(id=10, convertedAmount=12577.07, baseCurrency="USD", conversionCurrency="INR", fxRate=83.43,
+                  createdAt=datetime(2025, 7, 20, tzinfo=UTC), expenseId=1, userId=7, expense=expenses[0]),
+        Reconcile(id=11, convertedAmount=614.0, baseCurrency="IDR", conversionCurrency="USD", fxRate=6.14e-05,
+                  createdAt=datetime(2025, 7, 21, 8, 0, 0, 1, tzinfo=UTC), expenseId=2, userId=7, expense=expenses[1]),
+    ]
+
+
+app = FastAPI()
+
+@app.get("/validated/expenses", response_model=List[ExpenseOut])
+async def validated_expenses():
+    return make_expenses()
+
+@app.get("/fast/expenses", response_model=List[ExpenseOut])
+async def fast_expenses():
+    return expense_list_response(make_expenses())
+
+@app.get("/validated/history", response_model=ReconciliationHistoryResponse)
+async def validated_history():
+    return {"message": "History fetched successfully", "reconciliation_history": make_history()}
+
+@app.get("/fast/history", response_model=ReconciliationHistoryResponse)
+async def fast_history():
+    return reconcile_history_response("History fetched successfully", make_history())
+
+client = TestClient(app)
+
+
+def test_fast_expense_list_is_byte_identical():
+    """Scenario: ✅ Fast path == response_model path, byte for byte"""
+    validated = client.get("/validated/expenses")
+    fast = client.get("/fast/expenses")
+
+    assert fast.status_code == 200
+    assert fast.headers["content-type"] == validated.headers["content-type"]
+    assert fast.content == validated.content
+
+
+def test_fast_reconcile_history_is_byte_identical():
+    """Scenario: ✅ Fast path == response_model path for nested history rows"""
+    validated = client.get("/validated/history")
+    fast = client.get("/fast/history")
+
+    assert fast.content == validated.content
+
+
+def test_empty_list():
+    """Scenario: ✅ No rows"""
+    assert expense_list_response([]).body == b"[]"
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi import HTTPException
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import currency_service
+from app.services.fx_prefetch import FXPrefetcher
+from app.services.rate_limiter import MemoryBucketStore
+
+
+@pytest.fixture(autouse=True)
+def empty_rate_cache():
+    currency_service.clear_rate_cache()
+    yield
+    currency_service.clear_rate_cache()
+
+
+def pending(*triples):
+    return [{"from_currency": f, "to_currency": t, "on_date": d} for f, t, d in triples]
+
+
+@pytest.mark.asyncio
+async def test_pass_groups_targets_per_source_and_date():
+    """Scenario: ✅ PENDING triples -> one bulk lookup per (from, date), full coverage"""
+    calls = []
+
+    async def fake_bulk(from_currency, targets, on_date):
+        calls.append((from_currency, sorted(targets), on_date.isoformat()))
+        # The real bulk lookup stores what it fetches.
+        for to in targets:
+            currency_service.store_rate(from_currency, to, on_date.isoformat(), 1.5)
+        return {to: 1.5 for to in targets}
+
+    rows = pending(("USD", "INR", "2025-07-01"), ("USD", "EUR", "2025-07-01"), ("GBP", "INR", "2025-07-02"))
+    with patch('app.services.fx_prefetch.prisma') as mock_prisma, \
+            patch.object(currency_service, 'get_historical_fx_rates', side_effect=fake_bulk):
+        mock_prisma.query_raw = AsyncMock(return_value=rows)
+        stats = await FXPrefetcher(enabled=False, max_triples=100).run_once()
+
+    assert mock_prisma.query_raw.await_args.args[1] == 100
+    assert sorted(calls) == [("GBP", ["INR"], "2025-07-02"), ("USD", ["EUR", "INR"], "2025-07-01")]
+    assert stats["pendingTriples"] == 3
+    assert stats["coverage"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_already_stored_rates_are_not_refetched():
+    """Scenario: ✅ Rate already in the store -> no Frankfurter call"""
+    currency_service.store_rate("USD", "INR", "2025-07-01", 83.1)
+
+    with patch('app.services.fx_prefetch.prisma') as mock_prisma, \
+            patch.object(currency_service, 'get_historical_fx_rates', new_callable=AsyncMock) as bulk:
+        mock_prisma.query_raw = AsyncMock(return_value=pending(("USD", "INR", "2025-07-01")))
+        stats = await FXPrefetcher(enabled=False).run_once()
+
+    bulk.assert_not_called()
+    assert stats["coveredTriples"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pass_stops_when_fx_service_is_down():
+    """Scenario: ❌ Frankfurter unavailable -> remaining lookups skipped, error reported"""
+    rows = pending(*[("USD", "INR", f"2025-07-{day:02d}") for day in range(1, 11)])
+
+    with patch('app.services.fx_prefetch.prisma') as mock_prisma, \
+            patch.object(currency_service, 'get_historical_fx_rates', new_callable=AsyncMock) as bulk:
+        mock_prisma.query_raw = AsyncMock(return_value=rows)
+        bulk.side_effect = HTTPException(status_code=503, detail="down")
+        stats = await FXPrefetcher(enabled=False, concurrency=1).run_once()
+
+    assert bulk.await_count == 1
+    assert stats["coverage"] == 0.0
+    assert "unavailable" in stats["lastError"]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_runs_periodically_and_stops():
+    """Scenario: ✅ start() -> repeated passes until stop()"""
+    prefetcher = FXPrefetcher(interval_seconds=0.01, initial_delay_seconds=0, enabled=True, pass_store=MemoryBucketStore())
+    prefetcher.run_once = AsyncMock(return_value={})
+
+    prefetcher.start()
+    await asyncio.sleep(0.05)
+    await prefetcher.stop()
+
+    assert prefetcher.run_once.await_count >= 2
+    assert prefetcher.stats()["running"] is False
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_one_worker_runs_each_pass():
+    """Scenario: ✅ Three workers share the pass bucket -> one pass per interval, the others skip"""
+    clock = FakeClock()
+    shared = MemoryBucketStore(clock=clock)
+    workers = [FXPrefetcher(interval_seconds=300, enabled=False, pass_store=shared) for _ in range(3)]
+
+    first = [await worker._elected() for worker in workers]
+    clock.now += 100
+    too_soon = [await worker._elected() for worker in workers]
+    clock.now += 200
+    next_interval = [await worker._elected() for worker in reversed(workers)]
+
+    assert first == [True, False, False]
+    assert too_soon == [False, False, False]
+    assert next_interval == [True, False, False]
+
+
+@pytest.mark.asyncio
+async def test_unreachable_election_runs_the_pass():
+    """Scenario: ✅ rate_limit_buckets unreachable -> the worker prefetches anyway"""
+    store = AsyncMock()
+    store.take.side_effect = RuntimeError("connection refused")
+
+    assert await FXPrefetcher(enabled=False, pass_store=store)._elected() is True
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from app.dependencies.deps import get_current_user
+from app.services import idempotency
+from app.services.idempotency import run_idempotent, request_fingerprint
+
+client = TestClient(app)
+
+VALID_USER_ID = 123
+
+
+@pytest.mark.asyncio
+async def test_without_a_key_the_call_just_runs(key_table):
+    """Scenario: ✅ No Idempotency-Key -> plain result, nothing stored"""
+    call = AsyncMock(return_value={"id": 1})
+
+    assert await run_idempotent(VALID_USER_ID, "POST /x", None, "fp", call) == {"id": 1}
+    assert key_table.rows == {}
+
+
+@pytest.mark.asyncio
+async def test_completed_key_is_replayed_without_redoing_work(key_table):
+    """Scenario: ✅ Same key twice -> one execution, second answer replayed from the table"""
+    call = AsyncMock(return_value={"id": 1, "amount": 10.0})
+
+    first = await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", call)
+    second = await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", call)
+
+    call.assert_awaited_once()
+    assert first.body == second.body
+    assert "Idempotent-Replayed" not in first.headers
+    assert second.headers["Idempotent-Replayed"] == "true"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_waits_for_the_first(key_table):
+    """Scenario: ✅ Retry arrives while the first request is still running -> it waits, then replays"""
+    calls = 0
+
+    async def slow_ocr():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"message": "Expense and receipt created successfully"}
+
+    first, second = await asyncio.gather(
+        run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", slow_ocr),
+        run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", slow_ocr),
+    )
+
+    assert calls == 1
+    assert first.body == second.body
+    assert second.headers["Idempotent-Replayed"] == "true"
+
+
+@pytest.mark.asyncio
+async def test_key_reused_for_another_request_is_rejected(key_table):
+    """Scenario: ❌ Same key, different body -> 422"""
+    await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp-1", AsyncMock(return_value={}))
+
+    with pytest.raises(HTTPException) as exc:
+        await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp-2", AsyncMock(return_value={}))
+    assert exc.value.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_failed_request_releases_the_key(key_table):
+    """Scenario: ❌ First attempt fails (e.g. FX service down) -> the retry runs again"""
+    outage = HTTPException(status_code=503, detail="The external FX service timed out.")
+    call = AsyncMock(side_effect=[outage, {"id": 7}])
+
+    with pytest.raises(HTTPException):
+        await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", call)
+    retry = await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", call)
+
+    assert retry.status_code == 200
+    assert call.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_key_runs_again(key_table):
+    """Scenario: ✅ Stored response past its TTL -> executed afresh"""
+    call = AsyncMock(return_value={"id": 1})
+    await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", call)
+    key_table.rows[(VALID_USER_ID, "POST /x", "abc")].expiresAt = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", call)
+
+    assert call.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_request_outliving_its_lock_leaves_the_takeover_row_alone(key_table):
+    """Scenario: ✅ Key taken over by a retry mid-run -> the original neither overwrites nor deletes the retry's row"""
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return {"id": 1}
+
+    original = asyncio.ensure_future(run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", slow))
+    await asyncio.sleep(0)
+    key_table.rows[(VALID_USER_ID, "POST /x", "abc")].createdAt -= timedelta(seconds=idempotency.IDEMPOTENCY_LOCK_SECONDS + 1)
+    retry = await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", AsyncMock(return_value={"id": 2}))
+
+    release.set()
+    await original
+
+    row = key_table.rows[(VALID_USER_ID, "POST /x", "abc")]
+    assert row.status == "COMPLETED"
+    assert json.loads(row.responseBody) == json.loads(retry.body) == {"id": 2}
+
+
+@pytest.mark.asyncio
+async def test_unserializable_response_keeps_the_key(key_table):
+    """Scenario: ❌ Write succeeded but its response cannot be serialized -> 500, and a retry replays instead of writing again"""
+    call = AsyncMock(return_value={"id": 1})
+
+    def broken_serialize(result):
+        raise ValueError("not JSON")
+
+    with pytest.raises(HTTPException) as error:
+        await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", call, serialize=broken_serialize)
+    retry = await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", call)
+
+    assert error.value.status_code == 500
+    call.assert_awaited_once()
+    assert retry.status_code == 500
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+
+@pytest.mark.asyncio
+async def test_failed_store_does_not_release_the_key(key_table):
+    """Scenario: ❌ Response cannot be stored -> the client still gets it, and the key is not released"""
+    call = AsyncMock(return_value={"id": 1})
+
+    with patch.object(key_table, 'update_many', AsyncMock(side_effect=RuntimeError("connection lost"))):
+        response = await run_idempotent(VALID_USER_ID, "POST /x", "abc", "fp", call)
+
+    assert response.status_code == 200
+    assert key_table.rows[(VALID_USER_ID, "POST /x", "abc")].status == "IN_PROGRESS"
+
+
+def test_fingerprint_ignores_key_order():
+    """Scenario: ✅ Same fields in another order -> same fingerprint"""
+    assert request_fingerprint({"amount": 1, "currency": "INR"}) == request_fingerprint({"currency": "INR", "amount": 1})
+    assert request_fingerprint({"amount": 1}) != request_fingerprint({"amount": 2})
+
+
+def test_retried_manual_expense_is_created_once(key_table):
+    """Scenario: ✅ POST /v1/expense/ retried with the same Idempotency-Key -> one expense"""
+    user = MagicMock()
+    user.id = VALID_USER_ID
+    app.dependency_overrides[get_current_user] = lambda: user
+    created = SimpleNamespace(
+        id=5, amount=12.5, currency="INR", category="Food", date=datetime(2025, 6, 1),
+        status="PENDING", convertedAmount=None, conversionCurrency=None, receipt=None,
+    )
+    body = {"amount": 12.5, "currency": "INR", "category": "Food", "date": "2025-06-01"}
+    try:
+        with patch('app.api.v1.expense.add_expense_manually', new_callable=AsyncMock, return_value=created) as add:
+            first = client.post("/v1/expense/", json=body, headers={"Idempotency-Key": "k1"})
+            second = client.post("/v1/expense/", json=body, headers={"Idempotency-Key": "k1"})
+    finally:
+        app.dependency_overrides = {}
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert first.json()["id"] == 5
+    assert second.headers["Idempotent-Replayed"] == "true"
+    add.assert_awaited_once()
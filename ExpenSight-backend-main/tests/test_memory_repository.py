@@ -0,0 +1,107 @@
+import pytest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from prisma.errors import UniqueViolationError
+from app.repositories.memory import matches, memory_repositories
+from app.repositories.registry import repositories, use_repositories
+
+UTC = timezone.utc
+
+
+async def seed(repos, user_id=1):
+    rows = [
+        (120.0, 'USD', 'Groceries', datetime(2025, 3, 5)),
+        (45.5, 'INR', 'Fuel', datetime(2025, 3, 1)),
+        (300.0, 'USD', 'groceries run', datetime(2025, 2, 20)),
+    ]
+    return [
+        await repos.expenses.create({'amount': amount, 'currency': currency, 'category': category, 'date': day, 'userId': user_id})
+        for amount, currency, category, day in rows
+    ]
+
+
+def test_filters_follow_prisma_semantics():
+    """Scenario: ✅ eq / in / ranges / case-insensitive contains, with naive datetimes taken as UTC"""
+    record = SimpleNamespace(amount=50.0, currency='USD', category='Office Supplies', date=datetime(2025, 1, 10, tzinfo=UTC))
+
+    assert matches(record, {'currency': 'USD', 'amount': {'gte': 50, 'lt': 60}})
+    assert matches(record, {'currency': {'in': ['EUR', 'USD']}})
+    assert matches(record, {'category': {'contains': 'supp', 'mode': 'insensitive'}})
+    assert not matches(record, {'category': {'contains': 'supp'}})
+    assert matches(record, {'date': {'gte': datetime(2025, 1, 10), 'lte': datetime(2025, 1, 10)}})
+    assert not matches(record, {'amount': {'gt': 50}})
+
+    with pytest.raises(ValueError):
+        matches(record, {'amount': {'not': 1}})
+
+
+@pytest.mark.asyncio
+async def test_search_orders_pages_and_counts():
+    """Scenario: ✅ Sort by amount with id tie-break -> stable pages and the full match count"""
+    repos = memory_repositories()
+    await seed(repos)
+    await seed(repos, user_id=2)
+
+    page, total = await repos.expenses.search(
+        {'userId': 1, 'category': {'contains': 'grocer', 'mode': 'insensitive'}},
+        [{'amount': 'desc'}, {'id': 'desc'}], skip=0, take=1,
+    )
+
+    assert total == 2
+    assert [e.amount for e in page] == [300.0]
+    assert page[0].receipt is None
+
+
+@pytest.mark.asyncio
+async def test_lists_are_newest_first_with_receipts():
+    """Scenario: ✅ list_for_user -> newest created first, receipts attached"""
+    repos = memory_repositories()
+    first, second, third = await seed(repos)
+    await repos.receipts.create({'filename': 'a.jpg', 'userId': 1, 'expenseId': first.id})
+
+    listed = await repos.expenses.list_for_user({'userId': 1})
+
+    assert [e.id for e in listed] == [third.id, second.id, first.id]
+    assert listed[-1].receipt.filename == 'a.jpg'
+    assert await repos.expenses.count({'userId': 1, 'currency': 'USD'}) == 2
+
+
+@pytest.mark.asyncio
+async def test_returned_records_are_copies():
+    """Scenario: ✅ Mutating a returned record does not change the store"""
+    repos = memory_repositories()
+    expense, *_ = await seed(repos)
+
+    expense.amount = 0.0
+
+    assert (await repos.expenses.find_by_id(expense.id)).amount == 120.0
+
+
+@pytest.mark.asyncio
+async def test_unique_constraints_raise_like_prisma():
+    """Scenario: ❌ Duplicate email or second receipt for an expense -> UniqueViolationError"""
+    repos = memory_repositories()
+    await repos.users.create('a@example.com', 'hash', 'INR')
+    expense, *_ = await seed(repos)
+    await repos.receipts.create({'filename': 'a.jpg', 'userId': 1, 'expenseId': expense.id})
+
+    with pytest.raises(UniqueViolationError):
+        await repos.users.create('a@example.com', 'hash', 'USD')
+    with pytest.raises(UniqueViolationError):
+        await repos.receipts.create({'filename': 'b.jpg', 'userId': 1, 'expenseId': expense.id})
+
+
+def test_use_repositories_restores_the_previous_layer():
+    """Scenario: ✅ The override only lasts for the block"""
+    memory = memory_repositories()
+    before = repositories()
+
+    with use_repositories(memory):
+        assert repositories() is memory
+
+    assert repositories() is before
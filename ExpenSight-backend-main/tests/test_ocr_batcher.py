@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import HTTPException
+from app.services.ocr_batcher import OCRBatcher
+from app.services.ocr_dispatcher import PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+
+class FakeModel:
+    """Records calls; receipts whose data is b'bad' cannot be read."""
+
+    def __init__(self, fail_batches=False):
+        self.single_calls = []
+        self.batch_calls = []
+        self.batch_priorities = []
+        self.fail_batches = fail_batches
+
+    async def extract_single(self, blob, priority):
+        self.single_calls.append(blob["data"])
+        if blob["data"] == b"bad":
+            raise ValueError("No valid JSON object found in AI response.")
+        return {"amount": len(blob["data"]), "source": "single"}
+
+    async def extract_batch(self, blobs, priority):
+        self.batch_calls.append([b["data"] for b in blobs])
+        self.batch_priorities.append(priority)
+        if self.fail_batches == "overloaded":
+            raise HTTPException(status_code=503, detail="overloaded", headers={"Retry-After": "5"})
+        if self.fail_batches:
+            raise ValueError("No JSON array found in batched AI response.")
+        return [None if b["data"] == b"bad" else {"amount": len(b["data"]), "source": "batch"} for b in blobs]
+
+
+def blob(data):
+    return {"mime_type": "image/jpeg", "data": data}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_receipts_share_one_call():
+    """Scenario: ✅ Burst of uploads -> one multi-receipt model call"""
+    model = FakeModel()
+    batcher = OCRBatcher(model.extract_single, model.extract_batch, window_ms=20, max_size=4)
+
+    results = await asyncio.gather(*[batcher.submit(blob(b"x" * n)) for n in (1, 2, 3)])
+
+    assert [r["amount"] for r in results] == [1, 2, 3]
+    assert model.batch_calls == [[b"x", b"xx", b"xxx"]]
+    assert model.single_calls == []
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_sent_without_waiting_for_the_window():
+    """Scenario: ✅ max_size receipts -> flushed immediately, the rest starts a new batch"""
+    model = FakeModel()
+    batcher = OCRBatcher(model.extract_single, model.extract_batch, window_ms=10_000, max_size=2)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*[batcher.submit(blob(b"a")), batcher.submit(blob(b"bb"))]), timeout=1
+    )
+
+    assert [r["amount"] for r in results] == [1, 2]
+    assert len(model.batch_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_unreadable_receipt_is_isolated():
+    """Scenario: ❌ One receipt unreadable -> only it is retried alone and fails"""
+    model = FakeModel()
+    batcher = OCRBatcher(model.extract_single, model.extract_batch, window_ms=20, max_size=4)
+
+    results = await asyncio.gather(
+        batcher.submit(blob(b"ok")), batcher.submit(blob(b"bad")), batcher.submit(blob(b"fine")),
+        return_exceptions=True,
+    )
+
+    assert results[0] == {"amount": 2, "source": "batch"}
+    assert isinstance(results[1], ValueError)
+    assert results[2] == {"amount": 4, "source": "batch"}
+    assert model.single_calls == [b"bad"]
+    assert batcher.stats()["fallbacks"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_falls_back_to_single_calls():
+    """Scenario: ❌ Batched response unusable -> every receipt extracted on its own"""
+    model = FakeModel(fail_batches=True)
+    batcher = OCRBatcher(model.extract_single, model.extract_batch, window_ms=20, max_size=4)
+
+    results = await asyncio.gather(batcher.submit(blob(b"a")), batcher.submit(blob(b"bb")))
+
+    assert [r["source"] for r in results] == ["single", "single"]
+    assert sorted(model.single_calls) == [b"a", b"bb"]
+
+
+@pytest.mark.asyncio
+async def test_lone_receipt_uses_the_single_prompt():
+    """Scenario: ✅ Quiet period -> a lone receipt is not wrapped in a batch"""
+    model = FakeModel()
+    batcher = OCRBatcher(model.extract_single, model.extract_batch, window_ms=5, max_size=4)
+
+    assert (await batcher.submit(blob(b"abc")))["source"] == "single"
+    assert model.batch_calls == []
+
+
+@pytest.mark.asyncio
+async def test_batch_takes_most_urgent_priority():
+    """Scenario: ✅ Bulk and interactive receipts batched together -> dispatched as interactive"""
+    model = FakeModel()
+    batcher = OCRBatcher(model.extract_single, model.extract_batch, window_ms=20, max_size=4)
+
+    await asyncio.gather(
+        batcher.submit(blob(b"a"), PRIORITY_BULK), batcher.submit(blob(b"b"), PRIORITY_INTERACTIVE)
+    )
+
+    assert model.batch_priorities == [PRIORITY_INTERACTIVE]
+
+
+@pytest.mark.asyncio
+async def test_overloaded_provider_fails_batch_without_retries():
+    """Scenario: ❌ Provider overloaded -> every receipt gets the 503, no per-receipt retries"""
+    model = FakeModel(fail_batches="overloaded")
+    batcher = OCRBatcher(model.extract_single, model.extract_batch, window_ms=20, max_size=4)
+
+    results = await asyncio.gather(
+        batcher.submit(blob(b"a")), batcher.submit(blob(b"b")), return_exceptions=True
+    )
+
+    assert all(isinstance(r, HTTPException) and r.status_code == 503 for r in results)
+    assert model.single_calls == []
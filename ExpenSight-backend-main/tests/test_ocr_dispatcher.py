@@ -0,0 +1,184 @@
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import HTTPException
+from app.services.ocr_dispatcher import (
+    OCRDispatcher, TokenBucket, PRIORITY_BULK, PRIORITY_INTERACTIVE, parse_priority
+)
+
+
+class ProviderError(Exception):
+    """Shaped like google.api_core errors, which carry the HTTP status in `.code`."""
+
+    def __init__(self, code):
+        super().__init__(f"provider error {code}")
+        self.code = code
+
+
+def dispatcher(**overrides):
+    options = dict(
+        rate_per_second=1000, burst=1000, min_concurrency=1, max_concurrency=8,
+        initial_concurrency=1, queue_max=10, retry_after_seconds=7,
+    )
+    options.update(overrides)
+    return OCRDispatcher(**options)
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_jump_ahead_of_bulk():
+    """Scenario: ✅ Queue holds bulk and interactive calls -> interactive runs first"""
+    gate = asyncio.Event()
+    order = []
+    d = dispatcher()
+
+    async def call(name):
+        if name == "blocker":
+            await gate.wait()
+        order.append(name)
+        return name
+
+    blocker = asyncio.ensure_future(d.submit(lambda: call("blocker")))
+    await asyncio.sleep(0)
+    bulk = asyncio.ensure_future(d.submit(lambda: call("bulk"), PRIORITY_BULK))
+    await asyncio.sleep(0)
+    interactive = asyncio.ensure_future(d.submit(lambda: call("interactive"), PRIORITY_INTERACTIVE))
+    await asyncio.sleep(0)
+
+    assert d.stats()["queueDepthByPriority"] == {"interactive": 1, "bulk": 1}
+    gate.set()
+    await asyncio.gather(blocker, bulk, interactive)
+
+    assert order == ["blocker", "interactive", "bulk"]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_with_retry_after():
+    """Scenario: ❌ Queue full -> 503 with Retry-After, nothing else disturbed"""
+    gate = asyncio.Event()
+    d = dispatcher(queue_max=1)
+
+    async def slow():
+        await gate.wait()
+        return "ok"
+
+    running = asyncio.ensure_future(d.submit(slow))
+    queued = asyncio.ensure_future(d.submit(slow))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as exc:
+        await d.submit(slow)
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "7"
+    assert d.stats()["rejected"] == 1
+
+    gate.set()
+    assert await asyncio.gather(running, queued) == ["ok", "ok"]
+
+
+@pytest.mark.asyncio
+async def test_provider_429_halves_concurrency_and_returns_503():
+    """Scenario: ❌ Gemini answers 429 -> limit halves, caller gets 503 instead of a 500"""
+    d = dispatcher(initial_concurrency=8)
+
+    async def rate_limited():
+        raise ProviderError(429)
+
+    with pytest.raises(HTTPException) as exc:
+        await d.submit(rate_limited)
+
+    assert exc.value.status_code == 503
+    assert "Retry-After" in exc.value.headers
+    assert d.limit == 4
+    assert d.stats()["overloads"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_recovers_after_successes_and_respects_bounds():
+    """Scenario: ✅ AIMD -> +1 per window of successes, never above max or below min"""
+    d = dispatcher(initial_concurrency=1, max_concurrency=3)
+
+    async def ok():
+        return 1
+
+    for _ in range(20):
+        await d.submit(ok)
+    assert d.limit == 3
+
+    async def unavailable():
+        raise ProviderError(503)
+
+    for _ in range(5):
+        with pytest.raises(HTTPException):
+            await d.submit(unavailable)
+    assert d.limit == 1
+
+
+@pytest.mark.asyncio
+async def test_other_errors_pass_through_untouched():
+    """Scenario: ❌ Non-overload failure -> original exception, limit unchanged"""
+    d = dispatcher(initial_concurrency=4)
+
+    async def broken():
+        raise ValueError("No response from Gemini AI")
+
+    with pytest.raises(ValueError):
+        await d.submit(broken)
+    assert d.limit == 4
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_is_enforced():
+    """Scenario: ✅ 10 calls with limit 2 -> never more than 2 at once"""
+    d = dispatcher(initial_concurrency=2, max_concurrency=2, queue_max=20)
+    active = peak = 0
+
+    async def call():
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.005)
+        active -= 1
+
+    await asyncio.gather(*[d.submit(call) for _ in range(10)])
+
+    assert peak == 2
+    stats = d.stats()
+    assert stats["completed"] == 10 and stats["queueDepth"] == 0 and stats["inFlight"] == 0
+    assert stats["waitMsP95"] >= stats["waitMsAvg"] > 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_calls():
+    """Scenario: ✅ Burst exhausted -> next token waits for the refill"""
+    now = [0.0]
+    bucket = TokenBucket(rate=10, capacity=2, clock=lambda: now[0])
+    await bucket.acquire()
+    await bucket.acquire()
+    assert bucket.tokens < 1
+
+    now[0] += 0.1
+    await asyncio.wait_for(bucket.acquire(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_zero_rate_means_unlimited_and_negative_is_rejected():
+    """Scenario: ✅ OCR_RATE_PER_SECOND=0 -> no pacing (no ZeroDivisionError); ❌ negative rate -> ValueError"""
+    bucket = TokenBucket(rate=0, capacity=1, clock=lambda: 0.0)
+    for _ in range(5):
+        await asyncio.wait_for(bucket.acquire(), timeout=1)
+    assert bucket.tokens == 1
+
+    with pytest.raises(ValueError):
+        TokenBucket(rate=-1, capacity=1)
+
+
+def test_parse_priority():
+    """Scenario: ✅ Header labels -> priorities, unknown values stay interactive"""
+    assert parse_priority("bulk") == PRIORITY_BULK
+    assert parse_priority(" Interactive ") == PRIORITY_INTERACTIVE
+    assert parse_priority(None) == PRIORITY_INTERACTIVE
+    assert parse_priority("urgent") == PRIORITY_INTERACTIVE
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import pytest
+from fastapi import HTTPException
+
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_ROOT)
+
+from app.services import ocr_service
+
+
+def test_importing_the_app_does_not_load_the_ocr_sdk():
+    """Scenario: ✅ Worker start-up never imports google.generativeai"""
+    probe = "import sys, main; print('google.generativeai' in sys.modules)"
+    for ocr_enabled in ("true", "false"):
+        out = subprocess.run(
+            [sys.executable, "-c", probe],
+            cwd=BACKEND_ROOT,
+            env={**os.environ, "OCR_ENABLED": ocr_enabled},
+            capture_output=True, text=True, check=True,
+        )
+        assert out.stdout.strip() == "False"
+
+
+def test_ocr_disabled_worker_rejects_with_503(monkeypatch):
+    """Scenario: ❌ OCR disabled on this worker -> 503 Service Unavailable"""
+    monkeypatch.setattr(ocr_service, "OCR_ENABLED", False)
+
+    with pytest.raises(HTTPException) as exc_info:
+        ocr_service.get_ocr_provider()
+
+    assert exc_info.value.status_code == 503
+
+
+def test_registered_provider_is_used(monkeypatch):
+    """Scenario: ✅ Custom OCR backend selected through OCR_PROVIDER"""
+    class StaticProvider(ocr_service.OCRProvider):
+        name = "static"
+
+        def generate(self, contents):
+            return '{"amount": 1}'
+
+    monkeypatch.setattr(ocr_service, "_provider", None)
+    monkeypatch.setattr(ocr_service, "OCR_PROVIDER", "static")
+    monkeypatch.setitem(ocr_service._PROVIDER_FACTORIES, "static", StaticProvider)
+
+    provider = ocr_service.get_ocr_provider()
+
+    assert isinstance(provider, StaticProvider)
+    assert provider.generate([]) == '{"amount": 1}'
+
+
+def test_provider_without_generate_cannot_be_created():
+    """Scenario: ❌ OCR backend that does not implement generate -> TypeError when instantiated, not on the first upload"""
+    class IncompleteProvider(ocr_service.OCRProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        IncompleteProvider()
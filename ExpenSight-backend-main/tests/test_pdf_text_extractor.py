@@ -0,0 +1,74 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "receipts")
+sys.path.insert(0, FIXTURES)
+
+from app.services.pdf_text_extractor import extract_receipt_fields, try_local_extraction, parse_amount
+from generate_fixtures import text_pdf
+
+
+def test_digital_invoice_is_extracted_locally():
+    """Scenario: ✅ Text-layer PDF -> confident local result, no OCR needed"""
+    with open(os.path.join(FIXTURES, "multipage_invoice.pdf"), "rb") as f:
+        data = f.read()
+
+    result = try_local_extraction(data)
+
+    assert result == {
+        "amount": 4897.0,
+        "currency": "INR",
+        "category": "software",
+        "date": "2025-05-31",
+        "confidence": 1.0,
+    }
+
+
+def test_subtotal_is_not_mistaken_for_the_total():
+    """Scenario: ✅ Subtotal and tax lines are skipped in favour of the total"""
+    data = text_pdf([["Bistro Luna", "Date: 14/03/2025", "Subtotal EUR 20.00", "VAT EUR 4.20", "Total 3 items EUR 24.20"]])
+
+    result = extract_receipt_fields(data)
+
+    assert result["amount"] == 24.20
+    assert result["currency"] == "EUR"
+    assert result["date"] == "2025-03-14"
+    assert result["category"] == "food"
+
+
+def test_ambiguous_pdf_falls_back_to_ocr():
+    """Scenario: ❌ No currency or date in the text layer -> None, so Gemini is used"""
+    data = text_pdf([["Thanks for shopping with us", "Total 42.00"]])
+
+    assert extract_receipt_fields(data)["currency"] is None
+    assert try_local_extraction(data) is None
+
+
+def test_day_month_ambiguous_date_is_left_to_ocr():
+    """Scenario: ❌ Date 03/04/2025 (March 4th or April 3rd) -> no local date, so Gemini decides"""
+    data = text_pdf([["Bistro Luna", "Date: 03/04/2025", "Category: food", "Total EUR 24.20"]])
+
+    assert extract_receipt_fields(data)["date"] is None
+    assert try_local_extraction(data) is None
+
+    same_both_ways = text_pdf([["Bistro Luna", "Date: 04/04/2025", "Total EUR 24.20"]])
+    assert extract_receipt_fields(same_both_ways)["date"] == "2025-04-04"
+
+
+def test_scanned_or_broken_pdf_is_not_extracted():
+    """Scenario: ❌ No text layer / not a PDF -> None"""
+    assert extract_receipt_fields(text_pdf([[]])) is None
+    assert extract_receipt_fields(b"blurry-image-bytes") is None
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("4,897.00", 4897.0),
+    ("4.897,00", 4897.0),
+    ("1 234,5", 1234.5),
+    ("1,234", 1234.0),
+    ("12.43", 12.43),
+])
+def test_parse_amount(raw, expected):
+    assert parse_amount(raw) == expected
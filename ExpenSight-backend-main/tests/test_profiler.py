@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from app.dependencies.deps import get_current_user
+from app.services import profiler
+from app.services.profiler import ProfilingMiddleware, RequestProfiles, StackSampler, request_profiles
+
+client = TestClient(app)
+
+
+def user_with_email(email):
+    user = MagicMock()
+    user.id = 1
+    user.email = email
+    return user
+
+
+@pytest.fixture
+def admin_user():
+    with patch('app.security.admin.ADMIN_EMAILS', frozenset({"admin@example.com"})), \
+            patch.object(profiler, 'PROFILING_ENABLED', True):
+        app.dependency_overrides[get_current_user] = lambda: user_with_email("Admin@example.com")
+        yield
+        app.dependency_overrides = {}
+
+
+@pytest.fixture(autouse=True)
+def results_dir(tmp_path):
+    """Keeps per-request results out of the working directory."""
+    with patch.object(request_profiles, 'directory', tmp_path):
+        yield tmp_path
+
+
+def busy_marker_function(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.mark.asyncio
+async def test_sampler_returns_collapsed_stacks_of_other_threads():
+    """Scenario: ✅ A busy thread shows up as 'thread;...;busy_marker_function (...) count' lines"""
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_marker_function, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        collapsed = await StackSampler().profile(seconds=0.2, interval_ms=2)
+    finally:
+        stop.set()
+        worker.join()
+
+    busy = [line for line in collapsed.splitlines() if line.startswith("busy-worker;")]
+    assert busy and "busy_marker_function (test_profiler.py:" in busy[0]
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.splitlines())
+    assert "stack-sampler" not in collapsed
+
+
+@pytest.mark.asyncio
+async def test_one_sampling_run_at_a_time():
+    """Scenario: ❌ A second profile while one is running -> 409"""
+    sampler = StackSampler()
+    first = asyncio.ensure_future(sampler.profile(seconds=0.2, interval_ms=10))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await sampler.profile(seconds=0.1)
+    assert exc_info.value.status_code == 409
+    await first
+
+
+def test_profile_endpoint_is_admin_only(admin_user):
+    """Scenario: ❌ A non-admin user -> 403"""
+    app.dependency_overrides[get_current_user] = lambda: user_with_email("someone@example.com")
+
+    response = client.get("/v1/admin/profile?seconds=0.1")
+
+    assert response.status_code == 403
+
+
+def test_profile_endpoint_is_off_by_default(admin_user):
+    """Scenario: ❌ PROFILING_ENABLED unset -> 404, nothing sampled"""
+    with patch.object(profiler, 'PROFILING_ENABLED', False):
+        response = client.get("/v1/admin/profile?seconds=0.1")
+
+    assert response.status_code == 404
+
+
+def test_profile_endpoint_returns_a_folded_file(admin_user):
+    """Scenario: ✅ Admin + enabled -> text/plain attachment with collapsed stacks"""
+    response = client.get("/v1/admin/profile?seconds=0.1&interval_ms=5")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert ".folded" in response.headers["content-disposition"]
+    assert response.text.strip()
+
+
+def test_header_profiles_one_request_for_admins(admin_user):
+    """Scenario: ✅ X-Profile: 1 with an admin token -> X-Profile-Id, report lists the handler"""
+    small_app = FastAPI()
+
+    @small_app.get("/work")
+    async def work_handler():
+        return {"total": sum(range(10000))}
+
+    small_app.add_middleware(ProfilingMiddleware)
+    small_client = TestClient(small_app)
+
+    with patch('app.services.profiler.verify_access_token', side_effect=lambda token: {"sub": token}):
+        plain = small_client.get("/work", headers={"Authorization": "Bearer admin@example.com"})
+        stranger = small_client.get("/work", headers={"X-Profile": "1", "Authorization": "Bearer someone@example.com"})
+        profiled = small_client.get("/work", headers={"X-Profile": "1", "Authorization": "Bearer admin@example.com"})
+
+    assert "x-profile-id" not in plain.headers and "x-profile-id" not in stranger.headers
+    assert profiled.json() == {"total": 49995000}
+    report = client.get(f"/v1/admin/profiles/{profiled.headers['x-profile-id']}?sort=tottime&limit=100")
+    assert report.status_code == 200
+    assert "work_handler" in report.text
+    assert client.get("/v1/admin/profiles/unknown").status_code == 404
+
+
+def test_report_is_readable_from_another_worker(results_dir):
+    """Scenario: ✅ Profile stored by one worker -> another worker sharing the directory serves the report"""
+    profile = profiler.cProfile.Profile()
+    profile.enable()
+    sum(range(1000))
+    profile.disable()
+
+    RequestProfiles(directory=str(results_dir)).add("0123456789ab", profile)
+    report = RequestProfiles(directory=str(results_dir)).report("0123456789ab")
+
+    assert "function calls" in report
+
+
+def test_only_the_latest_results_are_kept(results_dir):
+    """Scenario: ✅ keep=2 and three results -> the oldest is gone, ids that are not profile ids are 404"""
+    store = RequestProfiles(directory=str(results_dir), keep=2)
+    for index, profile_id in enumerate(("aaaaaaaaaaaa", "bbbbbbbbbbbb", "cccccccccccc")):
+        store.add(profile_id, profiler.cProfile.Profile())
+        os.utime(results_dir / f"{profile_id}.pstats", (1000 + index, 1000 + index))
+
+    assert sorted(path.name for path in results_dir.glob("*.pstats")) == ["bbbbbbbbbbbb.pstats", "cccccccccccc.pstats"]
+    for missing in ("aaaaaaaaaaaa", "../../etc/passwd"):
+        with pytest.raises(HTTPException) as exc_info:
+            store.report(missing)
+        assert exc_info.value.status_code == 404
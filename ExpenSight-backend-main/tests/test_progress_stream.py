@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import HTTPException
+from app.services import progress_stream
+from app.services.progress_stream import progress_stream_response, report
+
+
+async def collect(response):
+    return b"".join([chunk async for chunk in response.body_iterator]).decode()
+
+
+@pytest.mark.asyncio
+async def test_slow_stage_sends_keepalive_comments(monkeypatch):
+    """Scenario: ✅ Stage slower than the keep-alive interval -> comment lines keep the stream open"""
+    monkeypatch.setattr(progress_stream, "KEEPALIVE_SECONDS", 0.01)
+
+    async def run(progress):
+        await report(progress, "ocr_started", engine="gemini")
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    body = await collect(progress_stream_response(run))
+
+    assert body.startswith('event: ocr_started\ndata: {"engine":"gemini"}\n\n')
+    assert ": keep-alive\n\n" in body
+    assert body.endswith('event: complete\ndata: {"ok":true}\n\n')
+
+
+@pytest.mark.asyncio
+async def test_overload_error_carries_retry_after():
+    """Scenario: ❌ OCR queue full -> error event with status and Retry-After"""
+    async def run(progress):
+        raise HTTPException(status_code=503, detail="busy", headers={"Retry-After": "5"})
+
+    body = await collect(progress_stream_response(run))
+
+    assert body == 'event: error\ndata: {"status":503,"detail":"busy","retryAfter":"5"}\n\n'
+
+
+@pytest.mark.asyncio
+async def test_report_without_callback_is_a_no_op():
+    """Scenario: ✅ Regular (non-streamed) upload -> hooks do nothing"""
+    await report(None, "received", bytes=1)
@@ -1,22 +1,17 @@
 import pytest
 from httpx import AsyncClient, ASGITransport
 from main import app
-from app.database.db import prisma  # make sure this points to your Prisma client
 
 @pytest.mark.asyncio
 async def test_register_login_and_protected_route():
-    await prisma.connect()
-
-    # Cleanup: Remove user if already exists
-    await prisma.users.delete_many(where={"email": "secureuser@example.com"})
-
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://testserver") as ac:
         
         # Step 1: Register
         register_response = await ac.post("/v1/auth/register", json={
             "email": "secureuser@example.com",
-            "password": "securepassword"
+            "password": "securepassword",
+            "baseCurrency": "USD"
         })
         assert register_response.status_code == 200
         
@@ -32,8 +27,15 @@ async def test_register_login_and_protected_route():
         headers = {
             "Authorization": f"Bearer {token}"
         }
-        protected_response = await ac.get("/v1/user/me", headers=headers)
+        protected_response = await ac.get("/v1/user/profile/", headers=headers)
         assert protected_response.status_code == 200
         assert protected_response.json()["email"] == "secureuser@example.com"
+        assert protected_response.json()["baseCurrency"] == "USD"
+
 
-    await prisma.disconnect()
+@pytest.mark.asyncio
+async def test_protected_route_without_token_is_rejected():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://testserver") as ac:
+        response = await ac.get("/v1/user/profile/")
+        assert response.status_code == 401
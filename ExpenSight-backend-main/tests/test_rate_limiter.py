@@ -0,0 +1,153 @@
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from app.dependencies.deps import get_current_user
+from app.services.rate_limiter import (
+    MemoryBucketStore, PostgresBucketStore, RateLimit, RateLimiter, parse_limit, rate_limiter,
+)
+
+client = TestClient(app)
+
+VALID_USER_ID = 123
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_limit():
+    """Scenario: ✅ '10/minute', '100/5minutes' and 'off'"""
+    limit = parse_limit("10/minute")
+    assert (limit.capacity, limit.period_seconds) == (10, 60)
+    assert parse_limit("100/5minutes").period_seconds == 300
+    assert parse_limit("off") is None
+    with pytest.raises(ValueError):
+        parse_limit("10 per minute")
+
+
+@pytest.mark.asyncio
+async def test_bucket_allows_a_burst_then_refills():
+    """Scenario: ✅ 2/minute -> two requests pass, the third waits 30s for one token"""
+    clock = FakeClock()
+    store = MemoryBucketStore(clock=clock)
+    limit = RateLimit(2, 60)
+
+    assert await store.take("reconcile", 1, limit) == 0
+    assert await store.take("reconcile", 1, limit) == 0
+    assert await store.take("reconcile", 1, limit) == pytest.approx(30)
+    assert await store.take("reconcile", 2, limit) == 0  # buckets are per user
+
+    clock.now += 30
+    assert await store.take("reconcile", 1, limit) == 0
+    assert await store.take("reconcile", 1, limit) > 0
+
+
+@pytest.mark.asyncio
+async def test_over_limit_raises_429_with_retry_after(monkeypatch):
+    """Scenario: ❌ Empty bucket -> 429, Retry-After rounded up, counted as throttled"""
+    monkeypatch.setenv("RATE_LIMIT_RECONCILE", "1/minute")
+    limiter = RateLimiter(MemoryBucketStore(clock=FakeClock()))
+
+    await limiter.check("reconcile", 1)
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter.check("reconcile", 1)
+
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers["Retry-After"] == "60"
+    assert limiter.stats()["routes"]["reconcile"] == {"limit": "1/60s", "allowed": 1, "throttled": 1}
+
+
+@pytest.mark.asyncio
+async def test_shared_backend_failure_fails_open(monkeypatch):
+    """Scenario: ✅ The buckets table is unreachable -> request allowed, error counted"""
+    monkeypatch.setenv("RATE_LIMIT_RECONCILE", "1/minute")
+    client_mock = MagicMock()
+    client_mock.query_raw = AsyncMock(side_effect=RuntimeError("connection refused"))
+    limiter = RateLimiter(PostgresBucketStore(client_mock))
+
+    await limiter.check("reconcile", 1)
+
+    assert limiter.stats()["backendErrors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_backend_reports_wait_for_the_next_token():
+    """Scenario: ❌ No row returned by the take -> retry after the time to refill one token"""
+    client_mock = MagicMock()
+    client_mock.query_raw = AsyncMock(side_effect=[[], [{"tokens": 0.5}]])
+    store = PostgresBucketStore(client_mock)
+
+    retry_after = await store.take("receipt_upload", 1, RateLimit(10, 60))
+
+    assert retry_after == pytest.approx(3)
+    assert client_mock.query_raw.await_args_list[0].args[1:] == ("receipt_upload", 1, 10, 10 / 60)
+
+
+def test_reconcile_route_is_limited_per_user(monkeypatch):
+    """Scenario: ❌ Second POST /v1/reconcile/ within the minute -> 429; metrics show it"""
+    monkeypatch.setenv("RATE_LIMIT_RECONCILE", "1/minute")
+    rate_limiter.reset()
+    user = MagicMock()
+    user.id = VALID_USER_ID
+    app.dependency_overrides[get_current_user] = lambda: user
+    expense = SimpleNamespace(id=1, amount=10.0, currency="USD", category="Food", status="RECONCILED", date=datetime(2025, 6, 1))
+    result = SimpleNamespace(
+        id=1, convertedAmount=834.0, baseCurrency="USD", conversionCurrency="INR", fxRate=83.4,
+        createdAt=datetime(2025, 6, 2), expense=expense,
+    )
+    result.conversions = [result]
+    try:
+        with patch('app.controllers.reconcile_controller.create_reconciliation', new_callable=AsyncMock, return_value=result) as create:
+            first = client.post("/v1/reconcile/", json={"expenseId": 1})
+            second = client.post("/v1/reconcile/", json={"expenseId": 1})
+    finally:
+        app.dependency_overrides = {}
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert 0 < int(second.headers["Retry-After"]) <= 60
+    create.assert_awaited_once()
+
+    metrics = client.get("/v1/monitoring/rate-limits").json()
+    assert metrics["backend"] == "memory"
+    assert metrics["routes"]["reconcile"]["throttled"] == 1
+
+
+def test_idempotent_replay_is_not_charged(monkeypatch, key_table):
+    """Scenario: ✅ Retry with a completed Idempotency-Key -> stored response, no token taken; a new key is still limited"""
+    monkeypatch.setenv("RATE_LIMIT_RECONCILE", "1/minute")
+    rate_limiter.reset()
+    user = MagicMock()
+    user.id = VALID_USER_ID
+    app.dependency_overrides[get_current_user] = lambda: user
+    expense = SimpleNamespace(id=1, amount=10.0, currency="USD", category="Food", status="RECONCILED", date=datetime(2025, 6, 1))
+    result = SimpleNamespace(
+        id=1, convertedAmount=834.0, baseCurrency="USD", conversionCurrency="INR", fxRate=83.4,
+        createdAt=datetime(2025, 6, 2), expense=expense,
+    )
+    result.conversions = [result]
+    try:
+        with patch('app.controllers.reconcile_controller.create_reconciliation', new_callable=AsyncMock, return_value=result) as create:
+            first = client.post("/v1/reconcile/", json={"expenseId": 1}, headers={"Idempotency-Key": "k1"})
+            retry = client.post("/v1/reconcile/", json={"expenseId": 1}, headers={"Idempotency-Key": "k1"})
+            other = client.post("/v1/reconcile/", json={"expenseId": 1}, headers={"Idempotency-Key": "k2"})
+    finally:
+        app.dependency_overrides = {}
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert other.status_code == 429
+    create.assert_awaited_once()
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
 from fastapi import FastAPI, UploadFile, File, Depends, HTTPException
@@ -19,6 +20,9 @@ from main import app
 from app.dependencies.deps import get_current_user
 # The controller is imported so we can patch objects within it.
 from app.controllers import receipt_controller
+from app.repositories.memory import memory_repositories
+from app.repositories.registry import use_repositories
+from app.repositories.prisma_repository import prisma_repositories
 
 # --- Test Client ---
 # Use your actual app object here
@@ -41,29 +45,27 @@ MOCKED_CREATED_RECEIPT_ID = 1
 def mock_gemini():
     """
     Fixture to mock the Gemini AI model.
-    The path 'app.controllers.receipt_controller.model' must match
-    exactly where the 'model' variable is located in your project.
+    The Gemini provider builds its model lazily in '_get_model', so patching
+    that method keeps the real SDK from ever being imported or configured.
     """
-    with patch('app.controllers.receipt_controller.model') as mock_model:
-        yield mock_model
+    with patch('app.services.ocr_service.GeminiOCRProvider._get_model') as mock_get_model:
+        yield mock_get_model.return_value
 
 @pytest.fixture
-def mock_prisma():
+def repos():
     """
-    Fixture to mock the Prisma client.
-    The path 'app.controllers.receipt_controller.prisma' must match
-    exactly where the 'prisma' variable is located in your project.
+    Fixture that runs the controllers against the in-memory repositories
+    instead of Prisma. Ids start at 1, so the first expense and receipt
+    created get MOCKED_CREATED_EXPENSE_ID / MOCKED_CREATED_RECEIPT_ID.
     """
-    with patch('app.controllers.receipt_controller.prisma') as mock_prisma_client:
-        # Configure async mocks for Prisma methods
-        expense_mock = MagicMock()
-        expense_mock.id = MOCKED_CREATED_EXPENSE_ID
-        mock_prisma_client.expense.create = AsyncMock(return_value=expense_mock)
-        
-        receipt_mock = MagicMock()
-        receipt_mock.id = MOCKED_CREATED_RECEIPT_ID
-        mock_prisma_client.receipts.create = AsyncMock(return_value=receipt_mock)
-        yield mock_prisma_client
+    with use_repositories(memory_repositories()) as repositories:
+        yield repositories
+
+@pytest.fixture(autouse=True)
+def receipt_store(tmp_path):
+    """Keeps stored receipt blobs out of the working directory."""
+    with patch.object(receipt_controller.blob_store, 'root', tmp_path):
+        yield receipt_controller.blob_store
 
 # --- THE FIX IS HERE ---
 def override_get_current_user():
@@ -82,7 +84,7 @@ def override_get_unauthorized_user():
 
 # --- Test Cases ---
 
-def test_upload_receipt_happy_path(mock_gemini, mock_prisma):
+def test_upload_receipt_happy_path(mock_gemini, repos):
     """Scenario: ✅ Happy Path -> 200 OK"""
     # Arrange
     mock_gemini.generate_content.return_value = MagicMock(text=json.dumps(MOCKED_SUCCESSFUL_OCR))
@@ -115,7 +117,7 @@ def test_upload_receipt_missing_file():
     app.dependency_overrides = {}
 
 
-def test_upload_receipt_invalid_file_type(mock_gemini, mock_prisma):
+def test_upload_receipt_invalid_file_type(mock_gemini, repos):
     """Scenario: ❌ Invalid File Type -> 400 Bad Request"""
     # Arrange
     app.dependency_overrides[get_current_user] = override_get_current_user
@@ -145,7 +147,7 @@ def test_upload_receipt_invalid_token():
     app.dependency_overrides = {}
 
 
-def test_upload_receipt_ocr_fails_null_amount(mock_gemini, mock_prisma):
+def test_upload_receipt_ocr_fails_null_amount(mock_gemini, repos):
     """Scenario: ❌ OCR Fails (null amount) -> 400 Bad Request"""
     # Arrange
     failed_ocr_response = MOCKED_SUCCESSFUL_OCR.copy()
@@ -163,7 +165,7 @@ def test_upload_receipt_ocr_fails_null_amount(mock_gemini, mock_prisma):
     app.dependency_overrides = {}
 
 
-def test_upload_receipt_ocr_fails_bad_json(mock_gemini, mock_prisma):
+def test_upload_receipt_ocr_fails_bad_json(mock_gemini, repos):
     """Scenario: ❌ OCR Fails (invalid JSON) -> 500 Internal Server Error"""
     # Arrange
     mock_gemini.generate_content.return_value = MagicMock(text="Sorry, I could not read the receipt.")
@@ -179,7 +181,7 @@ def test_upload_receipt_ocr_fails_bad_json(mock_gemini, mock_prisma):
     app.dependency_overrides = {}
 
 
-def test_upload_receipt_different_currency(mock_gemini, mock_prisma):
+def test_upload_receipt_different_currency(mock_gemini, repos):
     """Scenario: ✅ Different Currency -> 200 OK"""
     # Arrange
     eur_ocr_response = MOCKED_SUCCESSFUL_OCR.copy()
@@ -193,8 +195,285 @@ def test_upload_receipt_different_currency(mock_gemini, mock_prisma):
 
     # Assert
     assert response.status_code == 200
-    mock_prisma.expense.create.assert_called_once()
-    call_args, call_kwargs = mock_prisma.expense.create.call_args
-    assert call_kwargs['data']['currency'] == 'EUR'
-    assert call_kwargs['data']['amount'] == 150.75
+    assert len(repos.store.expenses) == 1
+    expense = repos.store.expenses[MOCKED_CREATED_EXPENSE_ID]
+    assert expense.currency == 'EUR'
+    assert expense.amount == 150.75
+    assert expense.categoryKey == 'office_supplies'
+    app.dependency_overrides = {}
+
+
+
+def test_upload_receipt_creates_expense_and_receipt_in_one_statement():
+    """Scenario: ✅ Prisma layer -> one nested expense.create, no separate receipts.create"""
+    client_mock = MagicMock()
+    client_mock.expense.create = AsyncMock(return_value=MagicMock(id=7, receipt=MagicMock(id=9)))
+    client_mock.receipts.create = AsyncMock()
+    user = MagicMock(id=VALID_USER_ID)
+
+    with use_repositories(prisma_repositories()), patch('app.repositories.prisma_repository.prisma', client_mock):
+        result = asyncio.run(receipt_controller.create_expense_and_receipt(MOCKED_SUCCESSFUL_OCR, user, "receipt.png"))
+
+    client_mock.expense.create.assert_awaited_once()
+    client_mock.receipts.create.assert_not_awaited()
+    data = client_mock.expense.create.await_args.kwargs['data']
+    assert data['receipt'] == {'create': {'filename': "receipt.png", 'userId': VALID_USER_ID}}
+    assert client_mock.expense.create.await_args.kwargs['include'] == {'receipt': True}
+    assert result["receipt"]["id"] == 9
+    assert result["receipt"]["expenseId"] == 7
+
+
+def test_upload_receipt_failed_receipt_insert_leaves_no_expense(mock_gemini, repos):
+    """Scenario: ❌ Receipt row cannot be written -> 500 and no orphan expense"""
+    mock_gemini.generate_content.return_value = MagicMock(text=json.dumps(MOCKED_SUCCESSFUL_OCR))
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    file = ("receipt.png", io.BytesIO(b"fake-image-bytes"), "image/png")
+
+    with patch('app.repositories.memory.new_receipt', side_effect=RuntimeError("connection lost")):
+        response = client.post("/v1/receipt/upload", files={"file": file})
+
+    assert response.status_code == 500
+    assert repos.store.expenses == {}
+    assert repos.store.expenses_by_user[VALID_USER_ID] == []
+    assert repos.store.receipts == {}
+    app.dependency_overrides = {}
+
+def stored_blobs(receipt_store):
+    return sorted(p.name for p in receipt_store.root.rglob("*") if p.is_file())
+
+
+def test_rejected_upload_leaves_no_blob(mock_gemini, repos, receipt_store):
+    """Scenario: ❌ OCR finds no amount -> 400 and the newly stored original is removed"""
+    failed_ocr_response = {**MOCKED_SUCCESSFUL_OCR, "amount": None}
+    mock_gemini.generate_content.return_value = MagicMock(text=json.dumps(failed_ocr_response))
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    file = ("blank.png", io.BytesIO(b"blank-image-bytes"), "image/png")
+
+    response = client.post("/v1/receipt/upload", files={"file": file})
+
+    assert response.status_code == 400
+    assert stored_blobs(receipt_store) == []
+    app.dependency_overrides = {}
+
+
+def test_failed_upload_keeps_a_blob_shared_with_another_receipt(mock_gemini, repos, receipt_store):
+    """Scenario: ❌ Failed upload of a file that was already stored -> the existing blob is kept"""
+    row, data = stored_receipt(repos, receipt_store, data=b"shared-image-bytes", content_type="image/png")
+    mock_gemini.generate_content.return_value = MagicMock(text=json.dumps({**MOCKED_SUCCESSFUL_OCR, "amount": None}))
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+    response = client.post("/v1/receipt/upload", files={"file": ("again.png", io.BytesIO(data), "image/png")})
+
+    assert response.status_code == 400
+    assert receipt_store.path_for(row.contentHash).read_bytes() == data
+    app.dependency_overrides = {}
+
+
+def test_failed_upload_keeps_a_new_blob_another_user_committed_onto(mock_gemini, repos, receipt_store):
+    """Scenario: ❌ Upload wrote the blob, a concurrent upload of the same bytes committed a receipt on it, OCR fails -> blob kept"""
+    data = b"raced-image-bytes"
+    put = receipt_store.put
+
+    def put_then_concurrent_upload(blob, mime_type):
+        stored = put(blob, mime_type)
+        asyncio.run(repos.receipts.create({
+            'filename': "theirs.png", 'userId': VALID_USER_ID + 1, 'contentHash': stored["contentHash"],
+            'contentType': mime_type, 'hasThumbnail': stored["hasThumbnail"],
+        }))
+        return stored
+
+    mock_gemini.generate_content.return_value = MagicMock(text=json.dumps({**MOCKED_SUCCESSFUL_OCR, "amount": None}))
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+    with patch.object(receipt_store, 'put', side_effect=put_then_concurrent_upload):
+        response = client.post("/v1/receipt/upload", files={"file": ("mine.png", io.BytesIO(data), "image/png")})
+
+    assert response.status_code == 400
+    theirs = next(iter(repos.store.receipts.values()))
+    assert receipt_store.path_for(theirs.contentHash).read_bytes() == data
+    app.dependency_overrides = {}
+
+
+def test_successful_upload_restores_a_blob_removed_meanwhile(mock_gemini, repos, receipt_store):
+    """Scenario: ✅ A failed upload of the same bytes removed the blob before this receipt committed -> written back"""
+    mock_gemini.generate_content.return_value = MagicMock(text=json.dumps(MOCKED_SUCCESSFUL_OCR))
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    create = receipt_controller.create_expense_and_receipt
+
+    async def create_after_concurrent_removal(parsed_data, user, filename, stored, progress=None):
+        receipt_store.remove(stored["contentHash"])
+        return await create(parsed_data, user, filename, stored, progress=progress)
+
+    with patch.object(receipt_controller, 'create_expense_and_receipt', side_effect=create_after_concurrent_removal):
+        response = client.post("/v1/receipt/upload", files={"file": ("r.png", io.BytesIO(b"restored-bytes"), "image/png")})
+
+    assert response.status_code == 200
+    receipt = repos.store.receipts[MOCKED_CREATED_RECEIPT_ID]
+    assert receipt_store.path_for(receipt.contentHash).read_bytes() == b"restored-bytes"
+    app.dependency_overrides = {}
+
+
+def test_upload_over_the_size_cap_is_rejected(mock_gemini, repos, receipt_store):
+    """Scenario: ❌ File larger than RECEIPT_MAX_UPLOAD_BYTES -> 413, nothing stored and no OCR call"""
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    file = ("huge.png", io.BytesIO(b"x" * 101), "image/png")
+
+    with patch.object(receipt_controller, 'RECEIPT_MAX_UPLOAD_BYTES', 100):
+        response = client.post("/v1/receipt/upload", files={"file": file})
+
+    assert response.status_code == 413
+    assert stored_blobs(receipt_store) == []
+    mock_gemini.generate_content.assert_not_called()
+    assert repos.store.expenses == {}
+    app.dependency_overrides = {}
+
+def stored_receipt(repos, receipt_store, user_id=VALID_USER_ID, data=b"%PDF-1.4 " + b"x" * 5000, content_type="application/pdf"):
+    """Stores a blob and a receipt row pointing at it."""
+    stored = receipt_store.put(data, content_type)
+    row = asyncio.run(repos.receipts.create({
+        'filename': "invoice.pdf",
+        'userId': user_id,
+        'contentHash': stored["contentHash"],
+        'contentType': content_type,
+        'hasThumbnail': stored["hasThumbnail"],
+    }))
+    return row, data
+
+
+def test_upload_receipt_keeps_original(mock_gemini, repos, receipt_store):
+    """Scenario: ✅ Upload -> original stored by hash and linked from the receipt row"""
+    mock_gemini.generate_content.return_value = MagicMock(text=json.dumps(MOCKED_SUCCESSFUL_OCR))
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    file = ("receipt.png", io.BytesIO(b"fake-image-bytes"), "image/png")
+
+    response = client.post("/v1/receipt/upload", files={"file": file})
+
+    assert response.status_code == 200
+    receipt = repos.store.receipts[MOCKED_CREATED_RECEIPT_ID]
+    assert receipt_store.path_for(receipt.contentHash).read_bytes() == b"fake-image-bytes"
+    assert receipt.contentType == "image/png"
+    assert receipt.size == len(b"fake-image-bytes")
+    assert receipt.expenseId == MOCKED_CREATED_EXPENSE_ID
+    app.dependency_overrides = {}
+
+
+def test_download_receipt_supports_range_and_etag(repos, receipt_store):
+    """Scenario: ✅ Download -> full file, 206 for a Range, 304 for a matching If-None-Match"""
+    row, data = stored_receipt(repos, receipt_store)
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+    full = client.get("/v1/receipt/1/file")
+    assert full.status_code == 200
+    assert full.content == data
+    assert full.headers["etag"] == f'"{row.contentHash}"'
+    assert "immutable" in full.headers["cache-control"]
+
+    partial = client.get("/v1/receipt/1/file", headers={"Range": "bytes=0-99"})
+    assert partial.status_code == 206
+    assert partial.content == data[:100]
+
+    cached = client.get("/v1/receipt/1/file", headers={"If-None-Match": full.headers["etag"]})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    app.dependency_overrides = {}
+
+
+def test_download_other_users_receipt_is_404(repos, receipt_store):
+    """Scenario: ❌ Receipt not owned by the caller -> 404"""
+    row, _ = stored_receipt(repos, receipt_store, user_id=VALID_USER_ID + 1)
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+    response = client.get(f"/v1/receipt/{row.id}/file")
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Receipt not found"
+    app.dependency_overrides = {}
+
+
+def test_thumbnail_missing_for_text_pdf_is_404(repos, receipt_store):
+    """Scenario: ❌ Receipt without a thumbnail -> 404"""
+    stored_receipt(repos, receipt_store)
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+    response = client.get("/v1/receipt/1/thumbnail")
+
+    assert response.status_code == 404
+    app.dependency_overrides = {}
+
+
+def read_events(response):
+    """Parses a Server-Sent Events body into (event, data) pairs."""
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_upload_receipt_stream_reports_each_stage(mock_gemini, repos):
+    """Scenario: ✅ Streamed upload -> one event per stage, then the final payload"""
+    mock_gemini.generate_content.return_value = MagicMock(text=json.dumps(MOCKED_SUCCESSFUL_OCR))
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    file = ("receipt.png", io.BytesIO(b"fake-image-bytes"), "image/png")
+
+    response = client.post("/v1/receipt/upload/stream", files={"file": file})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = read_events(response)
+    assert [name for name, _ in events] == [
+        "received", "preprocessing", "ocr_started", "ocr_done", "saved", "complete"
+    ]
+    assert events[0][1] == {"filename": "receipt.png", "bytes": len(b"fake-image-bytes")}
+    assert events[4][1] == {"expenseId": MOCKED_CREATED_EXPENSE_ID, "receiptId": MOCKED_CREATED_RECEIPT_ID}
+    final = events[-1][1]
+    assert final["message"] == "Receipt uploaded and processed successfully."
+    assert final["expense"]["amount"] == 150.75
+    app.dependency_overrides = {}
+
+
+def test_upload_receipt_stream_ends_with_error_event(mock_gemini, repos):
+    """Scenario: ❌ OCR finds no amount -> progress so far, then an error event with the 400"""
+    failed_ocr_response = MOCKED_SUCCESSFUL_OCR.copy()
+    failed_ocr_response["amount"] = None
+    mock_gemini.generate_content.return_value = MagicMock(text=json.dumps(failed_ocr_response))
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    file = ("blank.png", io.BytesIO(b"blank-image-bytes"), "image/png")
+
+    response = client.post("/v1/receipt/upload/stream", files={"file": file})
+
+    events = read_events(response)
+    assert events[-1][0] == "error"
+    assert events[-1][1]["status"] == 400
+    assert "Could not read the amount" in events[-1][1]["detail"]
+    assert "saved" not in [name for name, _ in events]
+    assert repos.store.expenses == {}
+    app.dependency_overrides = {}
+
+
+def test_upload_receipt_stream_rejects_oversized_file_before_buffering(mock_gemini, repos):
+    """Scenario: ❌ Streamed upload over RECEIPT_MAX_UPLOAD_BYTES -> plain 413, no stream, no OCR"""
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    file = ("huge.png", io.BytesIO(b"x" * 101), "image/png")
+
+    with patch.object(receipt_controller, 'RECEIPT_MAX_UPLOAD_BYTES', 100):
+        response = client.post("/v1/receipt/upload/stream", files={"file": file})
+
+    assert response.status_code == 413
+    assert not response.headers["content-type"].startswith("text/event-stream")
+    mock_gemini.generate_content.assert_not_called()
+    app.dependency_overrides = {}
+
+
+def test_upload_with_idempotency_key_is_size_capped_before_fingerprinting(mock_gemini, repos, key_table):
+    """Scenario: ❌ Oversized upload with an Idempotency-Key -> 413 before the file is read whole, no key claimed"""
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    file = ("huge.png", io.BytesIO(b"x" * 101), "image/png")
+
+    with patch.object(receipt_controller, 'RECEIPT_MAX_UPLOAD_BYTES', 100):
+        response = client.post("/v1/receipt/upload", files={"file": file}, headers={"Idempotency-Key": "big"})
+
+    assert response.status_code == 413
+    assert key_table.rows == {}
+    mock_gemini.generate_content.assert_not_called()
     app.dependency_overrides = {}
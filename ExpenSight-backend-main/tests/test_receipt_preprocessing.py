@@ -0,0 +1,77 @@
+import io
+import json
+import mimetypes
+import pytest
+from PIL import Image
+from pypdf import PdfReader
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import receipt_preprocessing
+from app.services.receipt_preprocessing import preprocess_receipt
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "receipts")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read(), mimetypes.guess_type(name)[0]
+
+
+def test_phone_photo_is_rotated_downscaled_and_shrunk():
+    """Scenario: ✅ Sideways 8 MP photo -> upright grayscale JPEG within the size limit"""
+    data, mime_type = load_fixture("phone_photo_rotated.jpg")
+
+    out, out_mime, stats = preprocess_receipt(data, mime_type)
+
+    image = Image.open(io.BytesIO(out))
+    assert out_mime == "image/jpeg"
+    assert image.height > image.width  # the receipt is portrait once upright
+    assert max(image.size) <= receipt_preprocessing.OCR_MAX_DIMENSION
+    assert image.mode == "L"
+    assert stats["bytesBefore"] == len(data)
+    assert stats["bytesAfter"] == len(out) < len(data)
+    assert stats["steps"] == ["rotate", "downscale", "grayscale", "recompress"]
+
+
+def test_multipage_pdf_keeps_first_and_total_pages():
+    """Scenario: ✅ 4-page invoice -> first page + the page with the grand total"""
+    data, mime_type = load_fixture("multipage_invoice.pdf")
+
+    out, out_mime, stats = preprocess_receipt(data, mime_type)
+
+    pages = PdfReader(io.BytesIO(out)).pages
+    assert out_mime == "application/pdf"
+    assert len(pages) == receipt_preprocessing.OCR_PDF_MAX_PAGES == 2
+    assert "Invoice Date: 2025-05-31" in pages[0].extract_text()
+    assert "Grand Total INR 4,897.00" in pages[1].extract_text()
+    assert stats["bytesAfter"] < stats["bytesBefore"]
+
+
+def test_small_image_is_left_alone():
+    """Scenario: ✅ Re-encoding would not help -> original bytes are kept"""
+    buffer = io.BytesIO()
+    Image.new("L", (40, 20), 255).save(buffer, format="PNG")
+    data = buffer.getvalue()
+
+    out, out_mime, stats = preprocess_receipt(data, "image/png")
+
+    assert (out, out_mime) == (data, "image/png")
+    assert stats["steps"] == ["unchanged"]
+
+
+def test_unreadable_upload_is_passed_through():
+    """Scenario: ❌ Corrupt image -> forwarded unchanged instead of failing the upload"""
+    out, out_mime, stats = preprocess_receipt(b"fake-image-bytes", "image/png")
+
+    assert (out, out_mime) == (b"fake-image-bytes", "image/png")
+    assert stats["steps"] == ["skipped"]
+
+
+def test_every_fixture_has_an_expectation():
+    with open(os.path.join(FIXTURES, "expected.json")) as f:
+        expected = json.load(f)
+    fixtures = {n for n in os.listdir(FIXTURES) if n.endswith((".png", ".jpg", ".jpeg", ".pdf"))}
+    assert fixtures == set(expected)
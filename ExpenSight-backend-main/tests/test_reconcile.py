@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from app.dependencies.deps import get_current_user
+from app.repositories.memory import memory_repositories
+from app.repositories.prisma_repository import PrismaReconcileRepository
+from app.repositories.registry import use_repositories
+from app.services.reconcile_compaction import ReconcileCompactor
+
+client = TestClient(app)
+
+VALID_USER_ID = 123
+
+
+def override_get_current_user():
+    mock_user = MagicMock()
+    mock_user.id = VALID_USER_ID
+    mock_user.baseCurrency = "INR"
+    return mock_user
+
+
+@pytest.fixture
+def repos():
+    with use_repositories(memory_repositories()) as repositories:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+        asyncio.run(repositories.expenses.create({
+            'amount': 100.0, 'currency': 'EUR', 'category': 'Travel', 'date': datetime(2025, 6, 1), 'userId': VALID_USER_ID,
+        }))
+        yield repositories
+        app.dependency_overrides = {}
+
+
+def test_reconcile_into_several_currencies_at_once(repos):
+    """Scenario: ✅ conversionCurrencies=[usd, INR, USD] -> one bulk FX lookup, two rows, both in the response"""
+    with patch('app.controllers.reconcile_controller.get_historical_fx_rates', new_callable=AsyncMock,
+               return_value={"USD": 1.1, "INR": 90.5}) as bulk:
+        response = client.post("/v1/reconcile/", json={"expenseId": 1, "conversionCurrencies": ["usd", "INR", "USD"]})
+
+    assert response.status_code == 200
+    body = response.json()
+    bulk.assert_awaited_once()
+    assert bulk.await_args.args[1] == ["USD", "INR"]
+    assert [(c["conversionCurrency"], c["convertedAmount"], c["fxRate"]) for c in body["conversions"]] == [
+        ("USD", 110.0, 1.1), ("INR", 9050.0, 90.5),
+    ]
+    # The top-level fields and the expense describe the first target, as for a single-currency request.
+    assert (body["conversionCurrency"], body["convertedAmount"], body["id"]) == ("USD", 110.0, body["conversions"][0]["id"])
+    assert body["expense"]["status"] == "RECONCILED"
+    assert len(asyncio.run(repos.reconciles.history(VALID_USER_ID))) == 2
+
+
+def test_single_target_defaults_to_base_currency(repos):
+    """Scenario: ✅ No target given -> the user's base currency, through the coalesced single-rate lookup"""
+    with patch('app.controllers.reconcile_controller.get_historical_fx_rate', new_callable=AsyncMock, return_value=90.0) as single:
+        response = client.post("/v1/reconcile/", json={"expenseId": 1})
+
+    assert response.status_code == 200
+    assert single.await_args.kwargs["to_currency"] == "INR"
+    assert [c["conversionCurrency"] for c in response.json()["conversions"]] == ["INR"]
+
+
+def test_target_without_a_rate_fails_before_writing(repos):
+    """Scenario: ❌ Frankfurter returns no rate for one target -> 503, nothing saved"""
+    with patch('app.controllers.reconcile_controller.get_historical_fx_rates', new_callable=AsyncMock, return_value={"USD": 1.1}):
+        response = client.post("/v1/reconcile/", json={"expenseId": 1, "conversionCurrencies": ["USD", "XYZ"]})
+
+    assert response.status_code == 503
+    assert "XYZ" in response.json()["detail"]
+    assert asyncio.run(repos.reconciles.history(VALID_USER_ID)) == []
+
+
+def test_too_many_targets_are_rejected(repos):
+    """Scenario: ❌ More than 10 target currencies -> 422"""
+    response = client.post("/v1/reconcile/", json={"expenseId": 1, "conversionCurrencies": ["USD"] * 11})
+
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_the_latest_per_target_currency():
+    """Scenario: ✅ USD twice, INR once -> only the older USD conversion is archived"""
+    repos = memory_repositories()
+    with use_repositories(repos):
+        for currency, rate in (("USD", 1.1), ("INR", 90.0), ("USD", 1.2)):
+            await repos.reconciles.create_many([{
+                'expenseId': 1, 'userId': VALID_USER_ID, 'convertedAmount': 100 * rate,
+                'baseCurrency': 'EUR', 'conversionCurrency': currency, 'fxRate': rate,
+            }])
+
+        assert (await ReconcileCompactor().run_once())["lastArchived"] == 1
+
+    current = await repos.reconciles.history(VALID_USER_ID)
+    assert sorted((r.conversionCurrency, r.fxRate) for r in current) == [("INR", 90.0), ("USD", 1.2)]
+
+
+@pytest.mark.asyncio
+async def test_prisma_inserts_all_targets_in_one_statement():
+    """Scenario: ✅ The Prisma repository sends every row as one jsonb payload and parses the returned timestamps"""
+    returned = [{"id": 7, "convertedAmount": 110.0, "baseCurrency": "EUR", "conversionCurrency": "USD", "fxRate": 1.1,
+                 "createdAt": "2025-06-02T10:00:00+00:00", "expenseId": 1, "userId": VALID_USER_ID}]
+    with patch('app.repositories.prisma_repository.prisma') as mock_prisma:
+        mock_prisma.query_raw = AsyncMock(return_value=returned)
+
+        created = await PrismaReconcileRepository().create_many([{"conversionCurrency": "USD"}, {"conversionCurrency": "INR"}])
+
+    sql, payload = mock_prisma.query_raw.await_args.args
+    assert "jsonb_to_recordset" in sql and payload.count("conversionCurrency") == 2
+    # createdAt is timestamp(3) without time zone holding UTC, like Prisma writes it.
+    assert "now() AT TIME ZONE 'UTC'" in sql
+    assert created[0].id == 7 and created[0].createdAt == datetime.fromisoformat("2025-06-02T10:00:00+00:00")
@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from app.dependencies.deps import get_current_user, conditional_user_data
+from app.repositories.memory import memory_repositories
+from app.repositories.prisma_repository import PrismaReconcileRepository
+from app.repositories.registry import use_repositories
+from app.services.reconcile_compaction import ReconcileCompactor
+from app.services.sparse_fields import reconcile_history_query
+
+client = TestClient(app)
+
+VALID_USER_ID = 123
+
+
+def override_get_current_user():
+    mock_user = MagicMock()
+    mock_user.id = VALID_USER_ID
+    return mock_user
+
+
+async def reconcile_repeatedly(repos, rates_by_expense):
+    """Creates an expense per entry and reconciles it once per rate, in order."""
+    for rates in rates_by_expense:
+        expense = await repos.expenses.create({
+            'amount': 10.0, 'currency': 'USD', 'category': 'Food', 'date': datetime(2025, 6, 1), 'userId': VALID_USER_ID,
+        })
+        for rate in rates:
+            await repos.reconciles.create({
+                'expenseId': expense.id, 'userId': VALID_USER_ID, 'convertedAmount': 10 * rate,
+                'baseCurrency': 'USD', 'conversionCurrency': 'INR', 'fxRate': rate,
+            })
+
+
+@pytest.fixture
+def repos():
+    with use_repositories(memory_repositories()) as repositories:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+        app.dependency_overrides[conditional_user_data] = lambda: {}
+        yield repositories
+        app.dependency_overrides = {}
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_only_the_latest_per_expense(repos):
+    """Scenario: ✅ 3 + 1 conversions, batches of 1 -> 2 archived over 3 batches, latest ones stay"""
+    await reconcile_repeatedly(repos, [(83.0, 84.0, 85.0), (90.0,)])
+    compactor = ReconcileCompactor(batch_size=1)
+
+    stats = await compactor.run_once()
+
+    assert (stats["lastArchived"], stats["batches"]) == (2, 3)
+    current = await repos.reconciles.history(VALID_USER_ID)
+    assert [r.fxRate for r in current] == [90.0, 85.0]
+    everything = await repos.reconciles.history(VALID_USER_ID, include_archived=True)
+    assert [r.fxRate for r in everything] == [90.0, 85.0, 84.0, 83.0]
+    assert await repos.reconciles.count_reconciled_expenses(VALID_USER_ID) == 2
+
+    assert (await compactor.run_once())["lastArchived"] == 0
+
+
+def test_history_route_exposes_archived_records_on_request(repos):
+    """Scenario: ✅ include_archived=true -> superseded conversions are listed again, newest first"""
+    asyncio.run(reconcile_repeatedly(repos, [(83.0, 84.0)]))
+    asyncio.run(ReconcileCompactor().run_once())
+
+    default = client.get("/v1/reconcile/history").json()["reconciliation_history"]
+    full = client.get("/v1/reconcile/history?include_archived=true").json()["reconciliation_history"]
+    sparse = client.get("/v1/reconcile/history?fields=fxRate&include_archived=true").json()["reconciliation_history"]
+    specific = client.get("/v1/reconcile/history_specific?expense_id=1&include_archived=true").json()
+
+    assert [entry["fxRate"] for entry in default] == [84.0]
+    assert [entry["fxRate"] for entry in full] == [84.0, 83.0]
+    assert sparse == [{"id": 2, "fxRate": 84.0}, {"id": 1, "fxRate": 83.0}]
+    assert len(specific["reconciliation_history"]) == 2
+
+
+def test_archived_projection_reads_both_tables():
+    """Scenario: ✅ include_archived on a sparse history -> UNION ALL of the hot and archive tables"""
+    assert "reconcile_archive" not in reconcile_history_query(["id", "fxRate"], include_expense=False)
+
+    sql = reconcile_history_query(["id", "fxRate"], include_expense=False, include_archived=True)
+    assert 'FROM "reconcile" UNION ALL SELECT' in sql
+    assert 'FROM "reconcile_archive")' in sql
+
+
+def mock_transaction(mock_prisma, locked=True, moved=250):
+    transaction = MagicMock()
+    transaction.query_raw = AsyncMock(return_value=[{"locked": locked}])
+    transaction.execute_raw = AsyncMock(return_value=moved)
+    mock_prisma.tx.return_value.__aenter__ = AsyncMock(return_value=transaction)
+    mock_prisma.tx.return_value.__aexit__ = AsyncMock(return_value=False)
+    return transaction
+
+
+@pytest.mark.asyncio
+async def test_prisma_batch_is_one_statement():
+    """Scenario: ✅ The Prisma repository moves a batch with a single DELETE ... RETURNING into INSERT under the lock"""
+    with patch('app.repositories.prisma_repository.prisma') as mock_prisma:
+        transaction = mock_transaction(mock_prisma)
+
+        moved = await PrismaReconcileRepository().archive_superseded(500)
+
+    assert moved == 250
+    assert 'pg_try_advisory_xact_lock' in transaction.query_raw.await_args.args[0]
+    sql, batch_size = transaction.execute_raw.await_args.args
+    assert batch_size == 500
+    assert 'DELETE FROM "reconcile"' in sql and 'INSERT INTO "reconcile_archive"' in sql
+    assert 'HAVING count(*) > 1' in sql
+
+
+@pytest.mark.asyncio
+async def test_pass_is_skipped_while_another_worker_compacts():
+    """Scenario: ❌ The advisory lock is taken -> nothing is archived, the pass ends and is counted as skipped"""
+    with patch('app.repositories.prisma_repository.prisma') as mock_prisma, \
+            use_repositories(memory_repositories()) as repositories:
+        transaction = mock_transaction(mock_prisma, locked=False)
+        repositories.reconciles = PrismaReconcileRepository()
+
+        stats = await ReconcileCompactor(batch_size=10).run_once()
+
+    transaction.execute_raw.assert_not_awaited()
+    assert (stats["skippedPasses"], stats["batches"], stats["lastArchived"]) == (1, 0, 0)
@@ -0,0 +1,248 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.repositories.memory import memory_repositories
+from app.repositories.registry import use_repositories
+from app.services.reconversion import ReconversionRunner, job_progress
+
+
+OWNER = "runner-a"
+
+
+def make_job(**overrides):
+    job = dict(
+        id=1, userId=7, fromCurrencies=["INR"], toCurrency="USD", status="RUNNING",
+        totalExpenses=3, processedExpenses=0, skippedExpenses=0, lastExpenseId=0, leaseExpiresAt=None, leaseOwner=OWNER,
+        error=None, createdAt=datetime(2025, 7, 1), updatedAt=datetime(2025, 7, 1), finishedAt=None,
+    )
+    job.update(overrides)
+    return SimpleNamespace(**job)
+
+
+def expense(id, currency, day, amount=100.0):
+    return SimpleNamespace(id=id, currency=currency, date=datetime(2025, 6, day), amount=amount)
+
+
+@pytest.fixture
+def mock_prisma():
+    with patch('app.services.reconversion.prisma') as mock_prisma_client:
+        transaction = MagicMock()
+        transaction.execute_raw = AsyncMock(return_value=0)
+        transaction.reconversionjob.update_many = AsyncMock(return_value=1)
+        mock_prisma_client.tx.return_value.__aenter__.return_value = transaction
+        mock_prisma_client.reconversionjob.update_many = AsyncMock(return_value=1)
+        mock_prisma_client.transaction = transaction
+        yield mock_prisma_client
+
+
+@pytest.fixture
+def fx_rates():
+    rates = {("INR", "2025-06-01"): 0.012, ("EUR", "2025-06-02"): 1.08}
+
+    async def fake_rate(from_currency, to_currency, transaction_date):
+        key = (from_currency, transaction_date.strftime('%Y-%m-%d'))
+        if from_currency == "XXX":
+            raise HTTPException(status_code=400, detail="The currency code 'XXX' is not supported or invalid.")
+        return rates[key]
+
+    with patch('app.services.reconversion.get_historical_fx_rate', side_effect=fake_rate) as mock_rate:
+        yield mock_rate
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_applied_in_transactions_until_done(mock_prisma, fx_rates):
+    """Scenario: ✅ 3 expenses, chunk size 2 -> two transactional bulk updates, then COMPLETED"""
+    chunks = [
+        [expense(1, "INR", 1), expense(2, "EUR", 2)],
+        [expense(5, "XXX", 1)],
+        [],
+    ]
+    mock_prisma.expense.find_many = AsyncMock(side_effect=chunks)
+    mock_prisma.reconversionjob.find_unique = AsyncMock(side_effect=[
+        make_job(), make_job(lastExpenseId=2), make_job(lastExpenseId=5),
+    ])
+
+    await ReconversionRunner(chunk_size=2)._process(1, OWNER)
+
+    transaction = mock_prisma.transaction
+    update_sql_args = transaction.execute_raw.call_args_list[0].args
+    assert update_sql_args[1] == "USD"
+    assert json.loads(update_sql_args[2]) == [{"id": 1, "rate": 0.012}, {"id": 2, "rate": 1.08}]
+    assert update_sql_args[3:] == (7, 1, OWNER)
+    # The second chunk only held an unsupported currency: nothing to write, cursor still advances.
+    assert transaction.execute_raw.await_count == 2
+    cursor_calls = transaction.reconversionjob.update_many.call_args_list
+    # The cursor only moves from where this runner read it, under its own lease.
+    assert [c.kwargs['where']['lastExpenseId'] for c in cursor_calls] == [0, 2]
+    assert all(c.kwargs['where']['leaseOwner'] == OWNER for c in cursor_calls)
+    cursor_updates = [c.kwargs['data'] for c in cursor_calls]
+    assert [u['lastExpenseId'] for u in cursor_updates] == [2, 5]
+    assert cursor_updates[1]['skippedExpenses'] == {'increment': 1}
+    # Each chunk reads strictly after the cursor.
+    assert mock_prisma.expense.find_many.call_args_list[1].kwargs['where']['id'] == {'gt': 2}
+    assert mock_prisma.reconversionjob.update_many.call_args.kwargs['data']['status'] == 'COMPLETED'
+
+
+@pytest.mark.asyncio
+async def test_superseded_job_stops_before_next_chunk(mock_prisma, fx_rates):
+    """Scenario: ✅ Job superseded mid-run -> no further chunks"""
+    mock_prisma.reconversionjob.find_unique = AsyncMock(return_value=make_job(status="SUPERSEDED"))
+    mock_prisma.expense.find_many = AsyncMock()
+
+    await ReconversionRunner()._process(1, OWNER)
+
+    mock_prisma.expense.find_many.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_new_job_supersedes_unfinished_ones(mock_prisma):
+    """Scenario: ✅ INR -> USD still running, then USD -> EUR -> one job covering INR and USD"""
+    mock_prisma.reconversionjob.find_many = AsyncMock(return_value=[make_job(id=3, fromCurrencies=["INR"])])
+    mock_prisma.expense.count = AsyncMock(return_value=0)
+    mock_prisma.reconversionjob.create = AsyncMock(return_value=make_job(id=4, status="COMPLETED"))
+
+    await ReconversionRunner().start_job(7, "usd", "eur")
+
+    superseded = mock_prisma.reconversionjob.update_many.call_args.kwargs
+    assert superseded['where'] == {'id': {'in': [3]}}
+    assert superseded['data']['status'] == 'SUPERSEDED'
+    created = mock_prisma.reconversionjob.create.call_args.kwargs['data']
+    assert created['fromCurrencies'] == ["INR", "USD"]
+    assert created['toCurrency'] == "EUR"
+    assert created['status'] == 'COMPLETED'  # nothing to re-convert
+
+
+@pytest.mark.asyncio
+async def test_fx_outage_marks_job_failed_for_resume(mock_prisma):
+    """Scenario: ❌ FX service down past the retries -> FAILED with the reason, lease released"""
+    mock_prisma.reconversionjob.find_unique = AsyncMock(return_value=make_job())
+    mock_prisma.expense.find_many = AsyncMock(return_value=[expense(1, "INR", 1)])
+    outage = HTTPException(status_code=503, detail="The external FX service timed out.")
+
+    with patch('app.services.reconversion.get_historical_fx_rate', side_effect=outage), \
+            patch('app.services.reconversion.uuid.uuid4', return_value=SimpleNamespace(hex=OWNER)):
+        await ReconversionRunner(max_retries=1, retry_delay_seconds=0)._run(1)
+
+    failed = mock_prisma.reconversionjob.update_many.call_args.kwargs['data']
+    assert failed['status'] == 'FAILED'
+    assert failed['error'] == "The external FX service timed out."
+    assert failed['leaseExpiresAt'] is None
+    mock_prisma.transaction.execute_raw.assert_not_called()
+
+
+class FakeJobTable:
+    """One reconversion_jobs row with the update_many filters the runner uses."""
+
+    def __init__(self, job):
+        self.job = job
+
+    def _matches(self, where):
+        for field, expected in where.items():
+            if field == 'OR':
+                if not any(self._matches(option) for option in expected):
+                    return False
+                continue
+            value = getattr(self.job, field)
+            if isinstance(expected, dict):
+                if 'in' in expected and value not in expected['in']:
+                    return False
+                if 'lt' in expected and not (value is not None and value < expected['lt']):
+                    return False
+            elif value != expected:
+                return False
+        return True
+
+    async def find_unique(self, where):
+        return SimpleNamespace(**vars(self.job))
+
+    async def update_many(self, where, data):
+        if not self._matches(where):
+            return 0
+        for field, value in data.items():
+            if isinstance(value, dict):
+                value = getattr(self.job, field) + value['increment']
+            setattr(self.job, field, value)
+        return 1
+
+
+@pytest.mark.asyncio
+async def test_runner_whose_lease_was_taken_over_does_not_apply_its_chunk():
+    """Scenario: ❌ Runner A stalls in FX lookups past its lease, B claims and finishes -> each expense re-converted once"""
+    jobs = FakeJobTable(make_job(status="PENDING", leaseOwner=None, totalExpenses=2))
+    expenses = [expense(1, "INR", 1), expense(2, "INR", 2)]
+    inserted = []
+    a_waiting, release_a = asyncio.Event(), asyncio.Event()
+
+    async def find_expenses(where, order, take):
+        return [row for row in expenses if row.id > where['id']['gt']][:take]
+
+    async def execute_raw(sql, to_currency, encoded, user_id, job_id, owner):
+        # The EXISTS guard of both chunk statements.
+        if (jobs.job.status, jobs.job.leaseOwner) == ("RUNNING", owner) and 'INSERT INTO "reconcile"' in sql:
+            inserted.extend(row["id"] for row in json.loads(encoded))
+
+    async def fake_rate(from_currency, to_currency, transaction_date):
+        if not release_a.is_set():
+            a_waiting.set()
+            await release_a.wait()
+        return 0.012
+
+    with patch('app.services.reconversion.prisma') as mock_prisma, \
+            patch('app.services.reconversion.get_historical_fx_rate', side_effect=fake_rate), \
+            patch('app.services.reconversion.mark_user_write', new_callable=AsyncMock):
+        mock_prisma.reconversionjob = jobs
+        mock_prisma.expense.find_many = AsyncMock(side_effect=find_expenses)
+        transaction = MagicMock()
+        transaction.reconversionjob = jobs
+        transaction.execute_raw = AsyncMock(side_effect=execute_raw)
+        mock_prisma.tx.return_value.__aenter__.return_value = transaction
+
+        # A's lease expires at once, so B may claim the job while A waits on Frankfurter.
+        runner_a = asyncio.ensure_future(ReconversionRunner(lease_seconds=-1)._run(1))
+        await a_waiting.wait()
+        release_a.set()
+        await ReconversionRunner()._run(1)
+        await runner_a
+
+    assert sorted(inserted) == [1, 2]
+    assert jobs.job.processedExpenses == 2
+    assert jobs.job.status == "COMPLETED"
+
+
+def test_progress_percentage():
+    """Scenario: ✅ Progress counts processed and skipped expenses"""
+    progress = job_progress(make_job(totalExpenses=8, processedExpenses=5, skippedExpenses=1))
+    assert progress["percent"] == 75.0
+    assert progress["status"] == "RUNNING"
+
+
+@pytest.mark.asyncio
+async def test_base_currency_change_starts_a_job():
+    """Scenario: ✅ INR -> USD starts a job; setting the same currency again does not"""
+    from app.controllers import user_controller
+
+    repos = memory_repositories()
+    user = await repos.users.create("user@example.com", "hashed", "INR")
+    with use_repositories(repos), \
+            patch.object(user_controller.reconversion_runner, 'start_job', new_callable=AsyncMock) as start_job:
+        start_job.return_value = make_job(status="PENDING")
+
+        changed = await user_controller.update_base_currency(SimpleNamespace(baseCurrency="usd"), user)
+        start_job.assert_awaited_once_with(user.id, "INR", "USD")
+        assert changed["reconversion"]["status"] == "PENDING"
+
+        start_job.reset_mock()
+        unchanged = await user_controller.update_base_currency(
+            SimpleNamespace(baseCurrency="usd"), SimpleNamespace(id=user.id, baseCurrency="USD")
+        )
+        start_job.assert_not_called()
+        assert "reconversion" not in unchanged
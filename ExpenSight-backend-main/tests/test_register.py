@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from app.repositories.memory import memory_repositories
+from app.repositories.registry import use_repositories
+
+client = TestClient(app)
+
+NEW_USER = {"email": "new@example.com", "password": "secret", "baseCurrency": "usd"}
+
+
+@pytest.fixture
+def repos():
+    with use_repositories(memory_repositories()) as repositories:
+        yield repositories
+
+
+def test_register_is_a_single_insert(repos):
+    """Scenario: ✅ New email -> 200, one insert and no lookup beforehand"""
+    with patch.object(repos.users, 'find_by_email', wraps=repos.users.find_by_email) as find_by_email:
+        response = client.post("/v1/auth/register", json=NEW_USER)
+
+    assert response.status_code == 200
+    assert response.json()["email"] == NEW_USER["email"]
+    assert find_by_email.call_count == 0
+    user = repos.store.users[repos.store.users_by_email[NEW_USER["email"]]]
+    assert user.baseCurrency == "USD"
+    assert user.hashedPassword != NEW_USER["password"]
+
+
+def test_register_duplicate_email_is_rejected_by_the_unique_constraint(repos):
+    """Scenario: ❌ Email already registered -> 400 from the constraint, first account untouched"""
+    client.post("/v1/auth/register", json=NEW_USER)
+
+    response = client.post("/v1/auth/register", json={**NEW_USER, "baseCurrency": "EUR"})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+    assert len(repos.store.users) == 1
+    assert next(iter(repos.store.users.values())).baseCurrency == "USD"
@@ -0,0 +1,128 @@
+import asyncio
+import pytest
+from datetime import datetime
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from app.dependencies.deps import get_current_user, conditional_user_data
+from app.repositories.memory import memory_repositories
+from app.repositories.registry import use_repositories
+from app.schemas.expense_schema import ExpenseOut
+from app.services.sparse_fields import EXPENSE_FIELDS, parse_fields, expense_list_query, reconcile_history_query, shape_row
+
+client = TestClient(app)
+
+VALID_USER_ID = 123
+
+
+def override_get_current_user():
+    mock_user = MagicMock()
+    mock_user.id = VALID_USER_ID
+    return mock_user
+
+
+@pytest.fixture
+def repos():
+    with use_repositories(memory_repositories()) as repositories:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+        app.dependency_overrides[conditional_user_data] = lambda: {}
+        yield repositories
+        app.dependency_overrides = {}
+
+
+def add_expense(repos, amount=250.0):
+    return asyncio.run(repos.expenses.create({
+        'amount': amount, 'currency': 'INR', 'category': 'Food', 'date': datetime(2025, 6, 1), 'userId': VALID_USER_ID,
+    }))
+
+
+def test_fields_follow_model_order_and_keep_id():
+    """Scenario: ✅ fields=date,amount -> id, amount, date"""
+    assert parse_fields("date, amount", EXPENSE_FIELDS) == ["id", "amount", "date"]
+
+
+def test_projection_selects_only_requested_columns():
+    """Scenario: ✅ Without include=receipt the receipts table is never joined"""
+    sql = expense_list_query(["id", "amount"], include_receipt=False)
+    assert 'e."amount" AS "amount"' in sql
+    assert 'e."category"' not in sql
+    assert "receipts" not in sql
+
+    sql = reconcile_history_query(["id", "fxRate"], include_expense=True)
+    assert 'JOIN "expenses" e' in sql
+    assert 'e."amount" AS "expense.amount"' in sql
+
+
+def test_raw_rows_are_typed_like_model_rows():
+    """Scenario: ✅ Raw query values (ISO strings, whole doubles) -> datetimes and floats"""
+    row = {"id": 1, "amount": 250, "date": "2025-06-01T00:00:00+00:00", "receipt.id": None}
+
+    item = shape_row(row, ["id", "amount", "date"], "receipt", ("id",))
+
+    assert item == {"id": 1, "amount": 250.0, "date": datetime.fromisoformat("2025-06-01T00:00:00+00:00"), "receipt": None}
+    assert isinstance(item["amount"], float)
+
+
+def test_expense_list_with_sparse_fields(repos):
+    """Scenario: ✅ GET /v1/expense/?fields=amount,date -> only those keys, values typed like the full list"""
+    add_expense(repos, 250)
+
+    response = client.get("/v1/expense/?fields=amount,date")
+
+    assert response.status_code == 200
+    assert response.text == '[{"id":1,"amount":250.0,"date":"2025-06-01T00:00:00Z"}]'
+
+
+def test_history_with_included_expense(repos):
+    """Scenario: ✅ include=expense on a sparse history -> nested expense from the join"""
+    expense = add_expense(repos, 100.0)
+    asyncio.run(repos.expenses.update(expense.id, {'status': 'RECONCILED'}))
+    asyncio.run(repos.reconciles.create({
+        'expenseId': expense.id, 'userId': VALID_USER_ID, 'convertedAmount': 1.2,
+        'baseCurrency': 'INR', 'conversionCurrency': 'USD', 'fxRate': 0.012,
+    }))
+
+    response = client.get("/v1/reconcile/history?fields=fxRate&include=expense")
+
+    assert response.status_code == 200
+    entry = response.json()["reconciliation_history"][0]
+    assert entry == {
+        "id": 1, "fxRate": 0.012,
+        "expense": {
+            "id": 1, "amount": 100.0, "currency": "INR", "category": "Food",
+            "status": "RECONCILED", "date": "2025-06-01T00:00:00Z",
+        },
+    }
+
+
+def test_unknown_field_is_rejected(repos):
+    """Scenario: ❌ fields=password -> 400"""
+    response = client.get("/v1/expense/?fields=amount,password")
+
+    assert response.status_code == 400
+    assert "password" in response.json()["detail"]
+
+
+def test_openapi_declares_the_sparse_shapes():
+    """Scenario: ✅ The 200 schema of the list and history routes is the full model or the partial one"""
+    paths = client.get("/openapi.json").json()["paths"]
+
+    for path, partial in (("/v1/expense/", "ExpenseFieldsOut"), ("/v1/reconcile/history", "ReconciliationHistoryFieldsResponse")):
+        schema = paths[path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert partial in str(schema["anyOf"])
+
+
+def test_validated_list_keeps_the_full_shape(repos):
+    """Scenario: ✅ FAST_LIST_SERIALIZATION off -> the union response model still returns every ExpenseOut key"""
+    add_expense(repos, 250)
+
+    with patch('app.api.v1.expense.FAST_LIST_SERIALIZATION', False):
+        response = client.get("/v1/expense/")
+
+    assert response.status_code == 200
+    assert set(response.json()[0]) == set(ExpenseOut.model_fields)